@@ -0,0 +1,241 @@
+const { spawn } = require('child_process');
+const os = require('os');
+const path = require('path');
+
+// Scripts that util/script_worker.py can run in a long-lived process
+const WORKER_SCRIPT = path.resolve(__dirname, '../util/script_worker.py');
+const WORKER_SCRIPTS = new Set(['analyze_files', 'review', 'documentation', 'comments', 'generate_guidelines']);
+const FRAME_HEADER_BYTES = 4;
+const DEFAULT_JOB_TIMEOUT_MS = 15 * 60 * 1000;
+
+const timeoutError = (script, timeoutMs) => new Error(`Python script ${script} timed out after ${timeoutMs} ms`);
+
+// Runs a script the old way, as a fresh python3 process, killed after timeoutMs (0 for no limit)
+const spawnPythonScript = (scriptPath, args = [], input = null, timeoutMs = 0) => {
+  return new Promise((resolve, reject) => {
+    const pythonProcess = spawn('python3', [scriptPath, ...args]);
+    let stdout = '';
+    let stderr = '';
+    let timer = null;
+
+    if (timeoutMs > 0) {
+      timer = setTimeout(() => {
+        pythonProcess.kill('SIGKILL');
+        reject(timeoutError(path.basename(scriptPath, '.py'), timeoutMs));
+      }, timeoutMs);
+    }
+
+    if (input !== null) {
+      pythonProcess.stdin.write(input);
+    }
+    pythonProcess.stdin.end();
+
+    pythonProcess.stdout.on('data', data => stdout += data.toString());
+    pythonProcess.stderr.on('data', data => stderr += data.toString());
+    pythonProcess.on('error', error => {
+      clearTimeout(timer);
+      reject(error);
+    });
+    pythonProcess.on('close', code => {
+      clearTimeout(timer);
+      resolve({ code, stdout, stderr });
+    });
+  });
+};
+
+// One python3 running script_worker.py, answering one job at a time
+class PythonWorker {
+  constructor(onIdle) {
+    this.onIdle = onIdle;
+    this.buffer = Buffer.alloc(0);
+    this.current = null;
+    this.nextId = 1;
+    this.process = spawn('python3', [WORKER_SCRIPT]);
+
+    this.process.stdin.on('error', error => this.fail(error));
+    this.process.stdout.on('data', data => this.receive(data));
+    this.process.stderr.on('data', data => console.error('Python worker stderr:', data.toString()));
+    this.process.on('error', error => this.fail(error));
+    this.process.on('exit', code => this.fail(new Error(`Python worker exited with code ${code}`)));
+  }
+
+  get alive() {
+    return this.process !== null;
+  }
+
+  get busy() {
+    return this.current !== null;
+  }
+
+  // A job still running after timeoutMs (0 for no limit) kills the worker; the pool starts a new one
+  run(job, timeoutMs = 0) {
+    return new Promise((resolve, reject) => {
+      const message = { ...job, id: this.nextId++ };
+      const payload = Buffer.from(JSON.stringify(message), 'utf8');
+      const header = Buffer.alloc(FRAME_HEADER_BYTES);
+      header.writeUInt32BE(payload.length, 0);
+
+      const timer = timeoutMs > 0
+        ? setTimeout(() => this.kill(timeoutError(job.script, timeoutMs)), timeoutMs)
+        : null;
+      this.current = { id: message.id, resolve, reject, timer };
+      this.process.stdin.write(Buffer.concat([header, payload]));
+    });
+  }
+
+  receive(data) {
+    this.buffer = Buffer.concat([this.buffer, data]);
+    while (this.buffer.length >= FRAME_HEADER_BYTES) {
+      const length = this.buffer.readUInt32BE(0);
+      if (this.buffer.length < FRAME_HEADER_BYTES + length) {
+        return;
+      }
+      const payload = this.buffer.subarray(FRAME_HEADER_BYTES, FRAME_HEADER_BYTES + length);
+      this.buffer = this.buffer.subarray(FRAME_HEADER_BYTES + length);
+      this.finish(JSON.parse(payload.toString('utf8')));
+    }
+  }
+
+  finish(result) {
+    const current = this.current;
+    if (!current || current.id !== result.id) {
+      console.error('Python worker returned an unexpected result:', result.id);
+      return;
+    }
+    clearTimeout(current.timer);
+    this.current = null;
+    current.resolve({ code: result.exit_code, stdout: result.stdout, stderr: result.stderr });
+    this.onIdle(this);
+  }
+
+  fail(error) {
+    if (!this.process) {
+      return;
+    }
+    this.process = null;
+    if (this.current) {
+      clearTimeout(this.current.timer);
+      this.current.reject(error);
+      this.current = null;
+    }
+    this.onIdle(this);
+  }
+
+  kill(error) {
+    const pythonProcess = this.process;
+    this.fail(error);
+    if (pythonProcess) {
+      pythonProcess.kill('SIGKILL');
+    }
+  }
+
+  stop() {
+    if (this.process) {
+      this.process.stdin.end();
+    }
+  }
+}
+
+// Up to size workers sharing a queue of jobs. When they are all busy, up to
+// overflow jobs more run at once as one-off processes rather than waiting
+// behind long jobs; the rest wait in the queue.
+class PythonWorkerPool {
+  constructor(size, overflow = 0, timeoutMs = 0) {
+    this.size = size;
+    this.overflow = overflow;
+    this.timeoutMs = timeoutMs;
+    this.workers = [];
+    this.queue = [];
+    this.overflowRunning = 0;
+  }
+
+  run(job, scriptPath) {
+    return new Promise((resolve, reject) => {
+      this.queue.push({ job, scriptPath, resolve, reject });
+      this.dispatch();
+    });
+  }
+
+  dispatch() {
+    this.workers = this.workers.filter(worker => worker.alive);
+    while (this.queue.length) {
+      let worker = this.workers.find(candidate => !candidate.busy);
+      if (!worker && this.workers.length < this.size) {
+        worker = new PythonWorker(() => this.dispatch());
+        this.workers.push(worker);
+      }
+      if (worker) {
+        const { job, resolve, reject } = this.queue.shift();
+        worker.run(job, this.timeoutMs).then(resolve, reject);
+      } else if (this.overflowRunning < this.overflow) {
+        this.runOneOff(this.queue.shift());
+      } else {
+        return;
+      }
+    }
+  }
+
+  runOneOff({ job, scriptPath, resolve, reject }) {
+    this.overflowRunning++;
+    spawnPythonScript(scriptPath, job.args, job.stdin, this.timeoutMs)
+      .then(resolve, reject)
+      .finally(() => {
+        this.overflowRunning--;
+        this.dispatch();
+      });
+  }
+
+  stop() {
+    this.workers.forEach(worker => worker.stop());
+    this.workers = [];
+  }
+}
+
+const workerModeEnabled = () => !['0', 'false', 'off'].includes((process.env.PYTHON_WORKER || '').toLowerCase());
+
+const intSetting = (name, fallback) => {
+  const value = parseInt(process.env[name], 10);
+  return Number.isNaN(value) ? fallback : Math.max(0, value);
+};
+
+const jobTimeoutMs = () => intSetting('PYTHON_WORKER_JOB_TIMEOUT_MS', DEFAULT_JOB_TIMEOUT_MS);
+
+let pool = null;
+
+/**
+ * Runs a util script and resolves with { code, stdout, stderr }, as if it had
+ * been started as `python3 scriptPath ...args` with input on stdin.
+ *
+ * Scripts supported by util/script_worker.py run in a pool of long-lived
+ * workers that keep their imports warm: PYTHON_WORKER_POOL_SIZE of them,
+ * default one per CPU between 2 and 4. While all of them are busy, up to
+ * PYTHON_WORKER_OVERFLOW more jobs (default one per CPU) run as fresh
+ * processes instead of queueing. A job running longer than
+ * PYTHON_WORKER_JOB_TIMEOUT_MS (default 15 minutes, 0 for no limit) is
+ * killed, with its worker, and rejects.
+ * Set PYTHON_WORKER=off to spawn a fresh process per call instead.
+ */
+const runPythonScript = (scriptPath, args = [], input = null) => {
+  const script = path.basename(scriptPath, '.py');
+  if (!workerModeEnabled() || !WORKER_SCRIPTS.has(script)) {
+    return spawnPythonScript(scriptPath, args, input, jobTimeoutMs());
+  }
+  if (!pool) {
+    const cpus = os.cpus().length || 1;
+    pool = new PythonWorkerPool(
+      Math.max(1, intSetting('PYTHON_WORKER_POOL_SIZE', Math.min(4, Math.max(2, cpus)))),
+      intSetting('PYTHON_WORKER_OVERFLOW', cpus),
+      jobTimeoutMs()
+    );
+  }
+  return pool.run({ script, args, stdin: input }, scriptPath);
+};
+
+const stopPythonWorkers = () => {
+  if (pool) {
+    pool.stop();
+    pool = null;
+  }
+};
+
+module.exports = { runPythonScript, spawnPythonScript, stopPythonWorkers };
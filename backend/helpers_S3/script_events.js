@@ -0,0 +1,83 @@
+const fs = require('fs').promises;
+const { StringDecoder } = require('string_decoder');
+
+const EVENTS_POLL_MS = 200;
+const READ_BYTES = 64 * 1024;
+
+// A request asks for progress events with ?stream=1 or a stream=1 form field
+const wantsEventStream = req =>
+  ['1', 'true', 'yes'].includes(String(req.query?.stream || req.body?.stream || '').toLowerCase());
+
+/**
+ * Starts an NDJSON response and forwards the events a util script appends to
+ * eventsFile (its --stream argument, see util/llm_stream.py) while it runs.
+ * Only complete lines are sent. Call stop() once the script has exited to
+ * forward the remaining events; end the response with sendResponse().
+ */
+const forwardScriptEvents = (res, eventsFile) => {
+  res.status(200);
+  res.setHeader('Content-Type', 'application/x-ndjson; charset=utf-8');
+  res.setHeader('Cache-Control', 'no-cache');
+  res.setHeader('X-Accel-Buffering', 'no');
+  res.flushHeaders();
+
+  const decoder = new StringDecoder('utf8');
+  let offset = 0;
+  let pending = '';
+  let reading = null;
+
+  const readNewEvents = async () => {
+    let handle;
+    try {
+      handle = await fs.open(eventsFile, 'r');
+    } catch (error) {
+      if (error.code === 'ENOENT') {
+        return;
+      }
+      throw error;
+    }
+    try {
+      const buffer = Buffer.alloc(READ_BYTES);
+      let bytesRead;
+      while ((bytesRead = (await handle.read(buffer, 0, READ_BYTES, offset)).bytesRead) > 0) {
+        offset += bytesRead;
+        pending += decoder.write(buffer.subarray(0, bytesRead));
+      }
+    } finally {
+      await handle.close();
+    }
+    const lines = pending.split('\n');
+    pending = lines.pop();
+    lines.filter(line => line.trim()).forEach(line => res.write(`${line}\n`));
+  };
+
+  const poll = () => {
+    if (!reading) {
+      reading = readNewEvents()
+        .catch(error => console.error('Failed to forward script events:', error))
+        .finally(() => { reading = null; });
+    }
+    return reading;
+  };
+
+  const timer = setInterval(poll, EVENTS_POLL_MS);
+  return {
+    file: eventsFile,
+    async stop() {
+      clearInterval(timer);
+      await reading;
+      await poll();
+    }
+  };
+};
+
+// Sends body as JSON, or as the final {"event": "result", ...} line of an event stream already started
+const sendResponse = (res, status, body) => {
+  if (!res.headersSent) {
+    res.status(status).json(body);
+  } else if (!res.writableEnded) {
+    res.end(`${JSON.stringify({ event: 'result', status, ...body })}\n`);
+  }
+};
+
+module.exports = { wantsEventStream, forwardScriptEvents, sendResponse };
@@ -1,13 +1,14 @@
 const express = require('express');
 const router = express.Router();
 const multer = require('multer');
-const { spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs').promises;
 const os = require('os');
 const AWS = require('aws-sdk');
 const axios = require('axios');
 const FileManagementHelper = require('../helpers_S3/file_management');
+const { runPythonScript } = require('../helpers_S3/python_worker');
+const { wantsEventStream, forwardScriptEvents, sendResponse } = require('../helpers_S3/script_events');
 const fileManager = new FileManagementHelper();
 
 // Error logging middleware
@@ -31,7 +32,8 @@ const upload = multer({
   { name: 'additionalFiles', maxCount: 20 }
 ]);
 
-const executePythonScript = async (inputData, tempDir) => {
+// With eventsResponse, the script's progress events are streamed to it as they are written
+const executePythonScript = async (inputData, tempDir, eventsResponse = null) => {
   const scriptPath = path.resolve(__dirname, '../util/documentation.py');
   const inputFile = path.join(tempDir, 'input.json');
   const outputFile = path.join(tempDir, 'output.json');
@@ -41,46 +43,39 @@ const executePythonScript = async (inputData, tempDir) => {
     await fs.writeFile(inputFile, JSON.stringify(inputData), 'utf8');
     console.log(`Created temp directory and input file at: ${tempDir}`);
     
-    return new Promise((resolve, reject) => {
-      const pythonProcess = spawn('python3', [scriptPath, '--input', inputFile, '--output', outputFile]);
-      let stdoutData = '';
-      let errorData = '';
-
-      pythonProcess.stdout.on('data', data => {
-        stdoutData += data.toString();
-        console.log('Python stdout:', data.toString());
-      });
-
-      pythonProcess.stderr.on('data', data => {
-        errorData += data.toString();
-        console.error('Python stderr:', data.toString());
-      });
-
-      pythonProcess.on('error', error => {
+    const args = ['--input', inputFile, '--output', outputFile];
+    const events = eventsResponse && forwardScriptEvents(eventsResponse, path.join(tempDir, 'events.ndjson'));
+    if (events) {
+      args.push('--stream', events.file);
+    }
+    const { code, stdout, stderr } = await runPythonScript(scriptPath, args)
+      .catch(error => {
         logError(error, 'python_spawn_error', { scriptPath });
-        reject(error);
-      });
+        throw error;
+      })
+      .finally(() => events && events.stop());
+    if (stdout) {
+      console.log('Python stdout:', stdout);
+    }
+    if (stderr) {
+      console.error('Python stderr:', stderr);
+    }
+    console.log(`Python process exited with code ${code}`);
 
-      pythonProcess.on('close', async code => {
-        console.log(`Python process exited with code ${code}`);
-        
-        if (code !== 0) {
-          const error = new Error(`Python process failed with code ${code}: ${errorData}`);
-          logError(error, 'python_execution_error', { stdout: stdoutData });
-          reject(error);
-          return;
-        }
+    if (code !== 0) {
+      const error = new Error(`Python process failed with code ${code}: ${stderr}`);
+      logError(error, 'python_execution_error', { stdout });
+      throw error;
+    }
 
-        try {
-          await fs.access(outputFile);
-          const resultData = await fs.readFile(outputFile, 'utf8');
-          resolve(JSON.parse(resultData));
-        } catch (error) {
-          logError(error, 'output_file_error', { outputFile });
-          reject(error);
-        }
-      });
-    });
+    try {
+      await fs.access(outputFile);
+      const resultData = await fs.readFile(outputFile, 'utf8');
+      return JSON.parse(resultData);
+    } catch (error) {
+      logError(error, 'output_file_error', { outputFile });
+      throw error;
+    }
   } catch (error) {
     logError(error, 'execute_python_script');
     throw error;
@@ -196,7 +191,7 @@ router.post('/generate_documentation', (req, res) => {
       };
 
       console.log('Executing Python script...');
-      const result = await executePythonScript(inputData, tempDir);
+      const result = await executePythonScript(inputData, tempDir, wantsEventStream(req) ? res : null);
       console.log('Python script execution completed');
 
       if (result.status === 'success') {
@@ -209,7 +204,7 @@ router.post('/generate_documentation', (req, res) => {
 
           const resultUrl = await fileManager.getDownloadUrl(savedResult.id);
           
-          res.json({
+          sendResponse(res, 200, {
             success: true,
             message: 'Documentation generated successfully',
             processId,
@@ -229,13 +224,11 @@ router.post('/generate_documentation', (req, res) => {
     } catch (error) {
       logError(error, 'generate_documentation');
       
-      if (!res.headersSent) {
-        res.status(500).json({
-          success: false,
-          error: error.message,
-          step: error.step || 'unknown'
-        });
-      }
+      sendResponse(res, 500, {
+        success: false,
+        error: error.message,
+        step: error.step || 'unknown'
+      });
 
       if (processId) {
         try {
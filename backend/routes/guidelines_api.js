@@ -1,41 +1,33 @@
 const express = require("express");
 const router = express.Router();
 const multer = require("multer");
-const { spawn } = require("child_process");
 const path = require("path");
 const { Document, Packer, Paragraph } = require("docx");
 const FileManagementHelper = require("../helpers_S3/file_management");
+const { runPythonScript } = require("../helpers_S3/python_worker");
 const fileManager = new FileManagementHelper();
 
 const storage = multer.memoryStorage();
 const upload = multer({ storage: storage, limits: { fileSize: 10 * 1024 * 1024 } });
 
 async function executePythonScript(data) {
-    return new Promise((resolve, reject) => {
-        const scriptPath = path.resolve(__dirname, "../util/generate_guidelines.py");
-        const pythonProcess = spawn("python3", [scriptPath]);
-
-        let resultData = "", errorData = "";
-
-        pythonProcess.stdin.write(JSON.stringify(data));
-        pythonProcess.stdin.end();
-
-        pythonProcess.stdout.on("data", (data) => resultData += data.toString());
-        pythonProcess.stderr.on("data", (data) => errorData += data.toString());
-
-        pythonProcess.on("close", (code) => {
-            if (code !== 0) {
-                reject(new Error(`Python process failed with code ${code}: ${errorData}`));
-            } else {
-                try {
-                    const result = JSON.parse(resultData);
-                    resolve(result.status === "error" ? Promise.reject(new Error(result.message)) : result);
-                } catch (e) {
-                    reject(new Error(`Failed to parse Python response: ${resultData}`));
-                }
-            }
-        });
-    });
+    const scriptPath = path.resolve(__dirname, "../util/generate_guidelines.py");
+    const { code, stdout, stderr } = await runPythonScript(scriptPath, [], JSON.stringify(data));
+
+    if (code !== 0) {
+        throw new Error(`Python process failed with code ${code}: ${stderr}`);
+    }
+
+    let result;
+    try {
+        result = JSON.parse(stdout);
+    } catch (e) {
+        throw new Error(`Failed to parse Python response: ${stdout}`);
+    }
+    if (result.status === "error") {
+        throw new Error(result.message);
+    }
+    return result;
 }
 
 async function processFiles(files, guidelineId, provider, modelType) {
@@ -1,12 +1,13 @@
 const express = require('express');
 const router = express.Router();
 const multer = require('multer');
-const { spawn } = require('child_process');
 const path = require('path');
 const fs = require('fs').promises;
 const os = require('os');
 const axios = require('axios');
 const FileManagementHelper = require('../helpers_S3/file_management');
+const { runPythonScript } = require('../helpers_S3/python_worker');
+const { wantsEventStream, forwardScriptEvents, sendResponse } = require('../helpers_S3/script_events');
 const fileManager = new FileManagementHelper();
 
 // Configure multer
@@ -19,7 +20,8 @@ const upload = multer({
   { name: 'compliance', maxCount: 1 },
   { name: 'additionalFiles', maxCount: 20 }
 ]);
-const executePythonScript = async (inputData, tempDir) => {
+// With eventsResponse, the script's progress events are streamed to it as they are written
+const executePythonScript = async (inputData, tempDir, eventsResponse = null) => {
   const scriptPath = path.resolve(__dirname, '../util/review.py');
   const inputFile = path.join(tempDir, 'input.json');
   const outputFile = path.join(tempDir, 'output.json');
@@ -30,30 +32,27 @@ const executePythonScript = async (inputData, tempDir) => {
     
     await fs.writeFile(inputFile, JSON.stringify(inputData), 'utf8');
     
-    return new Promise((resolve, reject) => {
-      const pythonProcess = spawn('python3', [scriptPath, '--input', inputFile, '--output', outputFile]);
-
-      let errorData = '';
-      pythonProcess.stderr.on('data', data => {
-        errorData += data.toString();
-        console.error('Python stderr:', data.toString());
-      });
-
-      pythonProcess.on('close', async code => {
-        if (code !== 0) {
-          reject(new Error(`Python process failed: ${errorData}`));
-          return;
-        }
+    const args = ['--input', inputFile, '--output', outputFile];
+    const events = eventsResponse && forwardScriptEvents(eventsResponse, path.join(tempDir, 'events.ndjson'));
+    if (events) {
+      args.push('--stream', events.file);
+    }
+    const { code, stderr } = await runPythonScript(scriptPath, args)
+      .finally(() => events && events.stop());
+    if (stderr) {
+      console.error('Python stderr:', stderr);
+    }
+    if (code !== 0) {
+      throw new Error(`Python process failed: ${stderr}`);
+    }
 
-        try {
-          await fs.access(outputFile);
-          const resultData = await fs.readFile(outputFile, 'utf8');
-          resolve(JSON.parse(resultData));
-        } catch (error) {
-          reject(new Error(`Failed to read output file: ${error.message}`));
-        }
-      });
-    });
+    try {
+      await fs.access(outputFile);
+      const resultData = await fs.readFile(outputFile, 'utf8');
+      return JSON.parse(resultData);
+    } catch (error) {
+      throw new Error(`Failed to read output file: ${error.message}`);
+    }
   } catch (error) {
     console.error('Error in executePythonScript:', error);
     throw error;
@@ -169,7 +168,7 @@ router.post('/analyzefile', (req, res) => {
       };
 
       console.log('Input data for Python script:', JSON.stringify(inputData, null, 2));
-const result = await executePythonScript(inputData, tempDir);
+const result = await executePythonScript(inputData, tempDir, wantsEventStream(req) ? res : null);
 console.log('Python script result:', JSON.stringify(result, null, 2));
       
       if (result.status === 'success') {
@@ -181,7 +180,7 @@ console.log('Python script result:', JSON.stringify(result, null, 2));
 
         const resultUrl = await fileManager.getDownloadUrl(savedResult.id);
         
-        res.json({
+        sendResponse(res, 200, {
           success: true,
           message: 'Analysis completed',
           processId,
@@ -196,12 +195,10 @@ console.log('Python script result:', JSON.stringify(result, null, 2));
     } catch (error) {
       console.error('Error in /analyzefile route:', error);
       
-      if (!res.headersSent) {
-        res.status(500).json({
-          success: false,
-          error: error.message || 'Internal server error'
-        });
-      }
+      sendResponse(res, 500, {
+        success: false,
+        error: error.message || 'Internal server error'
+      });
 
       if (processId) {
         await fileManager.saveTextContentToS3AndDB(
@@ -6,10 +6,9 @@
 
 import sys
 import json
-import litellm
-import yaml
 import os
 import re
+import hashlib
 
 import json
 import xml.etree.ElementTree as ET
@@ -17,629 +16,569 @@ import xml.etree.ElementTree as ET
 import ast
 
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import tempfile
 import traceback
-import magic
 from dotenv import load_dotenv
 from datetime import datetime
-from py2neo import Graph, Node, Relationship
+from local_graph import LocalGraphStore
+from source_parsers import PARSER_REGISTRY, ParserBackend, attach_siblings
+from repository_walker import (BINARY_SAMPLE_SIZE, BUILD_DENY_DIRS, DEFAULT_DENY_DIRS, DEFAULT_MAX_FILE_SIZE,
+                               RepositoryWalker, looks_binary)
+from repository_model import RepositoryModel
+from pipeline_metrics import PipelineMetrics
 import shutil
 import logging
 
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=getattr(logging, os.getenv('ANALYZE_LOG_LEVEL', 'INFO').upper(), logging.INFO),
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-def generate_codebase_structure(repo_path):
+
+
+def _annotation_name(node):
+    if isinstance(node, ast.Name):
+        return node.id
+    elif isinstance(node, ast.Attribute):
+        return f"{node.value.id}.{node.attr}"
+    return None
+
+
+def _decorator_names(node):
+    return [decorator.id for decorator in node.decorator_list
+            if isinstance(decorator, ast.Name)]
+
+
+class PythonStructureVisitor(ast.NodeVisitor):
     """
-    Main function to generate codebase structure and create knowledge graph
-    
-    Args:
-        repo_path (str): Path to the repository
-    
-    Returns:
-        None: Creates codebasestructure.txt and Neo4j knowledge graph
+    Collects classes, standalone functions, global variables and imports
+    of a Python module in a single traversal of its AST.
     """
-    def connect_to_neo4j(uri, username, password):
-        try:
-            return Graph(uri, auth=(username, password))
-        except Exception as e:
-            print(f"Neo4j Connection Error: {e}")
-            traceback.print_exc()
-            return None
 
-    def detect_file_type(file_path):
-        try:
-            mime = magic.Magic(mime=True)
-            file_type = mime.from_file(file_path)
-            return file_type
-        except Exception as e:
-            print(f"Error detecting file type: {e}")
-            return None
+    def __init__(self):
+        self.class_info_dict = {}
+        self.functions = {}
+        self.imports = []
+        self.assigned_names = []
+        self.class_attribute_names = set()
 
-    def sanitize_input_content(content):
-        try:
-            max_content_length = 100000
-            if len(content) > max_content_length:
-                print(f"Content truncated to {max_content_length} characters")
-                return content[:max_content_length]
-            return content
-        except Exception as e:
-            print(f"Content sanitization error: {e}")
-            return content
+    def visit_Import(self, node):
+        self.imports.extend(alias.name for alias in node.names)
 
-    class RepositoryAnalyzer:
-        def __init__(self, repo_path):
-            self.repo_path = repo_path
-            self.repository_structure = {}
+    def visit_ImportFrom(self, node):
+        module = node.module or ''
+        self.imports.extend(f"{module}.{alias.name}" for alias in node.names)
 
-        def analyze_repository(self):
-            try:
-                self.repository_structure = {
-                    'root': self.repo_path,
-                    'directories': [],
-                    'files': []
-                }
-                
-                for root, dirs, files in os.walk(self.repo_path):
-                    try:
-                        current_dir = {
-                            'path': root,
-                            'name': os.path.basename(root),
-                            'subdirectories': dirs,
-                            'files': []
-                        }
-                        
-                        for file in files:
-                            try:
-                                file_path = os.path.join(root, file)
-                                file_info = self._analyze_file(file_path)
-                                current_dir['files'].append(file_info)
-                            except Exception as file_error:
-                                print(f"Error analyzing file {file}: {file_error}")
-                        
-                        self.repository_structure['directories'].append(current_dir)
-                    except Exception as dir_error:
-                        print(f"Error processing directory {root}: {dir_error}")
-                
-                return self.repository_structure
-            except Exception as e:
-                print(f"Repository analysis error: {e}")
-                return {}
+    def visit_ClassDef(self, node):
+        bases = []
+        for base in node.bases:
+            base_name = _annotation_name(base)
+            if base_name:
+                bases.append(base_name)
 
-        def _analyze_file(self, file_path):
-            try:
-                file_name = os.path.basename(file_path)
-                file_extension = os.path.splitext(file_name)[1].lower()
-                
-                file_info = {
-                    'name': file_name,
-                    'path': file_path,
-                    'extension': file_extension,
-                    'size': os.path.getsize(file_path)
-                }
-                
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    
-                    if file_extension == '.py':
-                        file_info.update(self._parse_python_file(content))
-                    elif file_extension == '.java':
-                        file_info.update(self._parse_java_file(content))
-                    elif file_extension in ['.js', '.jsx', '.ts', '.tsx']:
-                        file_info.update(self._parse_javascript_file(content))
-                    elif file_extension == '.json':
-                        file_info.update(self._parse_json_file(content))
-                    elif file_extension == '.xml':
-                        file_info.update(self._parse_xml_file(content))
-                    elif file_extension in ['.cpp', '.h']:
-                        file_info.update(self._parse_cpp_file(content))
-                    elif file_extension == '.cs':
-                        file_info.update(self._parse_csharp_file(content))
-                
-                except Exception as parsing_error:
-                    file_info['parsing_error'] = str(parsing_error)
-                
-                return file_info
-            except Exception as e:
-                print(f"File analysis error for {file_path}: {e}")
-                return {'name': os.path.basename(file_path), 'error': str(e)}
+        class_info = {
+            'name': node.name,
+            'bases': bases,
+            'methods': [],
+            'attributes': [],
+            'class_methods': [],
+            'static_methods': [],
+            'properties': [],
+            'docstring': ast.get_docstring(node),
+            'decorators': _decorator_names(node),
+        }
+        # A class redefined under the same name (e.g. in if/else branches) keeps
+        # the members collected from its earlier definitions.
+        previous_info = self.class_info_dict.get(node.name)
+        if previous_info:
+            for member_key in ('methods', 'attributes', 'class_methods', 'static_methods', 'properties'):
+                class_info[member_key] = previous_info[member_key]
+        self.class_info_dict[node.name] = class_info
 
-        def _parse_python_file(self, content):
-            try:
-                tree = ast.parse(content)
-                
-                class_info_dict = {}  
-                standalone_functions = {}
-                global_vars = []
-                imports = []
-                
-                
-                module_doc = ast.get_docstring(tree)
-                module_info = {
-                    'type': 'module',
-                    'docstring': module_doc
-                }
-                
-                
-                for node in ast.walk(tree):
-                    if isinstance(node, ast.ClassDef):
-                        bases = []
-                        for base in node.bases:
-                            if isinstance(base, ast.Name):
-                                bases.append(base.id)
-                            elif isinstance(base, ast.Attribute):
-                                bases.append(f"{base.value.id}.{base.attr}")
-                        
-                        class_info_dict[node.name] = {
-                            'name': node.name,
-                            'bases': bases,
-                            'methods': [],
-                            'attributes': [],
-                            'class_methods': [],
-                            'static_methods': [],
-                            'properties': [],
-                            'docstring': ast.get_docstring(node),
-                            'decorators': [decorator.id for decorator in node.decorator_list 
-                                        if isinstance(decorator, ast.Name)],
-                        }
-                
-                
-                for node in ast.walk(tree):
-                   
-                    if isinstance(node, ast.Import):
-                        imports.extend(alias.name for alias in node.names)
-                    elif isinstance(node, ast.ImportFrom):
-                        module = node.module or ''
-                        imports.extend(f"{module}.{alias.name}" for alias in node.names)
-                    
-              
-                    elif isinstance(node, ast.ClassDef):
-                        class_info = class_info_dict[node.name]
-                        
-                        
-                        siblings = []
-                        for other_class, other_info in class_info_dict.items():
-                            if other_class != node.name:
-                                common_bases = set(class_info['bases']) & set(other_info['bases'])
-                                if common_bases:
-                                    siblings.append({
-                                        'name': other_class,
-                                        'common_bases': list(common_bases)
-                                    })
-                        
-                        class_info['siblings'] = siblings
-                        
-                       
-                        for item in node.body:
-                          
-                            if isinstance(item, ast.FunctionDef):
-                                method_info = {
-                                    'name': item.name,
-                                    'parameters': [arg.arg for arg in item.args.args],
-                                    'docstring': ast.get_docstring(item),
-                                    'decorators': [decorator.id for decorator in item.decorator_list 
-                                                if isinstance(decorator, ast.Name)],
-                                    'returns': None,  # Will be updated if return annotation exists
-                                    'is_property': any(d.id == 'property' for d in item.decorator_list 
-                                                    if isinstance(d, ast.Name)),
-                                }
-                                
-                                
-                                if item.returns:
-                                    if isinstance(item.returns, ast.Name):
-                                        method_info['returns'] = item.returns.id
-                                    elif isinstance(item.returns, ast.Attribute):
-                                        method_info['returns'] = f"{item.returns.value.id}.{item.returns.attr}"
-                                
-                                
-                                if any(d.id == 'classmethod' for d in item.decorator_list 
-                                    if isinstance(d, ast.Name)):
-                                    class_info['class_methods'].append(method_info)
-                                elif any(d.id == 'staticmethod' for d in item.decorator_list 
-                                    if isinstance(d, ast.Name)):
-                                    class_info['static_methods'].append(method_info)
-                                elif any(d.id == 'property' for d in item.decorator_list 
-                                    if isinstance(d, ast.Name)):
-                                    class_info['properties'].append(method_info)
-                                else:
-                                    class_info['methods'].append(method_info)
-                            
-                            # Attribute parsing with type hints
-                            elif isinstance(item, ast.AnnAssign):
-                                if isinstance(item.target, ast.Name):
-                                    type_hint = None
-                                    if isinstance(item.annotation, ast.Name):
-                                        type_hint = item.annotation.id
-                                    elif isinstance(item.annotation, ast.Attribute):
-                                        type_hint = f"{item.annotation.value.id}.{item.annotation.attr}"
-                                    
-                                    class_info['attributes'].append({
-                                        'name': item.target.id,
-                                        'type_hint': type_hint
-                                    })
-                            
-                            elif isinstance(item, ast.Assign):
-                                for target in item.targets:
-                                    if isinstance(target, ast.Name):
-                                        class_info['attributes'].append({
-                                            'name': target.id,
-                                            'type_hint': None
-                                        })
-                    
-                    
-                    elif isinstance(node, ast.FunctionDef):
-                        if not any(node.name in info['methods'] for info in class_info_dict.values()):
-                            standalone_functions[node.name] = {
-                                'parameters': [arg.arg for arg in node.args.args],
-                                'docstring': ast.get_docstring(node),
-                                'decorators': [decorator.id for decorator in node.decorator_list 
-                                            if isinstance(decorator, ast.Name)],
-                                'returns': None
-                            }
-                            if node.returns:
-                                if isinstance(node.returns, ast.Name):
-                                    standalone_functions[node.name]['returns'] = node.returns.id
-                                elif isinstance(node.returns, ast.Attribute):
-                                    standalone_functions[node.name]['returns'] = f"{node.returns.value.id}.{node.returns.attr}"
-                    
-                    
-                    elif isinstance(node, ast.Assign) and isinstance(node.targets[0], ast.Name):
-                        if not any(node.targets[0].id in info['attributes'] 
-                                for info in class_info_dict.values()):
-                            var_name = node.targets[0].id
-                            global_vars.append({
-                                'name': var_name,
-                                'is_constant': var_name.isupper(),
-                                'type_hint': None
-                            })
-                
-                return {
-                    'module': module_info,
-                    'classes': list(class_info_dict.values()),
-                    'functions': standalone_functions,
-                    'global_variables': global_vars,
-                    'imports': imports
-                }
-            except Exception as e:
-                return {'python_parsing_error': str(e)}
-                
+        for item in node.body:
+            if isinstance(item, ast.FunctionDef):
+                self._add_method(class_info, item)
+                # Methods are recorded above; only their bodies are searched further
+                self.generic_visit(item)
+                continue
 
-    
+            # Attribute parsing with type hints
+            if isinstance(item, ast.AnnAssign):
+                if isinstance(item.target, ast.Name):
+                    self._add_attribute(class_info, item.target.id, _annotation_name(item.annotation))
+            elif isinstance(item, ast.Assign):
+                for target in item.targets:
+                    if isinstance(target, ast.Name):
+                        self._add_attribute(class_info, target.id, None)
+            self.visit(item)
 
-    
-    def build_repository_knowledge_graph(graph, repository_details):
-        """
-        Build an enhanced knowledge graph with improved class relationships and method details
-        """
-        graph.delete_all()
-        
+    def visit_FunctionDef(self, node):
+        self.functions[node.name] = {
+            'parameters': [arg.arg for arg in node.args.args],
+            'docstring': ast.get_docstring(node),
+            'decorators': _decorator_names(node),
+            'returns': _annotation_name(node.returns) if node.returns else None
+        }
+        self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        if isinstance(node.targets[0], ast.Name):
+            self.assigned_names.append(node.targets[0].id)
+        self.generic_visit(node)
+
+    def _add_method(self, class_info, item):
+        decorators = _decorator_names(item)
+        method_info = {
+            'name': item.name,
+            'parameters': [arg.arg for arg in item.args.args],
+            'docstring': ast.get_docstring(item),
+            'decorators': decorators,
+            'returns': _annotation_name(item.returns) if item.returns else None,
+            'is_property': 'property' in decorators,
+        }
+
+        if 'classmethod' in decorators:
+            class_info['class_methods'].append(method_info)
+        elif 'staticmethod' in decorators:
+            class_info['static_methods'].append(method_info)
+        elif 'property' in decorators:
+            class_info['properties'].append(method_info)
+        else:
+            class_info['methods'].append(method_info)
+
+    def _add_attribute(self, class_info, name, type_hint):
+        class_info['attributes'].append({
+            'name': name,
+            'type_hint': type_hint
+        })
+        self.class_attribute_names.add(name)
+
+    def classes_with_siblings(self):
+        return attach_siblings(list(self.class_info_dict.values()))
+
+    def global_variables(self):
+        return [
+            {
+                'name': var_name,
+                'is_constant': var_name.isupper(),
+                'type_hint': None
+            }
+            for var_name in self.assigned_names
+            if var_name not in self.class_attribute_names
+        ]
+
+
+def parse_python_source(content):
+    try:
+        tree = ast.parse(content)
         
-        repo_node = Node("Repository", 
-                        name=repository_details['root'],
-                        total_files=sum(len(d['files']) for d in repository_details['directories']),
-                        created_at=str(datetime.now()))
-        graph.create(repo_node)
+        module_info = {
+            'type': 'module',
+            'docstring': ast.get_docstring(tree)
+        }
         
-        node_registry = {repository_details['root']: repo_node}
-        class_nodes = {}  
-        module_nodes = {} 
+        visitor = PythonStructureVisitor()
+        visitor.visit(tree)
         
-        def create_module_hierarchy(file_path):
-            """Create module hierarchy nodes and relationships"""
-            parts = os.path.relpath(file_path, repository_details['root']).split(os.sep)
-            current_path = repository_details['root']
-            parent_node = node_registry[current_path]
-            
-            for part in parts[:-1]:  
-                current_path = os.path.join(current_path, part)
-                if current_path not in module_nodes:
-                    module_node = Node("Module", 
-                                    name=part,
-                                    full_path=current_path,
-                                    is_package=os.path.exists(os.path.join(current_path, '__init__.py')))
-                    graph.create(module_node)
-                    module_nodes[current_path] = module_node
-                    
-                    contains_rel = Relationship(parent_node, "CONTAINS", module_node)
-                    graph.create(contains_rel)
-                
-                parent_node = module_nodes[current_path]
-            
-            return parent_node
-            
-        def create_class_structure(file_node, class_info, module_node):
-            """Create enhanced class structure with detailed relationships"""
-           
-            class_node = Node("Class", 
-                            name=class_info['name'],
-                            docstring=class_info.get('docstring', ''),
-                            total_methods=len(class_info.get('methods', [])) + 
-                                        len(class_info.get('class_methods', [])) +
-                                        len(class_info.get('static_methods', [])),
-                            total_attributes=len(class_info.get('attributes', [])),
-                            is_abstract=any('abstractmethod' in m.get('decorators', []) 
-                                        for m in class_info.get('methods', [])))
-            graph.create(class_node)
-            class_nodes[class_info['name']] = class_node
-            
-            
-            defines_class_rel = Relationship(file_node, "DEFINES", class_node)
-            graph.create(defines_class_rel)
-            
-            module_contains_rel = Relationship(module_node, "CONTAINS", class_node)
-            graph.create(module_contains_rel)
-            
-            
-            for base in class_info.get('bases', []):
-                if base in class_nodes:
-                    base_node = class_nodes[base]
-                    
-                    
-                    inherits_rel = Relationship(class_node, "INHERITS_FROM", base_node,
-                                            direct=True,
-                                            inheritance_level=1)
-                    graph.create(inherits_rel)
-                    
-                   
-                    child_rel = Relationship(base_node, "HAS_CHILD", class_node,
-                                        direct=True,
-                                        inheritance_level=1)
-                    graph.create(child_rel)
-                    
-                    
-                    def create_ancestor_relationships(child_node, ancestor_node, visited=None, level=2):
-                        if visited is None:
-                            visited = set()
-                        
-                        if ancestor_node.identity in visited:
-                            return
-                        visited.add(ancestor_node.identity)
-                        
-                        
-                        for rel in graph.match((ancestor_node, None), "INHERITS_FROM"):
-                            next_ancestor = rel.end_node
-                            
-                            
-                            indirect_rel = Relationship(child_node, "INHERITS_FROM", next_ancestor,
-                                                    direct=False,
-                                                    inheritance_level=level)
-                            graph.create(indirect_rel)
-                            
-                            
-                            if level == 2:
-                                descendant_rel = Relationship(next_ancestor, "HAS_GRANDCHILD", child_node)
-                            else:
-                                descendant_rel = Relationship(next_ancestor, "HAS_DESCENDANT", child_node,
-                                                        inheritance_level=level)
-                            graph.create(descendant_rel)
-                            
-                            
-                            create_ancestor_relationships(child_node, next_ancestor, visited, level + 1)
-                    
-                    create_ancestor_relationships(class_node, base_node)
-            
-           
-            def create_sibling_relationships(class_node):
-               
-                query = """
-                MATCH (c1:Class {name: $class_name})-[:INHERITS_FROM {direct: true}]->(parent:Class)
-                <-[:INHERITS_FROM {direct: true}]-(c2:Class)
-                WHERE c1 <> c2
-                RETURN DISTINCT c2, parent
-                """
-                results = graph.run(query, class_name=class_info['name'])
-                
-                for record in results:
-                    sibling = record['c2']
-                    parent = record['parent']
-                    
-                    
-                    sibling_rel = Relationship(
-                        class_node, 
-                        "IS_SIBLING_OF", 
-                        sibling,
-                        common_parent=parent['name']
-                    )
-                    graph.create(sibling_rel)
-                    
-                    
-                    reverse_rel = Relationship(
-                        sibling,
-                        "IS_SIBLING_OF",
-                        class_node,
-                        common_parent=parent['name']
-                    )
-                    graph.create(reverse_rel)
-            
-            create_sibling_relationships(class_node)
-            
-            
-            for method_type in ['methods', 'class_methods', 'static_methods', 'properties']:
-                for method in class_info.get(method_type, []):
-                    method_node = Node(
-                        "Method",
-                        name=method['name'],
-                        parameters=','.join(method.get('parameters', [])),
-                        docstring=method.get('docstring', ''),
-                        returns=method.get('returns'),
-                        method_type=method_type,
-                        decorators=','.join(method.get('decorators', [])),
-                        is_abstract='abstractmethod' in method.get('decorators', []),
-                        is_property='property' in method.get('decorators', []),
-                        parameter_count=len(method.get('parameters', [])),
-                        has_return_type=method.get('returns') is not None
-                    )
-                    graph.create(method_node)
-                    
-                    method_rel = Relationship(class_node, "HAS_METHOD", method_node,
-                                        method_type=method_type)
-                    graph.create(method_rel)
-                    
-                    
-                    def create_method_overrides(class_node, method_node, method_name):
-                        query = """
-                        MATCH (c:Class)-[:INHERITS_FROM*]->(parent:Class)-[:HAS_METHOD]->(parent_method:Method)
-                        WHERE c.name = $class_name AND parent_method.name = $method_name
-                        RETURN parent, parent_method
-                        """
-                        results = graph.run(query, class_name=class_node['name'], method_name=method_name)
-                        
-                        for record in results:
-                            override_rel = Relationship(
-                                method_node, 
-                                "OVERRIDES", 
-                                record['parent_method'],
-                                parent_class=record['parent']['name']
-                            )
-                            graph.create(override_rel)
-                    
-                    create_method_overrides(class_node, method_node, method['name'])
+        return {
+            'module': module_info,
+            'classes': visitor.classes_with_siblings(),
+            'functions': visitor.functions,
+            'global_variables': visitor.global_variables(),
+            'imports': visitor.imports
+        }
+    except Exception as e:
+        # Same key as the failures of the other backends, which raise instead
+        return {'parsing_error': str(e)}
+
+
+PARSER_REGISTRY.register(ParserBackend('ast', ['.py'], parse_python_source, file_label='PythonFile'))
+
+
+# Bump whenever _analyze_file can produce different output for the same file,
+# so manifests written by an older parser are not reused.
+PARSER_VERSION = 5
+
+
+class RepositoryAnalyzer:
+    def __init__(self, repo_path, max_workers=1, chunk_size=32, manifest_path=None, parse_timeout=5.0,
+                 deny_dirs=None, max_file_size=DEFAULT_MAX_FILE_SIZE, metrics=None):
+        """
+        Args:
+            repo_path (str): Path to the repository
+            max_workers (int): Number of worker processes used to parse files.
+                1 keeps the scan serial, 0 or less uses one worker per CPU core.
+            chunk_size (int): Number of files handed to a worker at a time
+            manifest_path (str): Optional manifest file. When given, the scan is
+                incremental and only new or changed files are parsed again.
+            parse_timeout (float): Time budget in seconds for parsing one file,
+                0 for no limit
+            deny_dirs (list): Directory names that are never scanned, the
+                walker's default list when not given. .gitignore rules apply as well.
+            max_file_size (int): Files larger than this many bytes are listed
+                but not parsed, 0 for no limit
+            metrics (PipelineMetrics): Receives the walk and parse phases
+        """
+        self.repo_path = repo_path
+        self.max_workers = max_workers if max_workers > 0 else (os.cpu_count() or 1)
+        self.chunk_size = max(1, chunk_size)
+        self.manifest_path = manifest_path
+        self.parse_timeout = parse_timeout
+        self.deny_dirs = deny_dirs
+        self.max_file_size = max_file_size
+        self.metrics = metrics if metrics is not None else PipelineMetrics()
+        self.repository_structure = {}
+        self.changed_files = []
+        self.deleted_files = []
+
+    def analyze_repository(self):
+        """
+        Returns:
+            RepositoryModel: Compact repository structure. It reads like the
+            dict {'root', 'directories', 'files'}, with each file rebuilt as
+            the analyzer's dict when accessed.
+        """
+        try:
+            self.repository_structure = RepositoryModel(self.repo_path)
             
+            scanned_dirs = []
+            walker = RepositoryWalker(self.repo_path, deny_dirs=self.deny_dirs)
+            with self.metrics.phase('walk'):
+                for root, dirs, files in walker.walk():
+                    try:
+                        current_dir = self.repository_structure.add_directory(root, dirs)
+                        scanned_dirs.append((current_dir, [os.path.join(root, file) for file in files]))
+                    except Exception as dir_error:
+                        print(f"Error processing directory {root}: {dir_error}")
+                file_paths = [file_path for _, dir_files in scanned_dirs for file_path in dir_files]
+                self.metrics.count('directories', len(scanned_dirs))
+                self.metrics.count('files_found', len(file_paths))
+
+            with self.metrics.phase('parse'):
+                if self.manifest_path:
+                    file_results = self._analyze_files_incremental(file_paths)
+                else:
+                    self.changed_files = [self._relative_path(file_path) for file_path in file_paths]
+                    self.deleted_files = []
+                    file_results = self._analyze_files(file_paths)
+
+                # Results come back in submission order, so they can be dealt back
+                # to their directories exactly as the serial walk would have. Each
+                # one is compacted as it arrives rather than after the whole scan.
+                results_iter = iter(file_results)
+                for current_dir, dir_files in scanned_dirs:
+                    for _ in dir_files:
+                        file_info = next(results_iter)
+                        if file_info is not None:
+                            self.repository_structure.add_file(current_dir, file_info)
             
-            for attr in class_info.get('attributes', []):
-                attr_node = Node(
-                    "ClassAttribute",
-                    name=attr['name'],
-                    type_hint=attr.get('type_hint'),
-                    has_type_annotation=attr.get('type_hint') is not None
-                )
-                graph.create(attr_node)
-                
-                attr_rel = Relationship(class_node, "HAS_ATTRIBUTE", attr_node)
-                graph.create(attr_rel)
-        
-        def process_python_file(file_info, parent_module_node):
-            """Process Python file with enhanced module relationships"""
-            if file_info['extension'] != '.py':
+            return self.repository_structure
+        except Exception as e:
+            print(f"Repository analysis error: {e}")
+            return {}
+
+    def _analyze_files(self, file_paths):
+        if self.max_workers > 1 and len(file_paths) > 1:
+            return self._counted(self._analyze_files_parallel(file_paths))
+        return self._counted(self._analyze_files_serial(file_paths))
+
+    def _counted(self, file_results):
+        """Pass analysis results through, counting parsed, skipped and failed files"""
+        for file_info in file_results:
+            if file_info is None or 'error' in file_info:
+                self.metrics.count('files_failed')
+            elif 'parsing_error' in file_info:
+                self.metrics.count('parse_errors')
+            elif 'skipped' in file_info:
+                self.metrics.count('files_skipped')
+            elif 'parser' in file_info:
+                self.metrics.count('files_parsed')
+            yield file_info
+
+    def _analyze_files_incremental(self, file_paths):
+        """Reuse manifest results for unchanged files and parse only the rest"""
+        previous_entries = self._load_manifest()
+        manifest_entries = {}
+        file_results = [None] * len(file_paths)
+        pending = []
+
+        for index, file_path in enumerate(file_paths):
+            relative_path = self._relative_path(file_path)
+            try:
+                stat = os.stat(file_path)
+                entry = previous_entries.get(relative_path)
+                if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                    content_hash = entry['sha256']
+                else:
+                    content_hash = _file_digest(file_path)
+
+                if entry and entry['sha256'] == content_hash:
+                    file_info = dict(entry['result'], path=file_path)
+                    file_results[index] = file_info
+                    manifest_entries[relative_path] = dict(entry, size=stat.st_size, mtime=stat.st_mtime)
+                else:
+                    pending.append((index, relative_path, stat, content_hash))
+            except OSError as stat_error:
+                print(f"Error reading file {file_path}: {stat_error}")
+                pending.append((index, relative_path, None, None))
+
+        parsed_results = self._analyze_files([file_paths[index] for index, _, _, _ in pending])
+        for (index, relative_path, stat, content_hash), file_info in zip(pending, parsed_results):
+            file_results[index] = file_info
+            if file_info is not None and stat is not None and 'error' not in file_info:
+                manifest_entries[relative_path] = {
+                    'size': stat.st_size,
+                    'mtime': stat.st_mtime,
+                    'sha256': content_hash,
+                    'result': file_info
+                }
+
+        self.changed_files = [relative_path for _, relative_path, _, _ in pending]
+        self.deleted_files = sorted(set(previous_entries) - {self._relative_path(p) for p in file_paths})
+        self.metrics.count('files_reused', len(file_paths) - len(pending))
+        print(f"Incremental scan: {len(file_paths) - len(pending)} reused, "
+              f"{len(pending)} parsed, {len(self.deleted_files)} removed")
+
+        self._save_manifest(manifest_entries)
+        return file_results
+
+    def _relative_path(self, file_path):
+        return os.path.relpath(file_path, self.repo_path)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('parser_version') != PARSER_VERSION:
+                print("Manifest was written by a different parser version, re-parsing all files")
+                return {}
+            return manifest.get('files', {})
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"Error loading manifest {self.manifest_path}: {e}")
+            return {}
+
+    def _save_manifest(self, manifest_entries):
+        try:
+            manifest_dir = os.path.dirname(os.path.abspath(self.manifest_path))
+            os.makedirs(manifest_dir, exist_ok=True)
+            temp_path = f"{self.manifest_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({'parser_version': PARSER_VERSION, 'files': manifest_entries}, f)
+            os.replace(temp_path, self.manifest_path)
+        except Exception as e:
+            print(f"Error saving manifest {self.manifest_path}: {e}")
+
+    def _analyze_files_serial(self, file_paths):
+        return (_analyze_file_safely(self, file_path) for file_path in file_paths)
+
+    def _analyze_files_parallel(self, file_paths):
+        """Yield results in order as workers finish them, so they need not all be held at once"""
+        completed = 0
+        try:
+            with ProcessPoolExecutor(max_workers=self.max_workers,
+                                     initializer=_init_scan_worker,
+                                     initargs=(self.repo_path, self.parse_timeout,
+                                               self.max_file_size)) as executor:
+                for file_info in executor.map(_scan_worker_analyze_file, file_paths,
+                                              chunksize=self.chunk_size):
+                    yield file_info
+                    completed += 1
                 return
-                
-            file_node = Node(
-                "PythonFile",
-                name=file_info['name'],
-                path=file_info['path'],
-                size=file_info['size'],
-                has_classes=bool(file_info.get('classes')),
-                has_functions=bool(file_info.get('functions')),
-                import_count=len(file_info.get('imports', []))
-            )
-            graph.create(file_node)
-            
-            contains_file_rel = Relationship(parent_module_node, "CONTAINS", file_node)
-            graph.create(contains_file_rel)
-            
-            
-            module_node = Node(
-                "ModuleNamespace",
-                name=os.path.splitext(file_info['name'])[0],
-                docstring=file_info.get('module', {}).get('docstring', ''),
-                file_path=file_info['path']
-            )
-            graph.create(module_node)
+        except Exception as pool_error:
+            print(f"Parallel scan failed, falling back to serial scan: {pool_error}")
+        yield from self._analyze_files_serial(file_paths[completed:])
+
+    def _analyze_file(self, file_path):
+        try:
+            file_name = os.path.basename(file_path)
+            file_extension = os.path.splitext(file_name)[1].lower()
             
-            defines_module_rel = Relationship(file_node, "DEFINES", module_node)
-            graph.create(defines_module_rel)
+            file_info = {
+                'name': file_name,
+                'path': file_path,
+                'extension': file_extension,
+                'size': os.path.getsize(file_path)
+            }
             
-           
-            if 'classes' in file_info:
-                for class_info in file_info['classes']:
-                    create_class_structure(file_node, class_info, module_node)
+            # Files no backend can parse are not read at all
+            backend = PARSER_REGISTRY.backend_for(file_extension)
+            if backend is None:
+                return file_info
+            file_info['parser'] = backend.name
             
+            if self.max_file_size and file_info['size'] > self.max_file_size:
+                file_info['skipped'] = 'too_large'
+                return file_info
             
-            if 'functions' in file_info:
-                for func_name, func_info in file_info['functions'].items():
-                    func_node = Node(
-                        "Function",
-                        name=func_name,
-                        parameters=','.join(func_info.get('parameters', [])),
-                        docstring=func_info.get('docstring', ''),
-                        returns=func_info.get('returns'),
-                        decorators=','.join(func_info.get('decorators', [])),
-                        parameter_count=len(func_info.get('parameters', [])),
-                        has_return_type=func_info.get('returns') is not None
-                    )
-                    graph.create(func_node)
-                    
-                    defines_func_rel = Relationship(module_node, "DEFINES", func_node)
-                    graph.create(defines_func_rel)
+            try:
+                with open(file_path, 'rb') as f:
+                    raw_content = f.read()
+                if looks_binary(raw_content[:BINARY_SAMPLE_SIZE]):
+                    file_info['skipped'] = 'binary'
+                    return file_info
+                # Same newline handling as reading the file in text mode
+                content = raw_content.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+                
+                file_info.update(PARSER_REGISTRY.parse(backend, content, self.parse_timeout))
             
+            except Exception as parsing_error:
+                file_info['parsing_error'] = str(parsing_error)
             
-            if 'imports' in file_info:
-                for import_name in file_info['imports']:
-                    import_parts = import_name.split('.')
-                    import_node = Node(
-                        "Import",
-                        name=import_name,
-                        base_package=import_parts[0],
-                        is_relative=import_name.startswith('.')
-                    )
-                    graph.create(import_node)
-                    
-                    imports_rel = Relationship(module_node, "IMPORTS", import_node)
-                    graph.create(imports_rel)
-        
-        
-        for directory in repository_details['directories']:
-            parent_module_node = create_module_hierarchy(directory['path'])
-            for file_info in directory['files']:
-                process_python_file(file_info, parent_module_node)
-        # i=build_repository_knowledge_graph(graph,repository_details)
-        # print(i)
-    def export_knowledge_graph_json_structure(graph, output_file='knowledge_graph_structure.json'):
+            return file_info
+        except Exception as e:
+            print(f"File analysis error for {file_path}: {e}")
+            return {'name': os.path.basename(file_path), 'error': str(e)}
+
+    def _parse_python_file(self, content):
+        return parse_python_source(content)
+
+
+class GraphBatchWriter:
+    """
+    Collects graph nodes per label and relationships per type, and writes them
+    in batches through a graph store (Neo4jGraphStore or LocalGraphStore).
+    
+    create_node returns a key that stands in for the node until it is written;
+    relationships are given those keys (or keys from reference_node) as
+    endpoints. Nothing reaches the database until flush().
+    With merge=True nodes are merged on their uid property and relationships
+    are merged on their endpoints, so writing the same graph twice is a no-op.
+    """
+
+    def __init__(self, store, batch_size=5000, merge=False):
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.merge = merge
+        self._pending_nodes = defaultdict(list)
+        self._pending_relationships = defaultdict(list)
+        self._references = {}
+        self._node_ids = {}
+        self._next_key = 0
+        self.nodes_written = 0
+        self.relationships_written = 0
+        self.summary_rows_written = 0
+
+    def _new_key(self):
+        key = self._next_key
+        self._next_key += 1
+        return key
+
+    def create_node(self, label, **properties):
+        key = self._new_key()
+        self._pending_nodes[label].append({'key': key, 'props': properties})
+        return key
+
+    def reference_node(self, label, uid):
+        """Return a key for a stored node that is looked up by uid when first needed"""
+        key = self._new_key()
+        self._references[key] = (label, uid)
+        return key
+
+    def create_relationship(self, start_key, rel_type, end_key, **properties):
+        self._pending_relationships[rel_type].append((start_key, end_key, properties))
+
+    def node_id(self, key):
+        """Return the database id of a written or resolved node, or None"""
+        return self._node_ids.get(key)
+
+    def run_in_batches(self, operation, rows):
+        """Call a store operation on batches of rows, one transaction per batch"""
+        results = []
+        for offset in range(0, len(rows), self.batch_size):
+            results.extend(operation(rows[offset:offset + self.batch_size]) or [])
+        return results
+
+    def remove_file_nodes(self, labels, files):
         """
-        Export a comprehensive JSON representation of the knowledge graph 
-        with all relationships, inheritance hierarchies, and detailed node information
-        
-        Args:
-            graph (Graph): Neo4j graph connection
-            output_file (str): Path to output JSON file
+        Delete the nodes owned by changed or deleted files.
         
         Returns:
-            dict: Comprehensive knowledge graph structure
+            set: uids of surviving classes that inherited from the deleted classes
         """
-        try:
-            
-            knowledge_graph = {
-                'nodes': {},
-                'relationships': {
-                    'inheritance': [],
-                    'method_overrides': [],
-                    'sibling_relationships': [],
-                    'import_relationships': []
-                },
-                'hierarchies': {
-                    'class_hierarchies': {},
-                    'method_inheritance': {}
-                }
-            }
+        file_rows = sorted(files)
+        descendant_classes = set(self.run_in_batches(self.store.descendant_classes, file_rows))
+        for label in labels:
+            self.run_in_batches(lambda batch: self.store.delete_file_nodes(label, batch), file_rows)
+        return descendant_classes
 
-           
-            node_query = """
+    def clear_class_relationships(self, class_uids):
+        """Delete the inheritance, sibling and override edges of classes that are rebuilt"""
+        self.run_in_batches(self.store.delete_class_relationships, sorted(class_uids))
+
+    def replace_summary(self, section, rows, repository):
+        """
+        Replace the precomputed rows of a hierarchy section of the export for
+        the repository with that uid; other repositories' rows are kept
+        """
+        rows = [dict(row, repository=repository) for row in rows]
+        self.store.delete_summary_rows(section, repository)
+        self.run_in_batches(lambda batch: self.store.write_summary_rows(section, batch), rows)
+        self.summary_rows_written += len(rows)
+
+    def flush(self):
+        """Write all pending nodes, then all pending relationships"""
+        for label, rows in self._pending_nodes.items():
+            records = self.run_in_batches(
+                lambda batch: self.store.write_nodes(label, batch, merge=self.merge), rows)
+            self.nodes_written += len(rows)
+            for record in records:
+                self._node_ids[record['key']] = record['node_id']
+        self._pending_nodes.clear()
+
+        self._resolve_references()
+
+        skipped = 0
+        for rel_type, relationships in self._pending_relationships.items():
+            rows = []
+            for start_key, end_key, properties in relationships:
+                if start_key in self._node_ids and end_key in self._node_ids:
+                    rows.append({'start': self._node_ids[start_key], 'end': self._node_ids[end_key],
+                                 'props': properties})
+                else:
+                    skipped += 1
+            self.run_in_batches(
+                lambda batch: self.store.write_relationships(rel_type, batch, merge=self.merge), rows)
+            self.relationships_written += len(rows)
+        self._pending_relationships.clear()
+
+        if skipped:
+            print(f"Skipped {skipped} relationships whose endpoints are not in the graph")
+
+    def _resolve_references(self):
+        wanted = defaultdict(list)
+        for relationships in self._pending_relationships.values():
+            for start_key, end_key, _ in relationships:
+                for key in (start_key, end_key):
+                    if key not in self._node_ids and key in self._references:
+                        label, uid = self._references.pop(key)
+                        wanted[label].append({'key': key, 'uid': uid})
+
+        for label, rows in wanted.items():
+            for record in self.run_in_batches(lambda batch: self.store.find_nodes(label, batch), rows):
+                self._node_ids[record['key']] = record['node_id']
+
+
+class Neo4jGraphStore:
+    """
+    The graph operations behind the knowledge graph build and export, as Cypher
+    on a py2neo Graph. local_graph.LocalGraphStore implements the same
+    operations on an embedded SQLite database.
+    """
+
+    # Read by the in-memory export, one query per section of the JSON document
+    export_queries = {
+        'nodes': """
             MATCH (n)
+            WHERE NOT n:ClassHierarchy AND NOT n:MethodInheritance
             RETURN 
                 labels(n)[0] as type, 
                 id(n) as node_id, 
                 properties(n) as properties
-            """
-            
-            nodes = graph.run(node_query).data()
-            for node in nodes:
-                node_type = node['type']
-                node_id = node['node_id']
-                properties = node['properties']
-                
-               
-                if node_type not in knowledge_graph['nodes']:
-                    knowledge_graph['nodes'][node_type] = {}
-                
-                knowledge_graph['nodes'][node_type][str(node_id)] = {
-                    'name': properties.get('name', ''),
-                    'details': properties
-                }
-
-            
-            inheritance_query = """
+            """,
+        'inheritance': """
             MATCH (derived:Class)-[r:INHERITS_FROM]->(base:Class)
             RETURN 
                 id(derived) as derived_id, 
@@ -648,21 +587,8 @@ def generate_codebase_structure(repo_path):
                 base.name as base_name,
                 r.direct as is_direct,
                 r.inheritance_level as inheritance_level
-            """
-            
-            inheritance_relationships = graph.run(inheritance_query).data()
-            for rel in inheritance_relationships:
-                knowledge_graph['relationships']['inheritance'].append({
-                    'derived_id': str(rel['derived_id']),
-                    'derived_name': rel['derived_name'],
-                    'base_id': str(rel['base_id']),
-                    'base_name': rel['base_name'],
-                    'is_direct': rel['is_direct'],
-                    'inheritance_level': rel['inheritance_level']
-                })
-
-           
-            override_query = """
+            """,
+        'method_overrides': """
             MATCH (method:Method)-[o:OVERRIDES]->(parent_method:Method)
             MATCH (method)<-[:HAS_METHOD]-(derived_class:Class)
             MATCH (parent_method)<-[:HAS_METHOD]-(parent_class:Class)
@@ -675,31 +601,8 @@ def generate_codebase_structure(repo_path):
                 id(parent_method) as parent_method_id,
                 parent_class.name as parent_class,
                 id(parent_class) as parent_class_id
-            """
-            
-            override_relationships = graph.run(override_query).data()
-            for rel in override_relationships:
-                knowledge_graph['relationships']['method_overrides'].append({
-                    'method': {
-                        'id': str(rel['method_id']),
-                        'name': rel['method_name'],
-                        'class': {
-                            'id': str(rel['derived_class_id']),
-                            'name': rel['derived_class']
-                        }
-                    },
-                    'overridden': {
-                        'method_id': str(rel['parent_method_id']),
-                        'method_name': rel['parent_method_name'],
-                        'class': {
-                            'id': str(rel['parent_class_id']),
-                            'name': rel['parent_class']
-                        }
-                    }
-                })
-
-            
-            sibling_query = """
+            """,
+        'sibling_relationships': """
             MATCH (c:Class)-[r:IS_SIBLING_OF]->(sibling:Class)
             RETURN 
                 id(c) as class_id, 
@@ -707,24 +610,8 @@ def generate_codebase_structure(repo_path):
                 id(sibling) as sibling_id, 
                 sibling.name as sibling_name,
                 r.common_parent as common_parent
-            """
-            
-            sibling_relationships = graph.run(sibling_query).data()
-            for rel in sibling_relationships:
-                knowledge_graph['relationships']['sibling_relationships'].append({
-                    'class': {
-                        'id': str(rel['class_id']),
-                        'name': rel['class_name']
-                    },
-                    'sibling': {
-                        'id': str(rel['sibling_id']),
-                        'name': rel['sibling_name']
-                    },
-                    'common_parent': rel['common_parent']
-                })
-
-            # Imports Relationships
-            import_query = """
+            """,
+        'import_relationships': """
             MATCH (module:ModuleNamespace)-[:IMPORTS]->(import:Import)
             RETURN 
                 module.name as module_name,
@@ -733,130 +620,1322 @@ def generate_codebase_structure(repo_path):
                 id(import) as import_id,
                 import.base_package as base_package,
                 import.is_relative as is_relative
+            """,
+        'class_hierarchies': """
+            MATCH (h:ClassHierarchy)
+            RETURN 
+                h.root_class as root_class,
+                h.ancestors as ancestors,
+                h.depth as depth
+            ORDER BY h.repository, h.position
+            """,
+        'method_inheritance': """
+            MATCH (m:MethodInheritance)
+            RETURN 
+                m.base_method as base_method, 
+                m.base_class as base_class, 
+                m.derived_classes as derived_classes, 
+                m.derived_methods as derived_methods
+            ORDER BY m.repository, m.position
+            """,
+    }
+
+    # Nodes of one label, for the streaming export; the other sections stream
+    # export_queries
+    export_label_nodes_query = """
+            MATCH (n:`{label}`)
+            WHERE labels(n)[0] = $label
+            RETURN id(n) as node_id, properties(n) as properties
             """
-            
-            import_relationships = graph.run(import_query).data()
-            for rel in import_relationships:
-                knowledge_graph['relationships']['import_relationships'].append({
-                    'module': {
-                        'id': str(rel['module_id']),
-                        'name': rel['module_name']
-                    },
-                    'import': {
-                        'id': str(rel['import_id']),
-                        'name': rel['import_name'],
-                        'base_package': rel['base_package'],
-                        'is_relative': rel['is_relative']
-                    }
-                })
 
-            
-            class_hierarchy_query = """
-            MATCH path = (root:Class)-[:INHERITS_FROM*]->(ancestor:Class)
-            WITH root, 
-                collect(distinct ancestor.name) as ancestors,
-                length(path) as depth
-            RETURN 
-                root.name as root_class,
-                ancestors,
-                depth
-            ORDER BY depth DESC
+    descendant_classes_query = """
+            UNWIND $rows AS file
+            MATCH (descendant:Class)-[:INHERITS_FROM]->(:Class {source_file: file})
+            RETURN DISTINCT descendant.uid as uid
             """
-            
-            class_hierarchies = graph.run(class_hierarchy_query).data()
-            for hierarchy in class_hierarchies:
-                knowledge_graph['hierarchies']['class_hierarchies'][hierarchy['root_class']] = {
-                    'ancestors': hierarchy['ancestors'],
-                    'depth': hierarchy['depth']
-                }
 
-            
-            method_inheritance_query = """
-MATCH (base:Class)-[:HAS_METHOD]->(base_method:Method)
-MATCH (derived:Class)-[:INHERITS_FROM*]->(base)
-MATCH (derived)-[:HAS_METHOD]->(derived_method:Method)
-WHERE derived_method.name = base_method.name
-WITH base_method.name as base_method, 
-     base.name as base_class, 
-     collect(DISTINCT derived.name) as derived_classes,
-     collect(DISTINCT derived_method.name) as derived_methods
-RETURN 
-    base_method, 
-    base_class, 
-    derived_classes, 
-    derived_methods
+    repository_exists_query = "MATCH (r:Repository {uid: $uid}) RETURN count(r)"
+
+    # Labels of the precomputed rows of the hierarchy sections of the export,
+    # kept apart from the code graph and scoped by the uid of their repository
+    summary_labels = {
+        'class_hierarchies': 'ClassHierarchy',
+        'method_inheritance': 'MethodInheritance',
+    }
+
+    # Operators in a query plan that read nodes or relationships without an index
+    scan_operators = ('AllNodesScan', 'NodeByLabelScan', 'RelationshipTypeScan',
+                      'DirectedRelationshipTypeScan', 'UndirectedRelationshipTypeScan',
+                      'DirectedAllRelationshipsScan', 'UndirectedAllRelationshipsScan')
+
+    def __init__(self, graph):
+        self.graph = graph
+        # Queries sent to the server, reported as db_round_trips in the pipeline metrics
+        self.round_trips = 0
+
+    def session(self):
+        """A store for one concurrent reader; py2neo hands each query its own pooled connection"""
+        return Neo4jGraphStore(self.graph)
+
+    def close(self):
+        """Nothing to release: connections go back to the py2neo pool after each query"""
+
+    def _run(self, query, **params):
+        self.round_trips += 1
+        return self.graph.run(query, **params)
+
+    def _run_in_transaction(self, query, **params):
+        self.round_trips += 1
+        tx = self.graph.begin()
+        try:
+            records = tx.run(query, **params).data()
+            self.graph.commit(tx)
+        except Exception:
+            self.graph.rollback(tx)
+            raise
+        return records
+
+    @staticmethod
+    def _write_nodes_query(label, merge):
+        create_clause = f"MERGE (n:`{label}` {{uid: row.props.uid}})" if merge else f"CREATE (n:`{label}`)"
+        return f"""
+            UNWIND $rows AS row
+            {create_clause}
+            SET n = row.props
+            RETURN row.key as key, id(n) as node_id
             """
-            
-            method_inheritance = graph.run(method_inheritance_query).data()
-            for inheritance in method_inheritance:
-                knowledge_graph['hierarchies']['method_inheritance'][inheritance['base_method']] = {
-                    'base_class': inheritance['base_class'],
-                    'inherited_by': {
-                        'classes': inheritance['derived_classes'],
-                        'methods': inheritance['derived_methods']
-                    }
-                }
 
-            
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(knowledge_graph, f, indent=2)
+    @staticmethod
+    def _find_nodes_query(label):
+        return f"""
+            UNWIND $rows AS row
+            MATCH (n:`{label}` {{uid: row.uid}})
+            RETURN row.key as key, id(n) as node_id
+            """
 
-            print(f"Comprehensive knowledge graph JSON exported to {output_file}")
-            return knowledge_graph
+    @staticmethod
+    def _write_relationships_query(rel_type, merge):
+        relationship_clause = "MERGE" if merge else "CREATE"
+        return f"""
+            UNWIND $rows AS row
+            MATCH (start) WHERE id(start) = row.start
+            MATCH (end) WHERE id(end) = row.end
+            {relationship_clause} (start)-[r:`{rel_type}`]->(end)
+            SET r = row.props
+            """
 
-        except Exception as e:
-            print(f"Error exporting knowledge graph JSON: {e}")
-            traceback.print_exc()
-            return None
+    @staticmethod
+    def _delete_file_nodes_query(label):
+        return f"""
+            UNWIND $rows AS file
+            MATCH (n:`{label}` {{source_file: file}})
+            DETACH DELETE n
+            """
+
+    @staticmethod
+    def _delete_class_relationships_queries():
+        return [f"""
+            UNWIND $rows AS uid
+            MATCH (c:Class {{uid: uid}})
+            MATCH {pattern}
+            DELETE r
+            """ for pattern in ["(c)-[r:INHERITS_FROM]->()",
+                                "(c)<-[r:HAS_CHILD|HAS_GRANDCHILD|HAS_DESCENDANT]-()",
+                                "(c)-[r:IS_SIBLING_OF]-()",
+                                "(c)-[:HAS_METHOD]->(:Method)-[r:OVERRIDES]->()"]]
+
+    def write_nodes(self, label, rows, merge=False):
+        return self._run_in_transaction(self._write_nodes_query(label, merge), rows=rows)
 
+    def find_nodes(self, label, rows):
+        return self._run_in_transaction(self._find_nodes_query(label), rows=rows)
 
-    def create_knowledge_graph(repository_details):
+    def write_relationships(self, rel_type, rows, merge=False):
+        self._run_in_transaction(self._write_relationships_query(rel_type, merge), rows=rows)
+
+    def descendant_classes(self, files):
+        """uids of classes inheriting directly from a class defined in one of the files"""
+        return [record['uid'] for record in self._run_in_transaction(self.descendant_classes_query, rows=files)]
+
+    def delete_file_nodes(self, label, files):
+        self._run_in_transaction(self._delete_file_nodes_query(label), rows=files)
+
+    def delete_class_relationships(self, class_uids):
+        for query in self._delete_class_relationships_queries():
+            self._run_in_transaction(query, rows=class_uids)
+
+    def repository_exists(self, uid):
+        return bool(self._run(self.repository_exists_query, uid=uid).evaluate())
+
+    def delete_all(self):
+        self.round_trips += 1
+        self.graph.delete_all()
+
+    @staticmethod
+    def _delete_summary_rows_query(label):
+        return f"""
+            MATCH (n:`{label}` {{repository: $repository}})
+            WITH n LIMIT 10000
+            DELETE n
+            RETURN count(*)
+            """
+
+    def delete_summary_rows(self, section, repository):
+        query = self._delete_summary_rows_query(self.summary_labels[section])
+        while self._run(query, repository=repository).evaluate():
+            pass
+
+    def write_summary_rows(self, section, rows):
+        self._run_in_transaction(f"""
+            UNWIND $rows AS row
+            CREATE (n:`{self.summary_labels[section]}`)
+            SET n = row
+            """, rows=rows)
+
+    def ensure_schema(self, uid_labels, file_labels, name_labels):
+        """
+        Create the constraints and indexes the build and export queries look
+        nodes up by: a unique uid per label, source_file on file-level labels,
+        name on name_labels and repository on the precomputed export rows. Every statement is idempotent; the ones the
+        server rejects (e.g. a constraint existing data violates) are reported
+        and skipped. Returns the statements that could not be applied.
+        """
+        statements = [f"CREATE CONSTRAINT IF NOT EXISTS FOR (n:`{label}`) REQUIRE n.uid IS UNIQUE"
+                      for label in uid_labels]
+        statements += [f"CREATE INDEX IF NOT EXISTS FOR (n:`{label}`) ON (n.source_file)"
+                       for label in file_labels]
+        statements += [f"CREATE INDEX IF NOT EXISTS FOR (n:`{label}`) ON (n.name)"
+                       for label in name_labels]
+        statements += [f"CREATE INDEX IF NOT EXISTS FOR (n:`{label}`) ON (n.repository)"
+                       for label in self.summary_labels.values()]
+        failed = []
+        for statement in statements:
+            try:
+                self._run(statement)
+            except Exception as schema_error:
+                print(f"Could not apply '{statement}': {schema_error}")
+                failed.append(statement)
+        # Plans only pick up indexes once they are online. Waiting is best
+        # effort like the statements: a timeout, an older server without the
+        # procedure or a missing privilege only means the plans below may
+        # not show the new indexes yet.
         try:
-            graph = connect_to_neo4j(
-                uri=os.getenv('NEO4J_URI'),
-                username=os.getenv('NEO4J_USER'),
-                password=os.getenv('NEO4J_PASSWORD')
+            self._run("CALL db.awaitIndexes(300)")
+        except Exception as wait_error:
+            print(f"Warning: could not wait for indexes to come online: {wait_error}")
+        return failed
+
+    def planned_queries(self):
+        """(name, query) for the build and export queries, with Class for label placeholders"""
+        yield 'write_nodes', self._write_nodes_query('Class', False)
+        yield 'merge_nodes', self._write_nodes_query('Class', True)
+        yield 'find_nodes', self._find_nodes_query('Class')
+        yield 'write_relationships', self._write_relationships_query('INHERITS_FROM', False)
+        yield 'merge_relationships', self._write_relationships_query('INHERITS_FROM', True)
+        yield 'descendant_classes', self.descendant_classes_query
+        yield 'delete_file_nodes', self._delete_file_nodes_query('Class')
+        for index, query in enumerate(self._delete_class_relationships_queries(), 1):
+            yield f'delete_class_relationships_{index}', query
+        yield 'repository_exists', self.repository_exists_query
+        for section, label in self.summary_labels.items():
+            yield f'delete_{section}', self._delete_summary_rows_query(label)
+        for section, query in self.export_queries.items():
+            yield f'export_{section}', query
+        yield 'export_label_nodes', self.export_label_nodes_query.replace('{label}', 'Class')
+
+    def explain_queries(self):
+        """
+        EXPLAIN every build and export query and report how it reads the graph:
+        {name: {'uses_index': bool, 'index_lookups': [...], 'scans': [...]}}
+        """
+        params = {'rows': [], 'uid': '', 'label': 'Class', 'repository': ''}
+        report = {}
+        for name, query in self.planned_queries():
+            index_lookups, scans = [], []
+            try:
+                pending = [self._run("EXPLAIN " + query, **params).plan()]
+            except Exception as explain_error:
+                print(f"Warning: could not explain query {name}: {explain_error}")
+                continue
+            while pending:
+                plan = pending.pop()
+                if plan is None:
+                    continue
+                operator = plan.operator_type.split('@')[0]
+                details = plan.args.get('Details') or plan.args.get('details')
+                step = f"{operator} {details}" if details else operator
+                if operator in self.scan_operators:
+                    scans.append(step)
+                elif 'Index' in operator or 'ById' in operator:
+                    index_lookups.append(step)
+                pending.extend(plan.children)
+            report[name] = {'uses_index': bool(index_lookups), 'index_lookups': index_lookups, 'scans': scans}
+        return report
+
+    def export_rows(self, section):
+        return self._run(self.export_queries[section]).data()
+
+    def export_labels(self):
+        return sorted(record['label'] for record in
+                      self._run("CALL db.labels() YIELD label RETURN label")
+                      if record['label'] not in self.summary_labels.values())
+
+    def export_pages(self, section, page_size, label=None):
+        """
+        Yield the rows of a section in lists of at most page_size (all at once
+        when page_size is None). The section is read by a single query whose
+        cursor the driver fetches in batches, so memory stays bounded without
+        the server re-running the query for every page.
+        """
+        if section == 'nodes' and label is not None:
+            cursor = self._run(self.export_label_nodes_query.replace('{label}', label), label=label)
+        else:
+            cursor = self._run(self.export_queries[section])
+        page = []
+        for record in cursor:
+            page.append(dict(record))
+            if page_size and len(page) >= page_size:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def statistics(self):
+        return self._run("""
+            MATCH (n)
+            WHERE NOT n:ClassHierarchy AND NOT n:MethodInheritance
+            RETURN 
+                count(n) as nodes,
+                count(DISTINCT labels(n)) as node_types
+        """).data()[0]
+
+
+def graph_store(graph):
+    """Return the store for a graph: py2neo Graphs are wrapped, stores pass through"""
+    if isinstance(graph, (Neo4jGraphStore, LocalGraphStore)):
+        return graph
+    return Neo4jGraphStore(graph)
+
+
+def _graph_uid(*parts):
+    """Stable identifier for a graph node, built from its qualified path and name"""
+    return ':'.join(str(part) for part in parts)
+
+
+def _file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _analyze_file_safely(analyzer, file_path):
+    try:
+        return analyzer._analyze_file(file_path)
+    except Exception as file_error:
+        print(f"Error analyzing file {os.path.basename(file_path)}: {file_error}")
+        return None
+
+
+# Each pool worker builds its own analyzer once instead of receiving it with every task.
+_scan_worker_analyzer = None
+
+
+def _init_scan_worker(repo_path, parse_timeout, max_file_size):
+    global _scan_worker_analyzer
+    _scan_worker_analyzer = RepositoryAnalyzer(repo_path, parse_timeout=parse_timeout,
+                                               max_file_size=max_file_size)
+
+
+def _scan_worker_analyze_file(file_path):
+    return _analyze_file_safely(_scan_worker_analyzer, file_path)
+
+
+def connect_to_neo4j(uri, username, password):
+    try:
+        # py2neo is only needed, and only imported, when a Neo4j server is configured
+        from py2neo import Graph
+        return Graph(uri, auth=(username, password))
+    except Exception as e:
+        print(f"Neo4j Connection Error: {e}")
+        traceback.print_exc()
+        return None
+
+
+file_type_detector = []
+
+
+def detect_file_type(file_path):
+    try:
+        # One libmagic handle serves every call instead of opening a new one per file
+        if not file_type_detector:
+            import magic
+            file_type_detector.append(magic.Magic(mime=True))
+        file_type = file_type_detector[0].from_file(file_path)
+        return file_type
+    except Exception as e:
+        print(f"Error detecting file type: {e}")
+        return None
+
+
+def sanitize_input_content(content):
+    try:
+        max_content_length = 100000
+        if len(content) > max_content_length:
+            print(f"Content truncated to {max_content_length} characters")
+            return content[:max_content_length]
+        return content
+    except Exception as e:
+        print(f"Content sanitization error: {e}")
+        return content
+
+
+# Labels of nodes that belong to a single source file (tagged with source_file)
+file_owned_labels = PARSER_REGISTRY.file_labels() + ["ModuleNamespace", "Class", "Method",
+                                                     "ClassAttribute", "Function", "Import"]
+# Labels the build and export queries match on name
+name_indexed_labels = ["Class", "Method", "ModuleNamespace", "Import"]
+
+
+def build_repository_knowledge_graph(graph, repository_details, batch_size=5000,
+                                     upsert=False, changed_files=None, deleted_files=None, metrics=None):
+    """
+    Build an enhanced knowledge graph with improved class relationships and method details
+    
+    Nodes and relationships are collected in a GraphBatchWriter and written in
+    batches to graph, a Neo4j connection or a graph store. Inheritance, sibling and method override relationships are derived
+    in memory from the parsed classes before anything is written.
+    The class hierarchy and method inheritance sections of the export are
+    also computed here and stored as precomputed rows, so the export reads
+    them instead of expanding variable-length INHERITS_FROM paths.
+    
+    Every node carries a stable uid and file-level nodes carry their source_file.
+    Without upsert the database is cleared and rebuilt. With upsert, nodes are
+    merged on their uid and only the nodes of changed_files and deleted_files
+    (paths relative to the repository root; None means every file) are replaced,
+    leaving the rest of the database in place. Upserts rely on the uid
+    constraints created by provision_graph_schema.
+    
+    The numbers of nodes, relationships and precomputed rows written are
+    counted in metrics, a PipelineMetrics, when given.
+    """
+    repository_root = repository_details['root']
+    repo_uid = _graph_uid("Repository", repository_root)
+    store = graph_store(graph)
+    writer = GraphBatchWriter(store, batch_size=batch_size, merge=upsert)
+    
+    if upsert:
+        known_repository = store.repository_exists(repo_uid)
+        if changed_files is None or not known_repository:
+            stale_files = {file_info['path'] for directory in repository_details['directories']
+                           for file_info in directory['files']}
+        else:
+            stale_files = {os.path.join(repository_root, path) for path in changed_files}
+        stale_files.update(os.path.join(repository_root, path) for path in deleted_files or [])
+        affected_classes = writer.remove_file_nodes(file_owned_labels, stale_files)
+    else:
+        store.delete_all()
+        stale_files = None
+        affected_classes = set()
+    
+    
+    repo_node = writer.create_node("Repository", 
+                    uid=repo_uid,
+                    name=repository_root,
+                    total_files=sum(len(d['files']) for d in repository_details['directories']),
+                    created_at=str(datetime.now()))
+    
+    node_registry = {repository_root: repo_node}
+    module_nodes = {} 
+    class_uids = {}
+    used_uids = set()
+    class_records = []
+    class_methods = []
+    
+    def unique_uid(*parts):
+        uid = _graph_uid(*parts)
+        candidate, occurrence = uid, 1
+        while candidate in used_uids:
+            occurrence += 1
+            candidate = f"{uid}#{occurrence}"
+        used_uids.add(candidate)
+        return candidate
+    
+    def create_module_hierarchy(file_path):
+        """Create module hierarchy nodes and relationships"""
+        parts = os.path.relpath(file_path, repository_root).split(os.sep)
+        current_path = repository_root
+        parent_node = node_registry[current_path]
+        
+        for part in parts[:-1]:  
+            current_path = os.path.join(current_path, part)
+            if current_path not in module_nodes:
+                module_node = writer.create_node("Module", 
+                                uid=_graph_uid("Module", current_path),
+                                name=part,
+                                full_path=current_path,
+                                is_package=os.path.exists(os.path.join(current_path, '__init__.py')))
+                module_nodes[current_path] = module_node
+                
+                writer.create_relationship(parent_node, "CONTAINS", module_node)
+            
+            parent_node = module_nodes[current_path]
+        
+        return parent_node
+    
+    def create_file_node(write, label, uid, source_file, **properties):
+        """Queue a node owned by a source file, or refer to the stored one if the file is unchanged"""
+        if write:
+            return writer.create_node(label, uid=uid, source_file=source_file, **properties)
+        return writer.reference_node(label, uid)
+        
+    def create_class_structure(file_node, class_info, module_node, file_path, write):
+        """Create enhanced class structure with detailed relationships"""
+       
+        class_uid = unique_uid("Class", file_path, class_info['name'])
+        class_node = create_file_node(write, "Class", class_uid, file_path,
+                        name=class_info['name'],
+                        docstring=class_info.get('docstring', ''),
+                        total_methods=len(class_info.get('methods', [])) + 
+                                    len(class_info.get('class_methods', [])) +
+                                    len(class_info.get('static_methods', [])),
+                        total_attributes=len(class_info.get('attributes', [])),
+                        is_abstract=any('abstractmethod' in m.get('decorators', []) 
+                                    for m in class_info.get('methods', [])))
+        class_uids[class_node] = class_uid
+        class_records.append((class_node, class_info['name'], class_info.get('bases', []), file_path))
+        if write:
+            affected_classes.add(class_uid)
+        
+        
+        if write:
+            writer.create_relationship(file_node, "DEFINES", class_node)
+            writer.create_relationship(module_node, "CONTAINS", class_node)
+        
+        
+        for method_type in ['methods', 'class_methods', 'static_methods', 'properties']:
+            for method in class_info.get(method_type, []):
+                method_node = create_file_node(
+                    write,
+                    "Method",
+                    unique_uid("Method", file_path, class_info['name'], method_type, method['name']),
+                    file_path,
+                    name=method['name'],
+                    parameters=','.join(method.get('parameters', [])),
+                    docstring=method.get('docstring', ''),
+                    returns=method.get('returns'),
+                    method_type=method_type,
+                    decorators=','.join(method.get('decorators', [])),
+                    is_abstract='abstractmethod' in method.get('decorators', []),
+                    is_property='property' in method.get('decorators', []),
+                    parameter_count=len(method.get('parameters', [])),
+                    has_return_type=method.get('returns') is not None
+                )
+                
+                if write:
+                    writer.create_relationship(class_node, "HAS_METHOD", method_node,
+                                        method_type=method_type)
+                class_methods.append((class_node, method_node, method['name']))
+        
+        
+        if not write:
+            return
+        for attr in class_info.get('attributes', []):
+            attr_node = writer.create_node(
+                "ClassAttribute",
+                uid=unique_uid("ClassAttribute", file_path, class_info['name'], attr['name']),
+                source_file=file_path,
+                name=attr['name'],
+                type_hint=attr.get('type_hint'),
+                has_type_annotation=attr.get('type_hint') is not None
             )
             
-            build_repository_knowledge_graph(graph, repository_details)
-            print("Knowledge graph created successfully!")
+            writer.create_relationship(class_node, "HAS_ATTRIBUTE", attr_node)
+    
+    def process_source_file(file_info, parent_module_node):
+        """Process a parsed source file with enhanced module relationships"""
+        backend = PARSER_REGISTRY.backend_for(file_info.get('extension', ''))
+        if backend is None or backend.file_label is None:
+            return
+        
+        file_path = file_info['path']
+        write = stale_files is None or file_path in stale_files
             
+        file_node = create_file_node(
+            write,
+            backend.file_label,
+            _graph_uid(backend.file_label, file_path),
+            file_path,
+            name=file_info['name'],
+            path=file_path,
+            size=file_info['size'],
+            has_classes=bool(file_info.get('classes')),
+            has_functions=bool(file_info.get('functions')),
+            import_count=len(file_info.get('imports', []))
+        )
+        
+        module_node = create_file_node(
+            write,
+            "ModuleNamespace",
+            _graph_uid("ModuleNamespace", file_path),
+            file_path,
+            name=os.path.splitext(file_info['name'])[0],
+            docstring=file_info.get('module', {}).get('docstring', ''),
+            file_path=file_path
+        )
+        
+        if write:
+            writer.create_relationship(parent_module_node, "CONTAINS", file_node)
+            writer.create_relationship(file_node, "DEFINES", module_node)
+        
+       
+        if 'classes' in file_info:
+            for class_info in file_info['classes']:
+                create_class_structure(file_node, class_info, module_node, file_path, write)
+        
+        if not write:
+            return
+        
+        if 'functions' in file_info:
+            for func_name, func_info in file_info['functions'].items():
+                func_node = writer.create_node(
+                    "Function",
+                    uid=unique_uid("Function", file_path, func_name),
+                    source_file=file_path,
+                    name=func_name,
+                    parameters=','.join(func_info.get('parameters', [])),
+                    docstring=func_info.get('docstring', ''),
+                    returns=func_info.get('returns'),
+                    decorators=','.join(func_info.get('decorators', [])),
+                    parameter_count=len(func_info.get('parameters', [])),
+                    has_return_type=func_info.get('returns') is not None
+                )
+                
+                writer.create_relationship(module_node, "DEFINES", func_node)
+        
+        
+        if 'imports' in file_info:
+            for import_name in file_info['imports']:
+                import_parts = import_name.split('.')
+                import_node = writer.create_node(
+                    "Import",
+                    uid=unique_uid("Import", file_path, import_name),
+                    source_file=file_path,
+                    name=import_name,
+                    base_package=import_parts[0],
+                    is_relative=import_name.startswith('.')
+                )
+                
+                writer.create_relationship(module_node, "IMPORTS", import_node)
+    
+    def resolve_class_parents():
+        """
+        Resolve class bases by name across all parsed files.
+        
+        A base defined in the same file wins; otherwise the candidate with the
+        smallest uid is used, so the result does not depend on file order.
+        """
+        classes_by_name = defaultdict(list)
+        for class_node, class_name, _, file_path in class_records:
+            classes_by_name[class_name].append((class_uids[class_node], class_node, file_path))
+        
+        class_parents = {}
+        for class_node, _, bases, file_path in class_records:
+            parents = []
+            for base in bases:
+                candidates = classes_by_name.get(base) or classes_by_name.get(base.rsplit('.', 1)[-1], [])
+                candidates = [candidate for candidate in candidates if candidate[1] != class_node]
+                if not candidates:
+                    continue
+                same_file = [candidate for candidate in candidates if candidate[2] == file_path]
+                parent_node = min(same_file or candidates)[1]
+                if parent_node not in parents:
+                    parents.append(parent_node)
+            class_parents[class_node] = parents
+        return class_parents
+    
+    def inheritance_closure(class_parents):
+        """Map each class to its (ancestor, inheritance_level) pairs, nearest first"""
+        class_ancestors = {}
+        for class_node in class_parents:
+            ancestors = []
+            seen = {class_node}
+            frontier = class_parents[class_node]
+            level = 1
+            while frontier:
+                next_frontier = []
+                for ancestor_node in frontier:
+                    if ancestor_node in seen:
+                        continue
+                    seen.add(ancestor_node)
+                    ancestors.append((ancestor_node, level))
+                    next_frontier.extend(class_parents.get(ancestor_node, []))
+                frontier = next_frontier
+                level += 1
+            class_ancestors[class_node] = ancestors
+        return class_ancestors
+    
+    def create_ancestor_relationships(class_node, ancestors):
+        for ancestor_node, level in ancestors:
+            if level == 1:
+                continue
             
-            json_graph_structure = export_knowledge_graph_json_structure(graph)
-            print("JSON representation of knowledge graph generated.")
+            writer.create_relationship(class_node, "INHERITS_FROM", ancestor_node,
+                                    direct=False,
+                                    inheritance_level=level)
             
-            result = graph.run("""
-                MATCH (n)
-                RETURN 
-                    count(n) as nodes,
-                    count(DISTINCT labels(n)) as node_types
-            """).data()[0]
             
-            print(f"Graph Statistics:")
-            print(f"Total nodes: {result['nodes']}")
-            print(f"Node types: {result['node_types']}")
+            if level == 2:
+                writer.create_relationship(ancestor_node, "HAS_GRANDCHILD", class_node)
+            else:
+                writer.create_relationship(ancestor_node, "HAS_DESCENDANT", class_node,
+                                        inheritance_level=level)
+    
+    def create_sibling_relationships(class_parents, class_names, needs_derived):
+        """Link classes that share a direct parent, using a parent -> children index"""
+        class_children = defaultdict(list)
+        for class_node, parents in class_parents.items():
+            for parent_node in parents:
+                class_children[parent_node].append(class_node)
+        
+        for class_node, parents in class_parents.items():
+            for parent_node in parents:
+                for sibling_node in class_children[parent_node]:
+                    if sibling_node == class_node:
+                        continue
+                    # Each side of a pair adds the edge pointing away from it; an
+                    # upsert also re-adds edges of unchanged siblings, which MERGE keeps single.
+                    if needs_derived(class_uids[class_node]) or needs_derived(class_uids[sibling_node]):
+                        writer.create_relationship(
+                            class_node, 
+                            "IS_SIBLING_OF", 
+                            sibling_node,
+                            common_parent=class_names[parent_node]
+                        )
+    
+    def create_method_overrides(class_ancestors, class_names, needs_derived):
+        """Link methods to same-named methods of ancestors, using a (class, method name) index"""
+        methods_by_class = defaultdict(list)
+        for class_node, method_node, method_name in class_methods:
+            methods_by_class[(class_node, method_name)].append(method_node)
+        
+        for class_node, method_node, method_name in class_methods:
+            if not needs_derived(class_uids[class_node]):
+                continue
+            for ancestor_node, _ in class_ancestors[class_node]:
+                for parent_method in methods_by_class.get((ancestor_node, method_name), []):
+                    writer.create_relationship(
+                        method_node, 
+                        "OVERRIDES", 
+                        parent_method,
+                        parent_class=class_names[ancestor_node]
+                    )
+    
+    def longest_parent_chains(class_parents):
+        """
+        Map each class to {ancestor: length of the longest chain of direct
+        parents leading to it}. Edges closing an inheritance cycle are ignored.
+        """
+        chain_lengths = {}
+        for start_node in class_parents:
+            if start_node in chain_lengths:
+                continue
+            in_progress = {start_node}
+            stack = [(start_node, iter(class_parents[start_node]))]
+            while stack:
+                class_node, parents = stack[-1]
+                for parent_node in parents:
+                    if parent_node not in chain_lengths and parent_node not in in_progress:
+                        in_progress.add(parent_node)
+                        stack.append((parent_node, iter(class_parents.get(parent_node, []))))
+                        break
+                else:
+                    stack.pop()
+                    in_progress.discard(class_node)
+                    lengths = {}
+                    for parent_node in class_parents.get(class_node, []):
+                        if parent_node in in_progress:
+                            continue
+                        lengths[parent_node] = max(lengths.get(parent_node, 0), 1)
+                        for ancestor_node, length in chain_lengths[parent_node].items():
+                            if ancestor_node != class_node and lengths.get(ancestor_node, 0) <= length:
+                                lengths[ancestor_node] = length + 1
+                    chain_lengths[class_node] = lengths
+        return chain_lengths
+    
+    def summarize_class_hierarchies(class_parents, class_ancestors, class_names):
+        """
+        Rows of the class_hierarchies export section, deepest first: for each
+        class and path length, the ancestors reachable over that many
+        INHERITS_FROM edges. As indirect edges are materialized, those are the
+        ancestors whose longest chain of direct parents is at least that long.
+        """
+        chain_lengths = longest_parent_chains(class_parents)
+        rows = []
+        for class_node, ancestors in class_ancestors.items():
+            lengths = {ancestor_node: chain_lengths[class_node].get(ancestor_node, level)
+                       for ancestor_node, level in ancestors}
+            for depth in range(1, max(lengths.values(), default=0) + 1):
+                names = dict.fromkeys(class_names[ancestor_node] for ancestor_node, _ in ancestors
+                                      if lengths[ancestor_node] >= depth)
+                rows.append({'root_class': class_names[class_node], 'ancestors': list(names),
+                             'depth': depth})
+        rows.sort(key=lambda row: -row['depth'])
+        for position, row in enumerate(rows):
+            row['position'] = position
+        return rows
+    
+    def summarize_method_inheritance(class_ancestors, class_names):
+        """
+        Rows of the method_inheritance export section: for each method name
+        and class name defining it, the names of descendant classes that
+        define a method of the same name.
+        """
+        method_names = defaultdict(dict)
+        for class_node, _, method_name in class_methods:
+            method_names[class_node][method_name] = None
+        
+        derived_by_method = {}
+        for class_node, ancestors in class_ancestors.items():
+            own_methods = method_names.get(class_node)
+            if not own_methods:
+                continue
+            for ancestor_node, _ in ancestors:
+                for method_name in method_names.get(ancestor_node, ()):
+                    if method_name in own_methods:
+                        derived_classes = derived_by_method.setdefault(
+                            (method_name, class_names[ancestor_node]), {})
+                        derived_classes[class_names[class_node]] = None
+        
+        return [{'position': position, 'base_method': method_name, 'base_class': base_class,
+                 'derived_classes': list(derived_classes), 'derived_methods': [method_name]}
+                for position, ((method_name, base_class), derived_classes)
+                in enumerate(derived_by_method.items())]
+    
+    
+    for directory in repository_details['directories']:
+        parent_module_node = create_module_hierarchy(directory['path'])
+        for file_info in directory['files']:
+            process_source_file(file_info, parent_module_node)
+    
+    class_parents = resolve_class_parents()
+    class_ancestors = inheritance_closure(class_parents)
+    
+    if upsert:
+        # Classes below a rewritten class need their relationships rebuilt too
+        for class_node, ancestors in class_ancestors.items():
+            if any(class_uids[ancestor_node] in affected_classes for ancestor_node, _ in ancestors):
+                affected_classes.add(class_uids[class_node])
+        writer.clear_class_relationships(affected_classes)
+    
+    def needs_derived(class_uid):
+        return not upsert or class_uid in affected_classes
+    
+    for class_node, parents in class_parents.items():
+        for parent_node in parents:
+            writer.create_relationship(class_node, "INHERITS_FROM", parent_node,
+                                    direct=True,
+                                    inheritance_level=1)
+            writer.create_relationship(parent_node, "HAS_CHILD", class_node,
+                                    direct=True,
+                                    inheritance_level=1)
+        if needs_derived(class_uids[class_node]):
+            create_ancestor_relationships(class_node, class_ancestors[class_node])
+    
+    class_names = {class_node: class_name for class_node, class_name, _, _ in class_records}
+    create_sibling_relationships(class_parents, class_names, needs_derived)
+    create_method_overrides(class_ancestors, class_names, needs_derived)
+    
+    writer.flush()
+    # The hierarchy sections of the export depend on every class of the
+    # repository, so its rows are recomputed in full on each build rather
+    # than patched; rows of other repositories in the graph stay
+    writer.replace_summary('class_hierarchies',
+                           summarize_class_hierarchies(class_parents, class_ancestors, class_names), repo_uid)
+    writer.replace_summary('method_inheritance', summarize_method_inheritance(class_ancestors, class_names),
+                           repo_uid)
+    if metrics is not None:
+        metrics.count('nodes_written', writer.nodes_written)
+        metrics.count('relationships_written', writer.relationships_written)
+        metrics.count('summary_rows_written', writer.summary_rows_written)
+    # i=build_repository_knowledge_graph(graph,repository_details)
+    # print(i)
+def node_entry(properties):
+    return {
+        'name': properties.get('name', ''),
+        'details': properties
+    }
+
+
+def inheritance_entry(rel):
+    return {
+        'derived_id': str(rel['derived_id']),
+        'derived_name': rel['derived_name'],
+        'base_id': str(rel['base_id']),
+        'base_name': rel['base_name'],
+        'is_direct': rel['is_direct'],
+        'inheritance_level': rel['inheritance_level']
+    }
+
+
+def override_entry(rel):
+    return {
+        'method': {
+            'id': str(rel['method_id']),
+            'name': rel['method_name'],
+            'class': {
+                'id': str(rel['derived_class_id']),
+                'name': rel['derived_class']
+            }
+        },
+        'overridden': {
+            'method_id': str(rel['parent_method_id']),
+            'method_name': rel['parent_method_name'],
+            'class': {
+                'id': str(rel['parent_class_id']),
+                'name': rel['parent_class']
+            }
+        }
+    }
+
+
+def sibling_entry(rel):
+    return {
+        'class': {
+            'id': str(rel['class_id']),
+            'name': rel['class_name']
+        },
+        'sibling': {
+            'id': str(rel['sibling_id']),
+            'name': rel['sibling_name']
+        },
+        'common_parent': rel['common_parent']
+    }
+
+
+def import_entry(rel):
+    return {
+        'module': {
+            'id': str(rel['module_id']),
+            'name': rel['module_name']
+        },
+        'import': {
+            'id': str(rel['import_id']),
+            'name': rel['import_name'],
+            'base_package': rel['base_package'],
+            'is_relative': rel['is_relative']
+        }
+    }
+
+
+def class_hierarchy_entry(hierarchy):
+    return hierarchy['root_class'], {
+        'ancestors': hierarchy['ancestors'],
+        'depth': hierarchy['depth']
+    }
+
+
+def method_inheritance_entry(inheritance):
+    return inheritance['base_method'], {
+        'base_class': inheritance['base_class'],
+        'inherited_by': {
+            'classes': inheritance['derived_classes'],
+            'methods': inheritance['derived_methods']
+        }
+    }
+
+
+relationship_entries = {
+    'inheritance': inheritance_entry,
+    'method_overrides': override_entry,
+    'sibling_relationships': sibling_entry,
+    'import_relationships': import_entry,
+}
+
+
+hierarchy_entries = {
+    'class_hierarchies': class_hierarchy_entry,
+    'method_inheritance': method_inheritance_entry,
+}
+
+
+export_sections = ['nodes', *relationship_entries, *hierarchy_entries]
+
+
+# Text written before each section of the streamed document
+section_prefixes = {
+    'nodes': '{',
+    **{section: ',"relationships":{' if section_index == 0 else ','
+       for section_index, section in enumerate(relationship_entries)},
+    **{section: '},"hierarchies":{' if section_index == 0 else ','
+       for section_index, section in enumerate(hierarchy_entries)},
+}
+
+
+def run_export_sections(store, read_section, workers):
+    """
+    Call read_section(store, section) for every export section and return
+    the results in section order. With more than one worker the sections
+    run concurrently, each on its own store session.
+    """
+    if workers <= 1:
+        return [read_section(store, section) for section in export_sections]
+    
+    sessions = []
+    
+    def read_in_session(section):
+        session = store.session()
+        sessions.append(session)
+        try:
+            return read_section(session, section)
+        finally:
+            session.close()
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(read_in_session, export_sections))
+    finally:
+        store.round_trips += sum(session.round_trips for session in sessions)
+
+
+def export_knowledge_graph_json_structure(graph, output_file='knowledge_graph_structure.json',
+                                          stream=False, page_size=5000, workers=1):
+    """
+    Export a comprehensive JSON representation of the knowledge graph 
+    with all relationships, inheritance hierarchies, and detailed node information
+    
+    Args:
+        graph: Neo4j graph connection or graph store
+        output_file (str): Path to output JSON file
+        stream (bool): Write the file page by page instead of building it in memory
+        page_size (int): Number of records read per page when streaming
+        workers (int): Number of sections read concurrently
+    
+    Returns:
+        dict: Comprehensive knowledge graph structure, or the per-section
+        record counts when streaming
+    """
+    store = graph_store(graph)
+    if stream:
+        return stream_knowledge_graph_json_structure(store, output_file, page_size, workers)
+    
+    try:
+        
+        knowledge_graph = {
+            'nodes': {},
+            'relationships': {
+                'inheritance': [],
+                'method_overrides': [],
+                'sibling_relationships': [],
+                'import_relationships': []
+            },
+            'hierarchies': {
+                'class_hierarchies': {},
+                'method_inheritance': {}
+            }
+        }
+
+        section_rows = dict(zip(export_sections, run_export_sections(
+            store, lambda session, section: session.export_rows(section), workers)))
+
+        for node in section_rows['nodes']:
+            node_type = node['type']
             
-            return json_graph_structure
-        except Exception as e:
-            print(f"Error creating knowledge graph: {e}")
+           
+            if node_type not in knowledge_graph['nodes']:
+                knowledge_graph['nodes'][node_type] = {}
+            
+            knowledge_graph['nodes'][node_type][str(node['node_id'])] = node_entry(node['properties'])
 
+        for section, to_entry in relationship_entries.items():
+            for rel in section_rows[section]:
+                knowledge_graph['relationships'][section].append(to_entry(rel))
+
+        for section, to_entry in hierarchy_entries.items():
+            for record in section_rows[section]:
+                key, entry = to_entry(record)
+                knowledge_graph['hierarchies'][section][key] = entry
+
+        
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(knowledge_graph, f, indent=2)
+
+        print(f"Comprehensive knowledge graph JSON exported to {output_file}")
+        return knowledge_graph
+
+    except Exception as e:
+        print(f"Error exporting knowledge graph JSON: {e}")
+        traceback.print_exc()
+        return None
+
+
+def dumps_compact(value):
+    return json.dumps(value, separators=(',', ':'))
+
+
+def write_export_section(store, section, f, page_size):
+    """Write one section of the streamed document, key included; returns its record count"""
+    count = 0
+    if section == 'nodes':
+        f.write('"nodes":{')
+        first_label = True
+        for label in store.export_labels():
+            first_node = True
+            for records in store.export_pages('nodes', page_size, label=label):
+                for node in records:
+                    if first_node:
+                        f.write(('' if first_label else ',') + dumps_compact(label) + ':{')
+                        first_label = first_node = False
+                    else:
+                        f.write(',')
+                    f.write(dumps_compact(str(node['node_id'])) + ':' +
+                            dumps_compact(node_entry(node['properties'])))
+                    count += 1
+            if not first_node:
+                f.write('}')
+        f.write('}')
+    elif section in relationship_entries:
+        to_entry = relationship_entries[section]
+        f.write(dumps_compact(section) + ':[')
+        for records in store.export_pages(section, page_size):
+            for rel in records:
+                f.write((',' if count else '') + dumps_compact(to_entry(rel)))
+                count += 1
+        f.write(']')
+    else:
+        to_entry = hierarchy_entries[section]
+        f.write(dumps_compact(section) + ':{')
+        for records in store.export_pages(section, page_size):
+            for record in records:
+                key, entry = to_entry(record)
+                # Repeated keys are written again; as with the dict export,
+                # readers keep the last value.
+                f.write((',' if count else '') + dumps_compact(key) + ':' + dumps_compact(entry))
+                count += 1
+        f.write('}')
+    return count
+
+
+def stream_knowledge_graph_json_structure(store, output_file, page_size=5000, workers=1):
+    """
+    Write the same JSON document as export_knowledge_graph_json_structure
+    while reading the graph one page at a time, so memory use stays bounded
+    by the page size rather than the graph size.
+    
+    With more than one worker the sections are read concurrently, each
+    spooled to a temporary file, and the files are then concatenated in
+    section order.
     
+    Returns:
+        dict: Number of records written per section
+    """
+    try:
+        counts = {}
+        with open(output_file, 'w', encoding='utf-8') as f:
+            if workers <= 1:
+                for section in export_sections:
+                    f.write(section_prefixes[section])
+                    counts[section] = write_export_section(store, section, f, page_size)
+            else:
+                def spool_section(session, section):
+                    spool = tempfile.TemporaryFile('w+', encoding='utf-8')
+                    try:
+                        return spool, write_export_section(session, section, spool, page_size)
+                    except BaseException:
+                        spool.close()
+                        raise
+                
+                spools = run_export_sections(store, spool_section, workers)
+                for section, (spool, count) in zip(export_sections, spools):
+                    with spool:
+                        spool.seek(0)
+                        f.write(section_prefixes[section])
+                        shutil.copyfileobj(spool, f)
+                    counts[section] = count
+            f.write('}}')
+
+        print(f"Comprehensive knowledge graph JSON streamed to {output_file}")
+        return counts
+
+    except Exception as e:
+        print(f"Error streaming knowledge graph JSON: {e}")
+        traceback.print_exc()
+        return None
+
+
+# Used by the local graph store when KG_LOCAL_DB is not set: one file per
+# repository, so the graph outlives the process like a Neo4j graph while
+# analyses of different repositories running at once never share (and wipe)
+# a database. Set KG_LOCAL_DB=:memory: for a graph that is discarded at exit.
+DEFAULT_LOCAL_GRAPH_DIR = os.path.join(tempfile.gettempdir(), 'codeinsights', 'knowledge_graphs')
+
+
+def default_local_graph_path(repository_root):
+    """Database file of the local graph of the repository at repository_root"""
+    digest = hashlib.sha256(os.path.abspath(repository_root).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(DEFAULT_LOCAL_GRAPH_DIR, f"knowledge_graph_{digest}.sqlite3")
+
+
+def open_local_graph_store(reason, repository_root=None):
+    path = os.getenv('KG_LOCAL_DB') or (default_local_graph_path(repository_root) if repository_root else ':memory:')
+    if path != ':memory:' and not path.startswith('file:'):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    print(f"Graph backend: local SQLite store at {path} ({reason})")
+    return LocalGraphStore(path)
+
+
+def open_graph_store(repository_root=None):
+    """
+    Open the graph store selected by KG_BACKEND: 'neo4j' (default) or
+    'local' for the embedded SQLite store at KG_LOCAL_DB, which defaults to
+    default_local_graph_path(repository_root), or to an in-memory graph when
+    no repository is given. When Neo4j is not configured or cannot be
+    reached the local store is used instead. The backend picked is logged.
+    """
+    if os.getenv('KG_BACKEND', 'neo4j').lower() == 'local':
+        return open_local_graph_store("KG_BACKEND=local", repository_root)
+    if not os.getenv('NEO4J_URI'):
+        return open_local_graph_store("NEO4J_URI is not set", repository_root)
+    graph = connect_to_neo4j(
+        uri=os.getenv('NEO4J_URI'),
+        username=os.getenv('NEO4J_USER'),
+        password=os.getenv('NEO4J_PASSWORD')
+    )
+    if graph is None:
+        return open_local_graph_store("Neo4j is unavailable", repository_root)
+    print(f"Graph backend: Neo4j at {os.getenv('NEO4J_URI')}")
+    return Neo4jGraphStore(graph)
+
+
+def provision_graph_schema(store):
+    """
+    Idempotently create the constraints and indexes the build and export
+    queries look nodes up by, then report for each query whether its plan
+    uses an index or scans. Both steps are best effort: a failure is
+    reported as a warning and the build goes on without the missing parts.
+    """
+    try:
+        store.ensure_schema(["Repository", "Module"] + file_owned_labels, file_owned_labels,
+                            name_indexed_labels)
+    except Exception as schema_error:
+        print(f"Warning: could not provision the graph schema: {schema_error}")
+    try:
+        query_plans = store.explain_queries()
+    except Exception as explain_error:
+        print(f"Warning: could not explain the graph queries: {explain_error}")
+        return {}
+    for name, plan in query_plans.items():
+        if plan['uses_index']:
+            print(f"Query {name}: uses index ({'; '.join(plan['index_lookups'])})")
+        else:
+            print(f"Query {name}: no index")
+        if plan['scans']:
+            print(f"Query {name}: scans {'; '.join(plan['scans'])}")
+    return query_plans
+
+
+def create_knowledge_graph(repository_details, changed_files=None, deleted_files=None, metrics=None):
+    try:
+        if metrics is None:
+            metrics = PipelineMetrics()
+        with metrics.phase('graph_connect'):
+            store = open_graph_store(repository_details['root'])
+        with metrics.phase('graph_schema', store):
+            provision_graph_schema(store)
+        
+        with metrics.phase('graph_build', store):
+            build_repository_knowledge_graph(
+                store, repository_details,
+                batch_size=int(os.getenv('NEO4J_BATCH_SIZE', '5000')),
+                upsert=os.getenv('NEO4J_UPSERT', '').lower() in ('1', 'true', 'yes'),
+                changed_files=changed_files,
+                deleted_files=deleted_files,
+                metrics=metrics
+            )
+        print("Knowledge graph created successfully!")
+        
+        
+        stream = os.getenv('KG_EXPORT_STREAM', '').lower() in ('1', 'true', 'yes')
+        with metrics.phase('graph_export', store):
+            json_graph_structure = export_knowledge_graph_json_structure(
+                store,
+                stream=stream,
+                page_size=int(os.getenv('KG_EXPORT_PAGE_SIZE', '5000')),
+                workers=int(os.getenv('KG_EXPORT_WORKERS', '1'))
+            )
+            if json_graph_structure is not None:
+                if stream:
+                    records_exported = sum(json_graph_structure.values())
+                else:
+                    records_exported = sum(len(nodes) for nodes in json_graph_structure['nodes'].values())
+                    records_exported += sum(len(entries) for group in ('relationships', 'hierarchies')
+                                            for entries in json_graph_structure[group].values())
+                metrics.count('records_exported', records_exported)
+        print("JSON representation of knowledge graph generated.")
+        
+        result = store.statistics()
+        
+        print(f"Graph Statistics:")
+        print(f"Total nodes: {result['nodes']}")
+        print(f"Node types: {result['node_types']}")
+        
+        return json_graph_structure
+    except Exception as e:
+        print(f"Error creating knowledge graph: {e}")
+
+
+def generate_codebase_structure(repo_path, metrics=None):
+    """
+    Main function to generate codebase structure and create knowledge graph
+    
+    Args:
+        repo_path (str): Path to the repository
+        metrics (PipelineMetrics): Receives the timings and counters of every
+            phase; a new one is used when not given
+    
+    Returns:
+        PipelineMetrics: The metrics of this run. Creates the knowledge graph
+        and knowledge_graph_structure.json. With ANALYZE_METRICS_LOG set, the
+        metrics are also logged as one JSON line per phase.
+    """
+    if metrics is None:
+        metrics = PipelineMetrics()
     try:
         
-        analyzer = RepositoryAnalyzer(repo_path)
+        deny_dirs = os.getenv('ANALYZE_DENY_DIRS')
+        if deny_dirs is not None:
+            deny_dirs = [name.strip() for name in deny_dirs.split(',') if name.strip()]
+        elif os.getenv('ANALYZE_SKIP_BUILD_DIRS', '').lower() in ('1', 'true', 'yes'):
+            deny_dirs = DEFAULT_DENY_DIRS + BUILD_DENY_DIRS
+        analyzer = RepositoryAnalyzer(
+            repo_path,
+            max_workers=int(os.getenv('ANALYZE_WORKERS', '1')),
+            chunk_size=int(os.getenv('ANALYZE_CHUNK_SIZE', '32')),
+            manifest_path=os.getenv('ANALYZE_MANIFEST') or None,
+            parse_timeout=float(os.getenv('ANALYZE_PARSE_TIMEOUT', '5')),
+            deny_dirs=deny_dirs,
+            max_file_size=int(os.getenv('ANALYZE_MAX_FILE_SIZE', str(DEFAULT_MAX_FILE_SIZE))),
+            metrics=metrics
+        )
         repository_details = analyzer.analyze_repository()
 
         
         
 
         
-        create_knowledge_graph(repository_details)
+        create_knowledge_graph(repository_details, analyzer.changed_files, analyzer.deleted_files,
+                               metrics=metrics)
 
         print("Codebase analysis and knowledge graph creation completed successfully!")
 
     except Exception as e:
         print(f"Error in generate_codebase_structure: {e}")
         traceback.print_exc()
+    
+    if os.getenv('ANALYZE_METRICS_LOG', '').lower() in ('1', 'true', 'yes'):
+        metrics.log(logger)
+    return metrics
 
 
 #!/usr/bin/env python3
@@ -867,6 +1946,7 @@ import shutil
 import logging
 import argparse
 import traceback
+import contextlib
 
 #!/usr/bin/env python3
 import os
@@ -881,14 +1961,6 @@ logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def generate_codebase_structure(directory):
-    """
-    Generate a structure representation of the codebase.
-    This is a placeholder function - replace with actual implementation.
-    """
-    # Implement your codebase structure generation logic here
-    return {}
-
 def main():
     logger.info("Script started")
     
@@ -902,40 +1974,48 @@ def main():
         # Ensure temporary directory exists
         os.makedirs(temp_dir, exist_ok=True)
         
+        metrics = PipelineMetrics()
+        
         # Write input files to temporary directory
-        for file_info in input_data.get('files', []):
-            file_path = os.path.join(temp_dir, file_info['filename'])
-            
-            # Ensure directory exists
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            # Write file content
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(file_info['content'])
+        with metrics.phase('write_input_files'):
+            for file_info in input_data.get('files', []):
+                file_path = os.path.join(temp_dir, file_info['filename'])
+                
+                # Ensure directory exists
+                os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                
+                # Write file content
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    f.write(file_info['content'])
+                metrics.count('input_files')
 
-        # Generate codebase structure
-        analysis_result = generate_codebase_structure(temp_dir)
+        # Generate codebase structure. Its progress messages go to stderr, so
+        # stdout carries nothing but the final JSON line.
+        with contextlib.redirect_stdout(sys.stderr):
+            generate_codebase_structure(temp_dir, metrics)
         
         # Try reading the knowledge graph structure
-        try:
-            # First, try reading from current directory
-            with open('knowledge_graph_structure.json', 'r') as f:
-                graph_content = json.load(f)
-        except FileNotFoundError:
-            # Fallback to temp directory
+        with metrics.phase('read_knowledge_graph'):
             try:
-                with open(os.path.join(temp_dir, 'knowledge_graph_structure.json'), 'r') as f:
+                # First, try reading from current directory
+                with open('knowledge_graph_structure.json', 'r') as f:
                     graph_content = json.load(f)
             except FileNotFoundError:
-                # If no knowledge graph found, use an empty dict or handle as needed
-                graph_content = {}
+                # Fallback to temp directory
+                try:
+                    with open(os.path.join(temp_dir, 'knowledge_graph_structure.json'), 'r') as f:
+                        graph_content = json.load(f)
+                except FileNotFoundError:
+                    # If no knowledge graph found, use an empty dict or handle as needed
+                    graph_content = {}
 
         # Prepare response
         response = {
             'success': True,
             'content': {
                 'knowledge_graph': graph_content
-            }
+            },
+            'metrics': metrics.to_dict()
         }
 
         # Write output to a file in the temp directory
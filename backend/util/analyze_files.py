@@ -1,21 +1,21 @@
 import json
+import asyncio
 import sys
 import logging
 import argparse
-import litellm
-import yaml
 import os
 import re
-import javalang
 import json
 import xml.etree.ElementTree as ET
-import esprima
 import ast
-import pycparser
-import magic
 from collections import defaultdict
 from dotenv import load_dotenv
 from typing import List, Optional, Dict, Union
+from llm_cache import (LLM_CACHE_MODES, LLMResponseCache, acached_completion, cached_completion,
+                       extract_compliance_sections)
+from batch_processing import process_batch
+from chunking import agenerate_chunked, chunk_settings, part_note, split_source
+from llm_stream import progress_stream, stream_file
 import time
 import sys
 import os
@@ -23,10 +23,19 @@ import json
 
 
 class CodeReviewSystem:
-    def __init__(self):
+    def __init__(self, llm_cache_mode: Optional[str] = None):
         load_dotenv()
         self.claude_api_key = os.getenv("CLAUD_API_KEY")
         self.open_api_key = os.getenv("OPENAI_API_KEY")
+        self.api_keys = {"openai": self.open_api_key, "anthropic": self.claude_api_key}
+        self.llm_cache = LLMResponseCache(mode=llm_cache_mode)
+        # ProgressStream set by main() when --stream is given
+        self.progress = None
+        # Several requested outputs are generated concurrently, each LLM call bounded by a timeout
+        self.concurrent_outputs = os.getenv("LLM_CONCURRENT_OUTPUTS", "on").lower() not in ("0", "false", "off")
+        self.call_timeout = float(os.getenv("LLM_CALL_TIMEOUT", "300"))
+        # Files over the chunk budget are reviewed part by part and the results merged
+        self.chunk_tokens, self.chunk_concurrency = chunk_settings()
         self.design_patterns_path = "./design_patterns.txt"
 
 
@@ -34,6 +43,7 @@ class CodeReviewSystem:
 
     def detect_file_type(self, file_path: str) -> Optional[str]:
         try:
+            import magic
             mime = magic.Magic(mime=True)
             return mime.from_file(file_path)
         except Exception as e:
@@ -61,96 +71,19 @@ class CodeReviewSystem:
 
 
 
-    def generate_litellm_response(self, prompt: str, model_name: str, provider: str) -> dict:
-        if provider.lower() == "openai":
-            return litellm.completion(
-                model=model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-            
-                seed=42,
-                top_p=0.95,
-                api_key=self.open_api_key
-            )
-        elif provider.lower() == "anthropic":
-            return litellm.completion(
-                model=model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                seed=42,
-                top_p=0.85,
-                api_key=self.claude_api_key
-            )
-        else:
-            raise ValueError(f"Unsupported provider: {provider}")
-
-
+    def generate_litellm_response(self, prompt: str, model_name: str, provider: str,
+                                  stream_as: Optional[str] = None) -> dict:
+        return cached_completion(self.llm_cache, prompt, model_name, provider, self.api_keys,
+                                 self.progress, stream_as)
 
+    async def agenerate_litellm_response(self, prompt: str, model_name: str, provider: str,
+                                         timeout: Optional[float] = None, stream_as: Optional[str] = None,
+                                         part: Optional[str] = None) -> dict:
+        return await acached_completion(self.llm_cache, prompt, model_name, provider, self.api_keys,
+                                        timeout, self.progress, stream_as, part)
 
     def ai_extract_compliance_sections(self, file_content: str, model_name: str, provider: str) -> Dict[str, str]:
-        prompt = f"""
-        Task: Extract and Structure Guidelines from the Compliance Document
-       
-        Input Document:
-        {self.sanitize_input_content(file_content)}
-       
-        Please analyze the document and extract guidelines for the following sections. Format your response using the exact structure below:
-       
-        ##review##
-        [Extract all guidelines related to code review, best practices, and quality standards]
-        ##
-       
-        ##documentation##
-        [Extract all guidelines related to documentation requirements and standards]
-        ##
-       
-        ##comments##
-        [Extract all guidelines related to code comments and inline documentation]
-        ##
-       
-        ##knowledge_graph##
-        [Extract all guidelines related to knowledge graph structure and representation]
-        ##
-       
-        If any section is not explicitly covered in the document, provide sensible default guidelines based on industry standards.
-        """
-       
-        try:
-            response = self.generate_litellm_response(prompt, model_name, provider)
-            extracted_content = response['choices'][0]['message']['content']
-           
-            sections = {
-                'review': 'Default review guidelines.',
-                'documentation': 'Default documentation guidelines.',
-                'comments': 'Default comments guidelines.',
-                'knowledge_graph': 'Default knowledge graph guidelines.'
-            }
-           
-            patterns = {
-                'review': r'##review##\s*(.*?)\s*##',
-                'documentation': r'##documentation##\s*(.*?)\s*##',
-                'comments': r'##comments##\s*(.*?)\s*##',
-                'knowledge_graph': r'##knowledge_graph##\s*(.*?)\s*##'
-            }
-           
-            for section, pattern in patterns.items():
-                match = re.search(pattern, extracted_content, re.DOTALL)
-                if match and match.group(1).strip():
-                    sections[section] = match.group(1).strip()
-           
-            return sections
-           
-        except Exception as e:
-            print(f"Error extracting compliance sections: {e}")
-            return {
-                'review': 'Error occurred. Using default review guidelines.',
-                'documentation': 'Error occurred. Using default documentation guidelines.',
-                'comments': 'Error occurred. Using default comments guidelines.',
-                'knowledge_graph': 'Error occurred. Using default knowledge graph guidelines.'
-            }
-
-
-
+        return extract_compliance_sections(self.llm_cache, file_content, model_name, provider, self.api_keys)
 
     def load_compliance_file(self, compliance_file_path: Optional[str], model_name: str, provider: str) -> Dict[str, str]:
         default_sections = {
@@ -269,6 +202,14 @@ class CodeReviewSystem:
 
 
             results = {}
+
+            requested = [output for output in ("review", "documentation", "comments") if output in output_types]
+            chunks = split_source(file_content, file_extension, self.chunk_tokens)
+            if len(chunks) > 1 or (self.concurrent_outputs and len(requested) > 1):
+                return asyncio.run(self.agenerate_outputs(
+                    requested, file_content, file_type, file_extension, compliance_sections,
+                    additional_content, model_name, provider, chunks
+                ))
            
             # Generate requested content types with error handling
             if "review" in output_types:
@@ -308,8 +249,86 @@ class CodeReviewSystem:
             print(f"Error in process_code: {e}")
             raise  # Re-raise the exception to be handled by the caller
 
+    async def agenerate_outputs(self, output_types: List[str], file_content: str, file_type: str,
+                                file_extension: str, compliance_sections: Dict[str, str],
+                                additional_content: str, model_name: str, provider: str,
+                                chunks: Optional[list] = None) -> Dict[str, str]:
+        """
+        Generate the requested outputs concurrently, so the total latency is that of
+        the slowest LLM call rather than their sum. Each output, retries included,
+        is bounded by self.call_timeout seconds. Returns the same mapping as the
+        sequential path.
+        When the file was split into several chunks, every output goes through
+        agenerate_chunked_output instead.
+        """
+        if chunks and len(chunks) > 1:
+            outcomes = await asyncio.gather(*(self.agenerate_chunked_output(
+                output, file_content, file_type, file_extension, compliance_sections,
+                additional_content, model_name, provider
+            ) for output in output_types), return_exceptions=True)
+            return self.collect_outputs(output_types, outcomes)
+
+        generators = {
+            "review": lambda: self.agenerate_review(
+                file_content, file_type, compliance_sections,
+                additional_content, model_name, provider, self.call_timeout
+            ),
+            "documentation": lambda: self.agenerate_documentation(
+                file_content, model_name, provider, compliance_sections,
+                file_extension, file_type, self.call_timeout
+            ),
+            "comments": lambda: self.agenerate_comments_or_docstrings(
+                file_content, model_name, provider, compliance_sections, self.call_timeout
+            ),
+        }
+        outcomes = await asyncio.gather(*(generators[output]() for output in output_types),
+                                        return_exceptions=True)
+        return self.collect_outputs(output_types, outcomes)
+
+    @staticmethod
+    def collect_outputs(output_types: List[str], outcomes: list) -> Dict[str, str]:
+        results = {}
+        for output, outcome in zip(output_types, outcomes):
+            if isinstance(outcome, Exception):
+                print(f"Error generating {output}: {outcome}")
+                results[output] = f"Error generating {output}: {str(outcome)}"
+            else:
+                results[output] = outcome
+        return results
 
-    def generate_comments_or_docstrings(self, file_snippet: str, model_name: str, provider: str, compliance_sections: Dict[str, str]) -> str:
+    async def agenerate_chunked_output(self, output: str, file_content: str, file_type: str,
+                                       file_extension: str, compliance_sections: Dict[str, str],
+                                       additional_content: str, model_name: str, provider: str) -> str:
+        """
+        Generate output for a file larger than the chunk budget through
+        chunking.agenerate_chunked, at most self.chunk_concurrency calls at a
+        time, each bounded by self.call_timeout seconds.
+        """
+        async def generate(text, part):
+            if output == "review":
+                return await self.agenerate_review(
+                    text, file_type, compliance_sections,
+                    additional_content, model_name, provider, self.call_timeout, part
+                )
+            if output == "documentation":
+                return await self.agenerate_documentation(
+                    text, model_name, provider, compliance_sections,
+                    file_extension, file_type, self.call_timeout, part
+                )
+            return await self.agenerate_comments_or_docstrings(
+                text, model_name, provider, compliance_sections, self.call_timeout, part
+            )
+
+        async def complete(prompt, part):
+            response = await self.agenerate_litellm_response(
+                prompt, model_name, provider, self.call_timeout, stream_as=output, part=part
+            )
+            return response['choices'][0]['message']['content']
+
+        return await agenerate_chunked(output, file_content, file_extension, file_type, generate, complete,
+                                       self.chunk_tokens, self.chunk_concurrency)
+
+    def comments_prompt(self, file_snippet: str, compliance_sections: Dict[str, str]) -> str:
         comments_guidelines = compliance_sections.get('comments', 'Default comments guidelines.')
         prompt = f"""
            
@@ -330,18 +349,34 @@ class CodeReviewSystem:
             Comments Guidelines:
             {comments_guidelines}
         """
+        return prompt
+
+    def generate_comments_or_docstrings(self, file_snippet: str, model_name: str, provider: str, compliance_sections: Dict[str, str]) -> str:
+        prompt = self.comments_prompt(file_snippet, compliance_sections)
         try:
-            response = self.generate_litellm_response(prompt, model_name, provider)
+            response = self.generate_litellm_response(prompt, model_name, provider, stream_as="comments")
             return response['choices'][0]['message']['content']
         except Exception as e:
             print(f"Error in comments generation: {e}")
             return "Comments generation failed. Default placeholder."
 
+    async def agenerate_comments_or_docstrings(self, file_snippet: str, model_name: str, provider: str,
+                                              compliance_sections: Dict[str, str], timeout: Optional[float] = None,
+                                              part: Optional[str] = None) -> str:
+        prompt = part_note(part) + self.comments_prompt(file_snippet, compliance_sections)
+        try:
+            response = await self.agenerate_litellm_response(prompt, model_name, provider, timeout,
+                                                             stream_as="comments", part=part)
+            return response['choices'][0]['message']['content']
+        except Exception as e:
+            print(f"Error in comments generation: {e}")
+            return "Comments generation failed. Default placeholder."
 
 
 
-    def generate_documentation(self, file_snippet: str, model_name: str, provider: str,
-                             compliance_sections: Dict[str, str], file_extension: str, file_type: str) -> str:
+
+    def documentation_prompt(self, file_snippet: str, compliance_sections: Dict[str, str],
+                             file_extension: str, file_type: str) -> str:
         documentation_libraries = {
             ".java": "Javadoc", ".py": "Pydoc", ".js": "JSDoc", ".jsx": "JSDOC",
             ".ts": "Typedoc", ".cpp": "Doxygen", ".c": "Doxygen", ".h": "Doxygen",
@@ -394,35 +429,48 @@ class CodeReviewSystem:
                 2. Detail each configuration option
                 3. Provide usage instructions
                 """
+        return prompt
 
+    def generate_documentation(self, file_snippet: str, model_name: str, provider: str,
+                             compliance_sections: Dict[str, str], file_extension: str, file_type: str) -> str:
+        prompt = self.documentation_prompt(file_snippet, compliance_sections, file_extension, file_type)
+        try:
+            response = self.generate_litellm_response(prompt, model_name, provider, stream_as="documentation")
+            return response['choices'][0]['message']['content']
+        except Exception as e:
+            print(f"Error in documentation generation: {e}")
+            return "Documentation generation failed. Default placeholder."
 
-
-
+    async def agenerate_documentation(self, file_snippet: str, model_name: str, provider: str,
+                                     compliance_sections: Dict[str, str], file_extension: str, file_type: str,
+                                     timeout: Optional[float] = None, part: Optional[str] = None) -> str:
+        prompt = (part_note(part)
+                  + self.documentation_prompt(file_snippet, compliance_sections, file_extension, file_type))
         try:
-            response = self.generate_litellm_response(prompt, model_name, provider)
+            response = await self.agenerate_litellm_response(prompt, model_name, provider, timeout,
+                                                             stream_as="documentation", part=part)
             return response['choices'][0]['message']['content']
         except Exception as e:
             print(f"Error in documentation generation: {e}")
             return "Documentation generation failed. Default placeholder."
 
 
-    def generate_review(self, file_content: str, file_type: str, compliance_sections: Dict[str, str],
-                    additional_content: str, model_name: str, provider: str) -> str:
+    def review_prompt(self, file_content: str, file_type: str, compliance_sections: Dict[str, str],
+                      additional_content: str) -> str:
+        # Load design patterns with error handling
+        design_patterns = ""
         try:
-            # Load design patterns with error handling
-            design_patterns = ""
-            try:
-                if hasattr(self, 'design_patterns_path') and os.path.exists(self.design_patterns_path):
-                    with open(self.design_patterns_path, "r") as patterns_file:
-                        design_patterns = patterns_file.read()
-            except Exception as e:
-                print(f"Warning: Could not load design patterns file: {e}")
-                # Continue without design patterns rather than failing
-                design_patterns = "Design patterns file not available."
+            if hasattr(self, 'design_patterns_path') and os.path.exists(self.design_patterns_path):
+                with open(self.design_patterns_path, "r") as patterns_file:
+                    design_patterns = patterns_file.read()
+        except Exception as e:
+            print(f"Warning: Could not load design patterns file: {e}")
+            # Continue without design patterns rather than failing
+            design_patterns = "Design patterns file not available."
 
 
-            if file_type == "source":
-                prompt = f"""
+        if file_type == "source":
+            prompt = f"""
                 CONTEXTUAL INPUTS:
                 - Primary Source Code: {self.sanitize_input_content(file_content)}
                 - Compliance Guidelines: {compliance_sections.get('review', 'Default review guidelines')}
@@ -485,8 +533,8 @@ class CodeReviewSystem:
 
                 Please provide specific examples and code references where applicable, and ensure all recommendations are actionable and clearly explained.
                 """
-            else:
-                prompt = f"""
+        else:
+            prompt = f"""
                 Configuration File Review:
 
 
@@ -532,13 +580,34 @@ class CodeReviewSystem:
 
                 Provide specific examples and clear, actionable recommendations.
                 """
+        return prompt
+
+    @staticmethod
+    def review_error_message(error: Exception) -> str:
+        error_msg = f"Error in review generation: {str(error)}"
+        print(error_msg)
+        # Return a more informative error message instead of just a placeholder
+        return f"""Review generation encountered an error.
+            Error details: {error_msg}
+           
+            This might be due to:
+            1. API connection issues
+            2. Invalid input format
+            3. Server timeout
+           
+            Please try again or contact support if the issue persists."""
+
+    def generate_review(self, file_content: str, file_type: str, compliance_sections: Dict[str, str],
+                    additional_content: str, model_name: str, provider: str) -> str:
+        try:
+            prompt = self.review_prompt(file_content, file_type, compliance_sections, additional_content)
 
 
             # Add error handling for API call
             max_retries = 3
             for attempt in range(max_retries):
                 try:
-                    response = self.generate_litellm_response(prompt, model_name, provider)
+                    response = self.generate_litellm_response(prompt, model_name, provider, stream_as="review")
                     review_content = response['choices'][0]['message']['content']
                    
                     # Validate the response
@@ -554,18 +623,47 @@ class CodeReviewSystem:
                     time.sleep(2 ** attempt)  # Exponential backoff
                    
         except Exception as e:
-            error_msg = f"Error in review generation: {str(e)}"
-            print(error_msg)
-            # Return a more informative error message instead of just a placeholder
-            return f"""Review generation encountered an error.
-            Error details: {error_msg}
-           
-            This might be due to:
-            1. API connection issues
-            2. Invalid input format
-            3. Server timeout
-           
-            Please try again or contact support if the issue persists."""
+            return self.review_error_message(e)
+
+    async def agenerate_review(self, file_content: str, file_type: str, compliance_sections: Dict[str, str],
+                               additional_content: str, model_name: str, provider: str,
+                               timeout: Optional[float] = None, part: Optional[str] = None) -> str:
+        try:
+            prompt = (part_note(part)
+                      + self.review_prompt(file_content, file_type, compliance_sections, additional_content))
+            max_retries = 3
+            # timeout bounds the whole review, retries and backoff included, not each attempt
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + timeout if timeout is not None else None
+            for attempt in range(max_retries):
+                try:
+                    remaining = deadline - loop.time() if deadline is not None else None
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError()
+                    response = await self.agenerate_litellm_response(prompt, model_name, provider, remaining,
+                                                                     stream_as="review", part=part)
+                    review_content = response['choices'][0]['message']['content']
+                   
+                    # Validate the response
+                    if not review_content or len(review_content.strip()) < 50:  # Minimum content check
+                        raise ValueError("Generated review content is too short or empty")
+                       
+                    return review_content
+                   
+                except Exception as e:
+                    if isinstance(e, TimeoutError):
+                        # The deadline has passed, so there is no time left to retry
+                        raise TimeoutError(f"Review timed out after {timeout} seconds") from None
+                    if attempt == max_retries - 1:  # Last attempt
+                        raise  # Re-raise the last exception
+                    print(f"Attempt {attempt + 1} failed: {str(e)}. Retrying...")
+                    backoff = 2 ** attempt  # Exponential backoff
+                    if deadline is not None:
+                        backoff = min(backoff, max(0, deadline - loop.time()))
+                    await asyncio.sleep(backoff)
+                   
+        except Exception as e:
+            return self.review_error_message(e)
 
 
 
@@ -646,70 +744,95 @@ def main():
     parser = argparse.ArgumentParser(description='Process code review')
     parser.add_argument('--input', required=True, help='Input JSON file path')
     parser.add_argument('--output', required=True, help='Output JSON file path')
+    parser.add_argument('--llm-cache', choices=LLM_CACHE_MODES, default=None,
+                        help='LLM response cache: on, refresh or off (default: LLM_CACHE or on)')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='Files processed at once (default: BATCH_MAX_WORKERS or 4)')
+    parser.add_argument('--stream', default=None,
+                        help='Append NDJSON progress events with the generated text to this file, '
+                             'or write them to stdout with -')
     args = parser.parse_args()
 
-    try:
-        with open(args.input, 'r') as f:
-            input_data = json.load(f)
+    with progress_stream(args.stream) as progress:
+        try:
+            with open(args.input, 'r') as f:
+                input_data = json.load(f)
         
-        logging.info("Input data successfully parsed")
+            logging.info("Input data successfully parsed")
         
-        reviewer = CodeReviewSystem()
+            reviewer = CodeReviewSystem(llm_cache_mode=args.llm_cache)
+            reviewer.progress = progress
         
-        output_types = input_data.get('output_types', [])
-        if isinstance(output_types, str):
-            output_types = [t.strip() for t in output_types.split(",")]
+            output_types = input_data.get('output_types', [])
+            if isinstance(output_types, str):
+                output_types = [t.strip() for t in output_types.split(",")]
         
-        # Create temp directory if it doesn't exist
-        temp_dir = input_data.get('temp_dir')
-        if not temp_dir:
-            temp_dir = '/tmp/codeinsights'
-        os.makedirs(temp_dir, exist_ok=True)
+            # Create temp directory if it doesn't exist
+            temp_dir = input_data.get('temp_dir')
+            if not temp_dir:
+                temp_dir = '/tmp/codeinsights'
+            os.makedirs(temp_dir, exist_ok=True)
 
-        main_files = process_files(input_data.get('files_data', []), temp_dir)
-        if not main_files:
-            raise ValueError("No valid files to process")
+            main_files = process_files(input_data.get('files_data', []), temp_dir)
+            if not main_files:
+                raise ValueError("No valid files to process")
 
-        try:
-            results = reviewer.process_code(
-                output_types=output_types,
-                file_path=main_files[0],
-                provider=input_data['provider'],
-                model_name=input_data['model_name'],
-                compliance_file_path=create_temp_compliance_file(
+            try:
+                compliance_file_path = create_temp_compliance_file(
                     input_data.get('compliance_file_data'), temp_dir
-                ),
-                additional_files=process_files(
+                )
+                additional_files = process_files(
                     input_data.get('additional_files', []), temp_dir
                 )
-            )
+                # Every uploaded file is processed, concurrently; a file that fails gets its own error entry
+                def process(file_path):
+                    # Progress events name the file as the results do
+                    stream_file.set(os.path.relpath(file_path, temp_dir))
+                    return reviewer.process_code(
+                        output_types=output_types,
+                        file_path=file_path,
+                        provider=input_data['provider'],
+                        model_name=input_data['model_name'],
+                        compliance_file_path=compliance_file_path,
+                        additional_files=additional_files
+                    )
+
+                file_results = process_batch(
+                    main_files,
+                    process,
+                    max_workers=args.max_workers,
+                    key=lambda file_path: os.path.relpath(file_path, temp_dir)
+                )
             
-            with open(args.output, 'w') as f:
-                json.dump({
-                    'status': 'success',
-                    'results': results
-                }, f)
+                with open(args.output, 'w') as f:
+                    json.dump({
+                        'status': 'success',
+                        # The first file's results, as before; 'files' holds every file by name
+                        'results': next(iter(file_results.values())),
+                        'files': file_results
+                    }, f)
             
-            logging.info("Processing completed successfully")
-            sys.exit(0)
+                logging.info("Processing completed successfully")
+                sys.exit(0)
+            
+            except Exception as e:
+                logging.error(f"Processing error: {str(e)}", exc_info=True)
+                with open(args.output, 'w') as f:
+                    json.dump({
+                        'status': 'error',
+                        'message': str(e)
+                    }, f)
+                sys.exit(1)
             
         except Exception as e:
-            logging.error(f"Processing error: {str(e)}", exc_info=True)
+            logging.error(f"Fatal error: {str(e)}", exc_info=True)
             with open(args.output, 'w') as f:
                 json.dump({
                     'status': 'error',
                     'message': str(e)
                 }, f)
             sys.exit(1)
-            
-    except Exception as e:
-        logging.error(f"Fatal error: {str(e)}", exc_info=True)
-        with open(args.output, 'w') as f:
-            json.dump({
-                'status': 'error',
-                'message': str(e)
-            }, f)
-        sys.exit(1)
+
 if __name__ == "__main__":
     main()
 
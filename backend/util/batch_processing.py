@@ -0,0 +1,57 @@
+"""
+Bounded-concurrency batch processing for the per-file util scripts.
+
+review, documentation, comments and analyze_files apply the same LLM
+pipeline to every entry of files_data. The work is dominated by waiting on
+the provider, so the files are processed on a small thread pool. Results
+come back keyed by file name in the order of the input, and a file that
+fails gets its own {"status": "error", "message": ...} entry without
+affecting the others.
+
+The number of files processed at once comes from --max-workers, else from
+BATCH_MAX_WORKERS, else DEFAULT_MAX_WORKERS; 1 processes them one by one.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+DEFAULT_MAX_WORKERS = 4
+
+
+def resolve_max_workers(max_workers=None):
+    if max_workers is None:
+        max_workers = int(os.getenv('BATCH_MAX_WORKERS', DEFAULT_MAX_WORKERS))
+    return max(1, max_workers)
+
+
+def file_error(error):
+    return {"status": "error", "message": str(error)}
+
+
+def process_batch(files_data, process, max_workers=None, key=lambda file_data: file_data['name']):
+    """
+    Call process(file_data) for every entry of files_data, at most
+    max_workers at a time.
+
+    Returns:
+        dict: key(file_data) -> result of process, in input order. Entries
+        whose process raised map to file_error(exception).
+    """
+    files_data = list(files_data)
+    max_workers = min(resolve_max_workers(max_workers), len(files_data)) or 1
+
+    def run(file_data):
+        try:
+            return process(file_data)
+        except Exception as e:
+            print(f"Error processing {key(file_data)}: {e}")
+            return file_error(e)
+
+    if max_workers == 1:
+        outcomes = [run(file_data) for file_data in files_data]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # map yields in input order whatever order the files finish in
+            outcomes = list(executor.map(run, files_data))
+
+    return {key(file_data): outcome for file_data, outcome in zip(files_data, outcomes)}
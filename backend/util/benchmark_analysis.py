@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the codebase analysis pipeline.
+
+Generates a synthetic Python repository of a chosen shape, then times each
+phase of analyze_codebase separately: RepositoryAnalyzer.analyze_repository,
+RepositoryAnalyzer._parse_python_file over every file, the knowledge graph
+build and the JSON export. The graph phases run against the embedded
+LocalGraphStore, so the benchmark needs no Neo4j server or network access.
+
+Results are written as JSON so runs can be compared to catch regressions:
+
+    python benchmark_analysis.py --packages 8 --modules 20 --output bench.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+import statistics
+import traceback
+
+from analyze_codebase import (RepositoryAnalyzer, build_repository_knowledge_graph,
+                              export_knowledge_graph_json_structure, file_owned_labels,
+                              name_indexed_labels)
+from local_graph import LocalGraphStore
+
+
+STANDARD_IMPORTS = ['os', 'sys', 'json', 're', 'logging', 'collections', 'typing', 'itertools']
+
+
+def generate_synthetic_repository(root, packages=4, modules_per_package=10, classes_per_module=5,
+                                  hierarchy_depth=3, methods_per_class=6, imports_per_module=4,
+                                  functions_per_module=3, seed=0):
+    """
+    Write a synthetic Python repository under root.
+
+    Classes form inheritance chains up to hierarchy_depth levels deep: a class
+    at level n inherits from a random class at level n - 1, possibly defined
+    in another module. Method names are drawn from a pool shared by all
+    classes, so derived classes override methods of their ancestors.
+    imports_per_module sets how many other synthetic modules each module imports.
+
+    Returns:
+        dict: Counts of the generated packages, modules, classes, methods and bytes
+    """
+    rng = random.Random(seed)
+    classes_by_level = [[] for _ in range(hierarchy_depth + 1)]
+    modules = []
+    counts = {'packages': packages, 'modules': 0, 'classes': 0, 'methods': 0, 'functions': 0, 'bytes': 0}
+    method_pool = [f"method_{index}" for index in range(max(1, methods_per_class * 2))]
+
+    for package_index in range(packages):
+        package_name = f"package_{package_index}"
+        package_dir = os.path.join(root, package_name)
+        os.makedirs(package_dir, exist_ok=True)
+        with open(os.path.join(package_dir, '__init__.py'), 'w', encoding='utf-8') as f:
+            f.write(f'"""Synthetic package {package_index}"""\n')
+
+        for module_index in range(modules_per_package):
+            module_name = f"module_{module_index}"
+            lines = [f'"""Synthetic module {package_name}.{module_name}"""']
+
+            lines.extend(f"import {name}" for name in rng.sample(
+                STANDARD_IMPORTS, min(len(STANDARD_IMPORTS), max(1, imports_per_module // 2))))
+            imported = rng.sample(modules, min(len(modules), imports_per_module))
+            lines.extend(f"from {imported_module} import *" for imported_module in imported)
+            lines.append('')
+
+            for class_index in range(classes_per_module):
+                class_name = f"Class{package_index}_{module_index}_{class_index}"
+                level = class_index % (hierarchy_depth + 1)
+                if level and classes_by_level[level - 1]:
+                    base = rng.choice(classes_by_level[level - 1])
+                else:
+                    level, base = 0, None
+                classes_by_level[level].append(class_name)
+
+                lines.append(f"class {class_name}({base}):" if base else f"class {class_name}:")
+                lines.append(f'    """Synthetic class at inheritance level {level}"""')
+                lines.append("    registry: dict = {}")
+                lines.append('')
+                lines.append("    def __init__(self, name: str, size: int = 0):")
+                lines.append("        self.name = name")
+                lines.append("        self.size: int = size")
+                for method_name in rng.sample(method_pool, min(len(method_pool), methods_per_class)):
+                    lines.append('')
+                    lines.append(f"    def {method_name}(self, value: int, *args, **kwargs) -> int:")
+                    lines.append(f'        """Return value adjusted by {class_name}"""')
+                    lines.append("        return value + self.size")
+                lines.append('')
+                lines.append("    @property")
+                lines.append("    def label(self) -> str:")
+                lines.append("        return self.name")
+                lines.append('')
+                lines.append("    @staticmethod")
+                lines.append("    def create(name):")
+                lines.append(f"        return {class_name}(name)")
+                lines.append('')
+                lines.append('')
+                counts['classes'] += 1
+                counts['methods'] += methods_per_class + 3
+
+            for function_index in range(functions_per_module):
+                lines.append(f"def function_{function_index}(items: list, limit: int = 10) -> list:")
+                lines.append(f'    """Synthetic function {function_index}"""')
+                lines.append("    return items[:limit]")
+                lines.append('')
+                lines.append('')
+                counts['functions'] += 1
+
+            lines.append(f"MAX_SIZE = {rng.randint(1, 1000)}")
+            source = '\n'.join(lines) + '\n'
+            with open(os.path.join(package_dir, module_name + '.py'), 'w', encoding='utf-8') as f:
+                f.write(source)
+            counts['bytes'] += len(source.encode('utf-8'))
+            counts['modules'] += 1
+            modules.append(f"{package_name}.{module_name}")
+
+    return counts
+
+
+def time_phase(phase_timings, phase, operation):
+    """Run operation, record its wall and CPU time under phase, and return its result"""
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    result = operation()
+    phase_timings[phase].append({
+        'wall_seconds': time.perf_counter() - wall_start,
+        'cpu_seconds': time.process_time() - cpu_start,
+    })
+    return result
+
+
+def summarize_timings(runs):
+    wall_times = [run['wall_seconds'] for run in runs]
+    cpu_times = [run['cpu_seconds'] for run in runs]
+    return {
+        'runs': runs,
+        'wall_seconds_min': min(wall_times),
+        'wall_seconds_median': statistics.median(wall_times),
+        'cpu_seconds_min': min(cpu_times),
+        'cpu_seconds_median': statistics.median(cpu_times),
+    }
+
+
+def run_benchmark(repo_path, repeat=3, workers=1, graph_path=':memory:', export_stream=False,
+                  export_page_size=5000, export_workers=1, batch_size=5000):
+    """
+    Time every pipeline phase repeat times on the repository at repo_path.
+
+    Returns:
+        dict: Per-phase timings and the size of the resulting graph
+    """
+    phase_timings = {phase: [] for phase in ('analyze_repository', 'parse_python_files',
+                                             'build_knowledge_graph', 'export_knowledge_graph')}
+    python_sources = []
+    for dir_path, _, file_names in os.walk(repo_path):
+        for file_name in sorted(file_names):
+            if file_name.endswith('.py'):
+                with open(os.path.join(dir_path, file_name), 'r', encoding='utf-8') as f:
+                    python_sources.append(f.read())
+
+    store = LocalGraphStore(graph_path)
+    store.ensure_schema(["Repository", "Module"] + file_owned_labels, file_owned_labels, name_indexed_labels)
+    export_file = os.path.join(tempfile.mkdtemp(prefix='kg-export-'), 'knowledge_graph_structure.json')
+    export_counts = None
+    try:
+        for _ in range(repeat):
+            analyzer = RepositoryAnalyzer(repo_path, max_workers=workers)
+            repository_details = time_phase(phase_timings, 'analyze_repository', analyzer.analyze_repository)
+
+            time_phase(phase_timings, 'parse_python_files',
+                       lambda: [analyzer._parse_python_file(source) for source in python_sources])
+
+            time_phase(phase_timings, 'build_knowledge_graph',
+                       lambda: build_repository_knowledge_graph(store, repository_details, batch_size=batch_size))
+
+            exported = time_phase(phase_timings, 'export_knowledge_graph',
+                                  lambda: export_knowledge_graph_json_structure(
+                                      store, output_file=export_file, stream=export_stream,
+                                      page_size=export_page_size, workers=export_workers))
+            if exported is None:
+                raise RuntimeError("Knowledge graph export failed")
+            if export_stream:
+                export_counts = exported
+            else:
+                export_counts = {'nodes': sum(len(nodes) for nodes in exported['nodes'].values())}
+                export_counts.update((section, len(entries)) for group in ('relationships', 'hierarchies')
+                                     for section, entries in exported[group].items())
+
+        return {
+            'phases': {phase: summarize_timings(runs) for phase, runs in phase_timings.items()},
+            'python_files': len(python_sources),
+            'graph': store.statistics(),
+            'export_counts': export_counts,
+            'export_bytes': os.path.getsize(export_file),
+        }
+    finally:
+        store.close()
+        shutil.rmtree(os.path.dirname(export_file), ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the codebase analysis pipeline on a synthetic repository')
+    parser.add_argument('--output', default='benchmark_results.json', help='Output JSON file path')
+    parser.add_argument('--packages', type=int, default=4)
+    parser.add_argument('--modules', type=int, default=10, help='Modules per package')
+    parser.add_argument('--classes', type=int, default=5, help='Classes per module')
+    parser.add_argument('--depth', type=int, default=3, help='Maximum inheritance depth')
+    parser.add_argument('--methods', type=int, default=6, help='Methods per class')
+    parser.add_argument('--imports', type=int, default=4, help='Synthetic modules imported per module')
+    parser.add_argument('--functions', type=int, default=3, help='Functions per module')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='Runs of every phase')
+    parser.add_argument('--workers', type=int, default=1, help='Analyzer worker processes')
+    parser.add_argument('--graph-db', default=':memory:', help='LocalGraphStore database file')
+    parser.add_argument('--export-stream', action='store_true', help='Use the streaming export')
+    parser.add_argument('--export-page-size', type=int, default=5000)
+    parser.add_argument('--export-workers', type=int, default=1)
+    parser.add_argument('--repository', default=None,
+                        help='Benchmark this repository instead of generating one')
+    parser.add_argument('--keep', action='store_true', help='Keep the generated repository')
+    args = parser.parse_args()
+
+    generated_root = None
+    try:
+        config = {key: value for key, value in vars(args).items() if key not in ('output', 'keep')}
+        if args.repository:
+            repo_path = os.path.abspath(args.repository)
+            repository = {'path': repo_path}
+        else:
+            generated_root = tempfile.mkdtemp(prefix='synthetic-repo-')
+            repo_path = generated_root
+            repository = generate_synthetic_repository(
+                repo_path,
+                packages=args.packages,
+                modules_per_package=args.modules,
+                classes_per_module=args.classes,
+                hierarchy_depth=args.depth,
+                methods_per_class=args.methods,
+                imports_per_module=args.imports,
+                functions_per_module=args.functions,
+                seed=args.seed
+            )
+            repository['path'] = repo_path
+
+        results = run_benchmark(
+            repo_path,
+            repeat=max(1, args.repeat),
+            workers=args.workers,
+            graph_path=args.graph_db,
+            export_stream=args.export_stream,
+            export_page_size=args.export_page_size,
+            export_workers=args.export_workers
+        )
+        results.update({
+            'config': config,
+            'repository': repository,
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'sqlite': sqlite3.sqlite_version,
+                'cpu_count': os.cpu_count(),
+            },
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        })
+
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+        for phase, timing in results['phases'].items():
+            print(f"{phase}: {timing['wall_seconds_median']:.3f}s wall, "
+                  f"{timing['cpu_seconds_median']:.3f}s CPU (median of {len(timing['runs'])})")
+        print(f"Benchmark results written to {args.output}")
+
+    except Exception as e:
+        print(f"Benchmark failed: {e}")
+        traceback.print_exc()
+        sys.exit(1)
+    finally:
+        if generated_root and not args.keep:
+            shutil.rmtree(generated_root, ignore_errors=True)
+        elif generated_root:
+            print(f"Synthetic repository kept at {generated_root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for the util entry points.
+
+Imports each script in a fresh interpreter under python -X importtime and
+reports the cumulative import time of the script module, its heaviest
+dependencies and the wall time of the whole process. The run fails when a
+script's median import time goes over the budget, or when a script imports
+one of the heavy libraries (litellm, py2neo, the language parsers, magic)
+at startup instead of on the code path that needs it:
+
+    python benchmark_startup.py --budget-ms 500 --output startup.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import subprocess
+
+
+ENTRY_POINTS = ('analyze_files', 'review', 'documentation', 'comments', 'generate_guidelines',
+                'analyze_codebase', 'script_worker')
+# Loaded on demand by the scripts; importing one of these at startup is a regression
+DEFERRED_MODULES = ('litellm', 'py2neo', 'javalang', 'esprima', 'pycparser', 'magic', 'yaml')
+DEFAULT_BUDGET_MS = 500
+
+
+def parse_importtime(stderr):
+    """
+    Parse -X importtime output into (module, self_us, cumulative_us, depth) rows.
+    The depth is the nesting of the import, 0 for modules imported directly.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # The column header
+        name = fields[2].rstrip()
+        stripped = name.lstrip()
+        depth = (len(name) - len(stripped) - 1) // 2
+        rows.append((stripped, int(fields[0]), int(fields[1]), depth))
+    return rows
+
+
+def measure_import(script, script_dir):
+    """Import script in a new interpreter and return its import timings"""
+    wall_start = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {script}'],
+                               cwd=script_dir, capture_output=True, text=True)
+    wall_seconds = time.perf_counter() - wall_start
+    if completed.returncode != 0:
+        error = completed.stderr.strip().splitlines()
+        raise RuntimeError(f"Importing {script} failed: {error[-1] if error else completed.returncode}")
+
+    rows = parse_importtime(completed.stderr)
+    script_rows = [row for row in rows if row[0] == script and row[3] == 0]
+    imported = {row[0] for row in rows}
+    return {
+        'wall_seconds': wall_seconds,
+        'import_us': script_rows[-1][2] if script_rows else 0,
+        'deferred_imported': sorted(module for module in DEFERRED_MODULES if module in imported),
+        'heaviest': sorted(((row[0], row[2]) for row in rows if row[0] != script),
+                           key=lambda entry: entry[1], reverse=True),
+    }
+
+
+def run_benchmark(scripts, repeat=5, budget_ms=DEFAULT_BUDGET_MS, top=5):
+    """
+    Measure every script repeat times.
+
+    Returns:
+        dict: Per-script medians and the list of budget violations
+    """
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    violations = []
+    for script in scripts:
+        runs = [measure_import(script, script_dir) for _ in range(repeat)]
+        import_ms = statistics.median(run['import_us'] for run in runs) / 1000
+        deferred_imported = runs[-1]['deferred_imported']
+        results[script] = {
+            'import_ms_median': round(import_ms, 3),
+            'import_ms_min': round(min(run['import_us'] for run in runs) / 1000, 3),
+            'wall_seconds_median': round(statistics.median(run['wall_seconds'] for run in runs), 6),
+            'deferred_imported': deferred_imported,
+            'heaviest_imports': [{'module': module, 'cumulative_ms': round(us / 1000, 3)}
+                                 for module, us in runs[-1]['heaviest'][:top]],
+        }
+        if import_ms > budget_ms:
+            violations.append(f"{script}: imports in {import_ms:.1f} ms, over the {budget_ms} ms budget")
+        if deferred_imported:
+            violations.append(f"{script}: imports {', '.join(deferred_imported)} at startup")
+    return {'scripts': results, 'budget_ms': budget_ms, 'violations': violations}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the startup time of the util entry points')
+    parser.add_argument('--scripts', default=','.join(ENTRY_POINTS), help='Comma separated scripts to measure')
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per script')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='Maximum median import time of each script in milliseconds')
+    parser.add_argument('--top', type=int, default=5, help='Heaviest imports to report per script')
+    parser.add_argument('--output', default=None, help='Also write the results to this JSON file')
+    args = parser.parse_args()
+
+    try:
+        results = run_benchmark([script.strip() for script in args.scripts.split(',') if script.strip()],
+                                repeat=max(1, args.repeat), budget_ms=args.budget_ms, top=args.top)
+    except RuntimeError as e:
+        print(f"Startup benchmark failed: {e}")
+        sys.exit(1)
+
+    results['environment'] = {'python': platform.python_version(), 'platform': platform.platform()}
+    results['timestamp'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+    for script, timing in results['scripts'].items():
+        heaviest = ', '.join(f"{entry['module']} {entry['cumulative_ms']:.1f} ms"
+                             for entry in timing['heaviest_imports'][:3])
+        print(f"{script}: {timing['import_ms_median']:.1f} ms import, "
+              f"{timing['wall_seconds_median']:.3f}s process (heaviest: {heaviest})")
+
+    if results['violations']:
+        for violation in results['violations']:
+            print(f"Budget exceeded: {violation}")
+        sys.exit(1)
+    print(f"All scripts within the {args.budget_ms:g} ms startup budget")
+
+
+if __name__ == "__main__":
+    main()
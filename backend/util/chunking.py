@@ -0,0 +1,346 @@
+"""
+Splits source files into chunks that fit an LLM token budget.
+
+Chunks end on declaration boundaries rather than at a character offset:
+Python is split between the top-level statements found by ast, and an
+oversized class or function is split again between the statements of its
+body. Brace languages are split between statements at the same brace depth,
+going one level deeper (class members, say) when a block does not fit.
+Other files are split at blank lines. Only a single line longer than the
+budget is ever cut mid-way.
+
+Segments are packed greedily, so consecutive small declarations share a
+chunk. Every line of the input lands in exactly one chunk, in order.
+
+generate_chunked() is the map-reduce used by the scripts for files over the
+budget: each chunk is reviewed, documented or commented on its own, several
+at a time, and partial reviews and documentation are merged by the LLM into
+one. agenerate_chunked() does the same with coroutine functions, for the
+asyncio path of analyze_files. The budget and the number of chunk calls made at once come from
+LLM_CHUNK_TOKENS (default 20000) and LLM_CHUNK_CONCURRENCY (default 4).
+"""
+import ast
+import os
+import asyncio
+import contextvars
+import re
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Rough size of a token for source code and English prose
+CHARS_PER_TOKEN = 4
+DEFAULT_CHUNK_TOKENS = 20000
+DEFAULT_CHUNK_CONCURRENCY = 4
+
+PYTHON_EXTENSIONS = {'.py', '.pyw'}
+BRACE_EXTENSIONS = {'.java', '.js', '.jsx', '.mjs', '.ts', '.tsx', '.c', '.h', '.cc', '.cpp', '.hpp', '.cs',
+                    '.go', '.rs', '.kt', '.swift', '.php', '.scala', '.dart', '.css', '.scss'}
+
+Chunk = namedtuple('Chunk', 'start_line end_line text')
+# Lines are 0-based and inclusive; children split the same lines more finely
+Segment = namedtuple('Segment', 'start end children')
+
+STRING_OR_COMMENT = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|`[^`]*`|//.*$|/\*.*?\*/')
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _cover(starts, start, end, children_of=None):
+    """Segments from start to end that begin at the given lines; gaps join the following segment"""
+    starts = sorted({line for line in starts if start < line <= end})
+    bounds = [start] + starts + [end + 1]
+    return [Segment(first, following - 1, children_of(first, following - 1) if children_of else None)
+            for first, following in zip(bounds, bounds[1:])]
+
+
+def _python_segments(content, line_count):
+    try:
+        tree = ast.parse(content)
+    except (SyntaxError, ValueError):
+        return None
+
+    def node_start(node):
+        decorators = getattr(node, 'decorator_list', None) or []
+        return min([node.lineno] + [decorator.lineno for decorator in decorators]) - 1
+
+    def segments(body, start, end):
+        def children_of(first, last):
+            nodes = [node for node in body if first <= node_start(node) <= last]
+            inner = [statement for node in nodes if isinstance(node, (ast.ClassDef, ast.FunctionDef,
+                                                                      ast.AsyncFunctionDef))
+                     for statement in node.body]
+            if len(inner) < 2:
+                return None
+            return segments(inner, first, last)
+        return _cover([node_start(node) for node in body], start, end, children_of)
+
+    return segments(tree.body, 0, line_count - 1)
+
+
+def _brace_segments(lines):
+    depths = []
+    depth = 0
+    for line in lines:
+        depths.append(depth)
+        code = STRING_OR_COMMENT.sub('', line)
+        depth = max(0, depth + code.count('{') - code.count('}'))
+
+    def ends_statement(index):
+        stripped = STRING_OR_COMMENT.sub('', lines[index]).strip()
+        return not stripped or stripped.endswith(('}', ';', '};'))
+
+    def segments(start, end, level):
+        starts = [index for index in range(start + 1, end + 1)
+                  if depths[index] == level and ends_statement(index - 1) and lines[index].strip()]
+
+        def children_of(first, last):
+            if not any(depths[index] > level for index in range(first, last + 1)):
+                return None
+            return segments(first, last, level + 1)
+        return _cover(starts, start, end, children_of)
+
+    if not lines:
+        return []
+    return segments(0, len(lines) - 1, 0)
+
+
+def _paragraph_segments(lines):
+    starts = [index for index in range(1, len(lines)) if not lines[index - 1].strip() and lines[index].strip()]
+    return _cover(starts, 0, len(lines) - 1) if lines else []
+
+
+def _segments_for(content, lines, file_extension):
+    extension = (file_extension or '').lower()
+    if extension in PYTHON_EXTENSIONS:
+        segments = _python_segments(content, len(lines))
+        if segments is not None:
+            return segments
+    if extension in BRACE_EXTENSIONS:
+        return _brace_segments(lines)
+    return _paragraph_segments(lines)
+
+
+def split_source(content, file_extension, max_tokens):
+    """
+    Split content into chunks of at most max_tokens estimated tokens.
+
+    Returns:
+        list: Chunk(start_line, end_line, text) with 1-based line numbers;
+        a single chunk when the content already fits
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    if len(content) <= max_chars:
+        return [Chunk(1, max(1, content.count('\n') + 1), content)]
+
+    lines = content.splitlines(keepends=True)
+    sizes = [len(line) for line in lines]
+    chunks = []
+    pending = []  # (start, end) line ranges waiting to be emitted as one chunk
+    pending_size = 0
+
+    def flush():
+        nonlocal pending, pending_size
+        if pending:
+            start, end = pending[0][0], pending[-1][1]
+            chunks.append(Chunk(start + 1, end + 1, ''.join(lines[start:end + 1])))
+        pending, pending_size = [], 0
+
+    def add(start, end, size):
+        nonlocal pending_size
+        if pending_size + size > max_chars:
+            flush()
+        pending.append((start, end))
+        pending_size += size
+
+    def pack(segments):
+        for segment in segments:
+            size = sum(sizes[segment.start:segment.end + 1])
+            if size <= max_chars:
+                add(segment.start, segment.end, size)
+            elif segment.children:
+                pack(segment.children)
+            else:
+                for index in range(segment.start, segment.end + 1):
+                    if sizes[index] <= max_chars:
+                        add(index, index, sizes[index])
+                    else:
+                        # A single line longer than the budget is the only thing cut
+                        flush()
+                        line = lines[index]
+                        chunks.extend(Chunk(index + 1, index + 1, line[offset:offset + max_chars])
+                                      for offset in range(0, len(line), max_chars))
+
+    pack(_segments_for(content, lines, file_extension))
+    flush()
+    return chunks
+
+
+def chunk_settings():
+    """(token budget per prompt, chunk calls made at once) from the environment"""
+    return (int(os.getenv('LLM_CHUNK_TOKENS', DEFAULT_CHUNK_TOKENS)),
+            max(1, int(os.getenv('LLM_CHUNK_CONCURRENCY', DEFAULT_CHUNK_CONCURRENCY))))
+
+
+def part_label(chunk, index, total):
+    return f"part {index} of {total} (lines {chunk.start_line}-{chunk.end_line})"
+
+
+def part_note(part):
+    """Preamble telling the model that the prompt covers only part of a file; '' for a whole file"""
+    if not part:
+        return ""
+    return (f"The source code below is {part} of a larger file, split at declaration boundaries. "
+            f"Cover only this part.\n")
+
+
+def join_sections(sections):
+    return "\n\n".join(f"### {label}\n{text}" for label, text in sections)
+
+
+def merge_label(sections):
+    """Label spanning consecutive 'Lines a-b' sections"""
+    return f"{sections[0][0].split('-')[0]}-{sections[-1][0].split('-')[-1]}"
+
+
+def merge_prompt(output, file_type, sections):
+    """Prompt merging partial reviews or documentation of consecutive parts of one file"""
+    if output == "review":
+        return f"""
+                Below are reviews of consecutive parts of the same {file_type} file, in source order.
+                Merge them into a single review of the whole file that keeps the section structure of the
+                individual reviews. Combine findings that repeat across parts, keep every specific issue and
+                recommendation with its code and line references, and do not mention that the file was split.
+
+                {join_sections(sections)}
+                """
+    return f"""
+                Below is documentation generated for consecutive parts of the same file, in source order.
+                Merge it into a single document for the whole file: one code summary, one tree structure
+                covering every part, and the detailed descriptions in source order without duplicates.
+                Do not mention that the file was split.
+
+                {join_sections(sections)}
+                """
+
+
+def merge_groups(sections, max_tokens):
+    """
+    Split (label, text) sections into runs of consecutive sections that fit
+    max_tokens together. Every group holds at least two sections, so each
+    round of merging shortens the list.
+    """
+    budget_chars = max_tokens * CHARS_PER_TOKEN
+    groups = [[]]
+    group_chars = 0
+    for section in sections:
+        size = len(section[1])
+        if len(groups[-1]) >= 2 and group_chars + size > budget_chars:
+            groups.append([])
+            group_chars = 0
+        groups[-1].append(section)
+        group_chars += size
+    if len(groups[-1]) == 1 and len(groups) > 1:
+        groups[-2].extend(groups.pop())
+    return groups
+
+
+def _map_in_context(executor, fn, items):
+    """
+    executor.map that runs every call in a copy of the caller's context, so
+    ContextVars such as llm_stream.stream_file reach the pool's threads
+    """
+    futures = [executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+    return [future.result() for future in futures]
+
+
+def _partial_sections(chunks, partials):
+    """(label, text) sections of the partial results, to be merged"""
+    return [(f"Lines {chunk.start_line}-{chunk.end_line}", partial) for chunk, partial in zip(chunks, partials)]
+
+
+def _merge_failed(output, label, group, error):
+    print(f"Error merging {output} for {label}: {error}")
+    return label, join_sections(group)
+
+
+def generate_chunked(output, content, file_extension, file_type, generate, complete,
+                     max_tokens=None, concurrency=None):
+    """
+    Generate output ("review", "documentation" or "comments") for content,
+    in chunks when it is over the token budget.
+
+    Args:
+        generate: generate(text, part) returns the output for text; part is
+            None for a file that fits in one prompt, else its part_label()
+        complete: complete(prompt, part) returns the LLM's answer to prompt;
+            used to merge partial reviews and documentation
+        max_tokens, concurrency: default to chunk_settings()
+
+    Returns:
+        str: The output for the whole file. Commented chunks are joined in
+        source order; a merge that fails falls back to the partial results
+        under their line ranges, so no finding is lost.
+    """
+    default_tokens, default_concurrency = chunk_settings()
+    max_tokens = max_tokens or default_tokens
+    chunks = split_source(content, file_extension, max_tokens)
+    if len(chunks) == 1:
+        return generate(content, None)
+
+    def merge(group):
+        label = merge_label(group)
+        try:
+            return label, complete(merge_prompt(output, file_type, group), f"merge of {label}")
+        except Exception as e:
+            return _merge_failed(output, label, group, e)
+
+    total = len(chunks)
+    with ThreadPoolExecutor(max_workers=min(concurrency or default_concurrency, total)) as executor:
+        partials = _map_in_context(executor, lambda item: generate(item[1].text, part_label(item[1], item[0], total)),
+                                   enumerate(chunks, 1))
+        if output == "comments":
+            return "\n".join(partials)
+        sections = _partial_sections(chunks, partials)
+        while len(sections) > 1:
+            sections = _map_in_context(executor, merge, merge_groups(sections, max_tokens))
+    return sections[0][1]
+
+
+async def agenerate_chunked(output, content, file_extension, file_type, generate, complete,
+                            max_tokens=None, concurrency=None):
+    """
+    generate_chunked() for coroutine functions generate(text, part) and
+    complete(prompt, part); at most concurrency of their calls are awaited
+    at once. Chunk calls that raise propagate, as in generate_chunked().
+    """
+    default_tokens, default_concurrency = chunk_settings()
+    max_tokens = max_tokens or default_tokens
+    chunks = split_source(content, file_extension, max_tokens)
+    if len(chunks) == 1:
+        return await generate(content, None)
+
+    semaphore = asyncio.Semaphore(concurrency or default_concurrency)
+
+    async def limited(function, *args):
+        async with semaphore:
+            return await function(*args)
+
+    async def merge(group):
+        label = merge_label(group)
+        try:
+            return label, await limited(complete, merge_prompt(output, file_type, group), f"merge of {label}")
+        except Exception as e:
+            return _merge_failed(output, label, group, e)
+
+    total = len(chunks)
+    partials = await asyncio.gather(*(limited(generate, chunk.text, part_label(chunk, index, total))
+                                      for index, chunk in enumerate(chunks, 1)))
+    if output == "comments":
+        return "\n".join(partials)
+    sections = _partial_sections(chunks, partials)
+    while len(sections) > 1:
+        sections = await asyncio.gather(*(merge(group) for group in merge_groups(sections, max_tokens)))
+    return sections[0][1]
@@ -1,7 +1,6 @@
 
 
 
-import litellm
 
 import os
 import re
@@ -9,20 +8,30 @@ import re
 import json
 import xml.etree.ElementTree as ET
 
-import magic
 from collections import defaultdict
 from dotenv import load_dotenv
 from typing import List, Optional, Dict, Union
+from llm_cache import LLM_CACHE_MODES, LLMResponseCache, cached_completion, extract_compliance_sections
+from batch_processing import process_batch
+from chunking import chunk_settings, generate_chunked, part_note
+from llm_stream import progress_stream, stream_file
 import argparse
 class CodeReviewSystem:
-    def __init__(self):
+    def __init__(self, llm_cache_mode: Optional[str] = None):
         load_dotenv()
         self.claude_api_key = os.getenv("CLAUD_API_KEY")
         self.open_api_key = os.getenv("OPENAI_API_KEY")
+        self.api_keys = {"openai": self.open_api_key, "anthropic": self.claude_api_key}
+        self.llm_cache = LLMResponseCache(mode=llm_cache_mode)
+        # ProgressStream set by main() when --stream is given
+        self.progress = None
+        # Files over the chunk budget are processed part by part and the results merged
+        self.chunk_tokens, self.chunk_concurrency = chunk_settings()
         self.design_patterns_path = "/home/ishitaguleria/WORK/final_code_insights/backend/util/design_patterns.txt"
 
     def detect_file_type(self, file_path: str) -> Optional[str]:
         try:
+            import magic
             mime = magic.Magic(mime=True)
             return mime.from_file(file_path)
         except Exception as e:
@@ -41,109 +50,20 @@ class CodeReviewSystem:
             return content[:max_content_length]
         return content
 
-    def generate_litellm_response(self, prompt: str, model_name: str, provider: str) -> dict:
-        if provider.lower() == "openai":
-            return litellm.completion(
-                model=model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                # max_tokens=3000,
-                seed=42,
-                top_p=0.95,
-                api_key=self.open_api_key
-            )
-        elif provider.lower() == "anthropic":
-            return litellm.completion(
-                model=model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                seed=42,
-                top_p=0.85,
-                api_key=self.claude_api_key
-            )
-        else:
-            raise ValueError(f"Unsupported provider: {provider}")
+    def generate_litellm_response(self, prompt: str, model_name: str, provider: str,
+                                  stream_as: Optional[str] = None, part: Optional[str] = None) -> dict:
+        return cached_completion(self.llm_cache, prompt, model_name, provider, self.api_keys,
+                                 self.progress, stream_as, part)
 
-    def ai_extract_compliance_sections(self, file_content: str, model_name: str, provider: str) -> Dict[str, str]:
-        prompt = f"""
-        You are an AI expert specializing in compliance document analysis and extracting structured guidelines. Your task is to analyze the provided compliance document and extract guidelines for specific categories, adhering to the following structured approach.
+    def merge_completion(self, model_name: str, provider: str, output: str):
+        """complete(prompt, part) for generate_chunked, merging partial results of output"""
+        def complete(prompt, part):
+            response = self.generate_litellm_response(prompt, model_name, provider, stream_as=output, part=part)
+            return response['choices'][0]['message']['content']
+        return complete
 
-        ### **Task Objective:**
-        - Extract and structure guidelines based on the input compliance document.
-        - For any section not explicitly covered, provide **default guidelines based on industry standards**.
-        - Format your response using the defined structure for clarity and organization.
-        
-        
-        Input Document:
-        The document content is sanitized and provided for analysis. Use the below provided relevant content to extract guidelines .
-        {self.sanitize_input_content(file_content)}
-        
-        Please analyze the document and extract guidelines for the following sections. Format your response using the exact structure below:
-        
-        ##review##
-        [- Include all guidelines related to:
-            - Code review practices
-            - Quality assurance standards
-            - Peer review protocols]
-        ##
-        
-        ##documentation##
-        [- Cover standards for:
-            - Documentation requirements
-            - Format and structure of documentation
-            - Maintenance of comprehensive records]
-        ##
-        
-        ##comments##
-        [- Extract details related to:
-            - Inline code comments
-            - Standards for descriptive comments
-            - Best practices for maintaining clarity and conciseness]
-        ##
-        
-        ##knowledge_graph##
-        [- Provide extracted or default guidelines on:
-            - Knowledge graph structure and hierarchy
-            - Representation of relationships and nodes
-            - Compliance with contextual standards]
-        ##
-        
-        If any section is not explicitly covered in the provided input document, provide sensible default guidelines based on industry standards to ensure completeness.
-        """
-        
-        try:
-            response = self.generate_litellm_response(prompt, model_name, provider)
-            extracted_content = response['choices'][0]['message']['content']
-            
-            sections = {
-                'review': 'Default review guidelines.',
-                'documentation': 'Default documentation guidelines.',
-                'comments': 'Default comments guidelines.',
-                'knowledge_graph': 'Default knowledge graph guidelines.'
-            }
-            
-            patterns = {
-                'review': r'##review##\s*(.*?)\s*##',
-                'documentation': r'##documentation##\s*(.*?)\s*##',
-                'comments': r'##comments##\s*(.*?)\s*##',
-                'knowledge_graph': r'##knowledge_graph##\s*(.*?)\s*##'
-            }
-            
-            for section, pattern in patterns.items():
-                match = re.search(pattern, extracted_content, re.DOTALL)
-                if match and match.group(1).strip():
-                    sections[section] = match.group(1).strip()
-            
-            return sections
-            
-        except Exception as e:
-            print(f"Error extracting compliance sections: {e}")
-            return {
-                'review': 'Error occurred. Using default review guidelines.',
-                'documentation': 'Error occurred. Using default documentation guidelines.',
-                'comments': 'Error occurred. Using default comments guidelines.',
-                'knowledge_graph': 'Error occurred. Using default knowledge graph guidelines.'
-            }
+    def ai_extract_compliance_sections(self, file_content: str, model_name: str, provider: str) -> Dict[str, str]:
+        return extract_compliance_sections(self.llm_cache, file_content, model_name, provider, self.api_keys)
 
     def load_compliance_file(self, compliance_file_path: Optional[str], model_name: str, provider: str) -> Dict[str, str]:
         default_sections = {
@@ -194,7 +114,8 @@ class CodeReviewSystem:
 
 
     def generate_documentation(self, file_snippet: str, model_name: str, provider: str, 
-                             compliance_sections: Dict[str, str], additional_contents: Dict,file_extension: str, file_type: str) -> str:
+                             compliance_sections: Dict[str, str], additional_contents: Dict,file_extension: str, file_type: str,
+                             part: Optional[str] = None) -> str:
         documentation_libraries = {
             ".java": "Javadoc", ".py": "Pydoc", ".js": "JSDoc", ".jsx": "JSDOC",
             ".ts": "Typedoc", ".cpp": "Doxygen", ".c": "Doxygen", ".h": "Doxygen",
@@ -306,7 +227,8 @@ class CodeReviewSystem:
 """
 
         try:
-            response = self.generate_litellm_response(prompt, model_name, provider)
+            response = self.generate_litellm_response(part_note(part) + prompt, model_name, provider,
+                                                      stream_as="documentation", part=part)
             return response['choices'][0]['message']['content']
         except Exception as e:
             print(f"Error in documentation generation: {e}")
@@ -361,14 +283,21 @@ class CodeReviewSystem:
             results = {}
             if "documentation" in output_types:
                 print("Generating documentation...")
-                results["documentation"] = reviewer.generate_documentation(
-                    file_content, 
-                    model_name, 
-                    provider,
-                    compliance_sections,
-                    additional_contents,
-                    file_extension,
-                    file_type
+                # A file over the chunk budget is documented in parts and the documents merged
+                results["documentation"] = generate_chunked(
+                    "documentation", file_content, file_extension, file_type,
+                    lambda text, part: reviewer.generate_documentation(
+                        text, 
+                        model_name, 
+                        provider,
+                        compliance_sections,
+                        additional_contents,
+                        file_extension,
+                        file_type,
+                        part
+                    ),
+                    reviewer.merge_completion(model_name, provider, "documentation"),
+                    reviewer.chunk_tokens, reviewer.chunk_concurrency
                 )
                 print("Documentation generated successfully")
             
@@ -401,49 +330,51 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--input', required=True)
     parser.add_argument('--output', required=True)
+    parser.add_argument('--llm-cache', choices=LLM_CACHE_MODES, default=None,
+                        help='LLM response cache: on, refresh or off (default: LLM_CACHE or on)')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='Files processed at once (default: BATCH_MAX_WORKERS or 4)')
+    parser.add_argument('--stream', default=None,
+                        help='Append NDJSON progress events with the generated text to this file, '
+                             'or write them to stdout with -')
     parser.add_argument('--compliance', default=None)
     parser.add_argument('--additional-files', nargs='*', default=None)
     args = parser.parse_args()
 
-    try:
-        output_dir = os.path.dirname(args.output)
-        os.makedirs(output_dir, exist_ok=True)
+    with progress_stream(args.stream) as progress:
+        try:
+            output_dir = os.path.dirname(args.output)
+            os.makedirs(output_dir, exist_ok=True)
         
-        with open(args.input, 'r') as f:
-            input_data = json.load(f)
+            with open(args.input, 'r') as f:
+                input_data = json.load(f)
             
-        reviewer = CodeReviewSystem()
-        results = {}
-        
-        for file_data in input_data['files_data']:
-            try:
-                # Prepare output types (in this case, just documentation)
-                output_types = ["documentation"]
-                
-                # Call process_code with the correct parameters
-                result = reviewer.process_code(
-                    output_types=output_types,
+            reviewer = CodeReviewSystem(llm_cache_mode=args.llm_cache)
+            reviewer.progress = progress
+            def process(file_data):
+                # Progress events name the file as the results do
+                stream_file.set(file_data['name'])
+                return reviewer.process_code(
+                    output_types=["documentation"],
                     file_path=file_data['path'],
                     provider=input_data['provider'],
                     model_name=input_data['model_name'],
                     compliance_file_path=args.compliance,
                     additional_files=args.additional_files
                 )
-                
-                # Store results
-                results[file_data['name']] = result
-            except Exception as e:
-                results[file_data['name']] = {"status": "error", "message": str(e)}
+
+            # Process the files concurrently; a file that fails gets its own error entry
+            results = process_batch(input_data['files_data'], process, max_workers=args.max_workers)
         
-        # Write output to file
-        with open(args.output, 'w') as f:
-            json.dump({"status": "success", "documentation": results}, f, indent=2)
+            # Write output to file
+            with open(args.output, 'w') as f:
+                json.dump({"status": "success", "documentation": results}, f, indent=2)
             
-    except Exception as e:
-        # Handle any top-level exceptions
-        with open(args.output, 'w') as f:
-            json.dump({"status": "error", "message": str(e)}, f)
-        sys.exit(1)
+        except Exception as e:
+            # Handle any top-level exceptions
+            with open(args.output, 'w') as f:
+                json.dump({"status": "error", "message": str(e)}, f)
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,4 +1,3 @@
-import litellm
 import os
 import re
 from collections import defaultdict
@@ -6,32 +5,18 @@ from dotenv import load_dotenv
 import sys
 import json
 from typing import Dict, List, Union
+from llm_cache import LLMResponseCache, cached_completion
 
 # Load environment variables hey need to commit.
 load_dotenv()
 claude_api_key = os.getenv("CLAUD_API_KEY")
 open_api_key = os.getenv("OPENAI_API_KEY")
+llm_cache = LLMResponseCache()
 
 def generate_litellm_response(prompt, model_name, provider):
     """Generate AI response using specified model and provider"""
-    if provider.lower() == "openai":
-        return litellm.completion(
-            model=model_name,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            seed=42,
-            top_p=0.95,
-            api_key=open_api_key
-        )
-    elif provider.lower() == "anthropic":
-        return litellm.completion(
-            model=model_name,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            seed=42,
-            top_p=0.85,
-            api_key=claude_api_key
-        )
+    return cached_completion(llm_cache, prompt, model_name, provider,
+                             {"openai": open_api_key, "anthropic": claude_api_key})
 
 def parse_file_contents(files: List[Dict[str, str]]) -> Dict[str, str]:
     """Parse file contents from the provided list of files"""
@@ -245,7 +230,7 @@ def generate_guidelines_document(input_data: Dict) -> Dict:
             'message': str(e)
         }
 
-if __name__ == "__main__":
+def main():
     try:
         input_data = json.loads(sys.stdin.read())
         result = generate_guidelines_document(input_data)
@@ -259,4 +244,7 @@ if __name__ == "__main__":
         print(json.dumps({
             'status': 'error',
             'message': str(e)
-        }))                                                                                      
\ No newline at end of file
+        }))                                                                                      
+
+if __name__ == "__main__":
+    main()
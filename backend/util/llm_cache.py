@@ -0,0 +1,458 @@
+"""
+On-disk cache of LLM completions.
+
+The scripts call the providers with temperature 0 and a fixed seed, so the
+same prompt to the same model gives the same answer, and re-reviewing an
+unchanged file need not be paid for again. Each response is stored as one
+JSON file named by the SHA-256 of the provider, model, sampling parameters
+and prompt; API keys are never part of the key or the entry.
+
+Configuration, read from the environment (and so from .env):
+    LLM_CACHE            on (default), refresh to skip lookups but store new
+                         responses, or off to bypass the cache entirely
+    LLM_CACHE_DIR        cache directory, default <tmp>/codeinsights/llm_cache
+    LLM_CACHE_MAX_BYTES  total size kept, least recently used entries are
+                         evicted first; default 256 MiB
+    LLM_CACHE_MAX_AGE    seconds an entry stays valid after it was stored;
+                         default 7 days
+
+Writes do not scan the cache directory. The size of the cache is kept as a
+running total, and the directory is scanned only when that total goes over
+LLM_CACHE_MAX_BYTES (the scan then evicts down to 90% of it) and every
+EVICT_INTERVAL writes, which expires old entries and accounts for files
+written by other processes. The first write of a process takes the
+initial measurement.
+
+Cached responses are returned as plain dicts with the shape of the litellm
+response, so response['choices'][0]['message']['content'] works either way.
+Results derived from responses, such as the sections extracted from a
+compliance document, are cached the same way with memoize().
+
+The scripts make every LLM call through cached_completion() or
+acached_completion(), and extract compliance guidelines with
+extract_compliance_sections().
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+
+
+LLM_CACHE_MODES = ('on', 'refresh', 'off')
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'codeinsights', 'llm_cache')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+ENTRY_SUFFIX = '.json'
+EVICT_INTERVAL = 100
+# Eviction frees this much below max_bytes, so the next writes do not trigger another scan
+EVICT_HEADROOM = 0.1
+# Sampling parameters per provider; temperature 0 and a fixed seed keep answers repeatable
+COMPLETION_PARAMS = {
+    'openai': {"temperature": 0, "seed": 42, "top_p": 0.95},
+    'anthropic': {"temperature": 0, "seed": 42, "top_p": 0.85},
+}
+MAX_DOCUMENT_CHARS = 100000
+COMPLIANCE_SECTIONS = ('review', 'documentation', 'comments', 'knowledge_graph')
+
+
+def response_to_dict(response):
+    """Plain dict form of a litellm response (a pydantic model) or of a dict"""
+    for method in ('model_dump', 'dict'):
+        if hasattr(response, method):
+            return getattr(response, method)()
+    return dict(response)
+
+
+class LLMResponseCache:
+    def __init__(self, directory=None, max_bytes=None, max_age=None, mode=None):
+        """
+        Args:
+            directory (str): Cache directory, created on first write
+            max_bytes (int): Size above which least recently used entries are evicted
+            max_age (float): Seconds after which an entry is stale
+            mode (str): One of LLM_CACHE_MODES
+        Missing arguments are read from the environment.
+        """
+        self.directory = directory or os.getenv('LLM_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else int(
+            os.getenv('LLM_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+        self.max_age = max_age if max_age is not None else float(
+            os.getenv('LLM_CACHE_MAX_AGE', DEFAULT_MAX_AGE))
+        self.mode = (mode or os.getenv('LLM_CACHE') or 'on').lower()
+        if self.mode not in LLM_CACHE_MODES:
+            raise ValueError(f"LLM cache mode must be one of {', '.join(LLM_CACHE_MODES)}, not {self.mode!r}")
+        self.hits = 0
+        self.misses = 0
+        self._memory = {}
+        self._memory_locks = {}
+        self._lock = threading.Lock()
+        self._evict_lock = threading.Lock()
+        # Bytes in the cache directory as of the last scan plus later writes; None until measured
+        self._size = None
+        self._writes = 0
+
+    @staticmethod
+    def key(provider, model, params, prompt):
+        material = json.dumps({'provider': provider.lower(), 'model': model, 'params': params, 'prompt': prompt},
+                              sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """Return the cached response for key, or None if it is missing or stale"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self._remove(path)
+            return None
+        if time.time() - entry.get('stored_at', 0) > self.max_age:
+            self._remove(path)
+            return None
+        try:
+            # The access time records the last use, for size-based eviction;
+            # the modification time stays the time the entry was stored
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            pass
+        return entry.get('response')
+
+    def put(self, key, response):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {'stored_at': time.time(), 'response': response_to_dict(response)}
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, default=str)
+            size = os.path.getsize(temp_path)
+            try:
+                size -= os.path.getsize(path)
+            except OSError:
+                pass
+            # Readers never see a partially written entry
+            os.replace(temp_path, path)
+        except BaseException:
+            self._remove(temp_path)
+            raise
+
+        with self._lock:
+            self._writes += 1
+            if self._size is not None:
+                self._size += size
+            due = (self._size is None or self._size > self.max_bytes
+                   or self._writes % EVICT_INTERVAL == 0)
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Remove stale entries, then the least recently used until the cache fits max_bytes"""
+        # One scan at a time is enough; a write arriving meanwhile is counted by the next one
+        if not self._evict_lock.acquire(blocking=False):
+            return
+        try:
+            total_bytes = self._evict()
+        finally:
+            self._evict_lock.release()
+        with self._lock:
+            self._size = total_bytes
+
+    def _evict(self):
+        now = time.time()
+        entries = []
+        total_bytes = 0
+        try:
+            shards = list(os.scandir(self.directory))
+        except FileNotFoundError:
+            return 0
+        for shard in shards:
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                try:
+                    stat = item.stat()
+                except FileNotFoundError:
+                    continue
+                if not item.name.endswith(ENTRY_SUFFIX):
+                    # Temporary files left by interrupted writes; recent ones may still be in use
+                    if now - stat.st_mtime > 3600:
+                        self._remove(item.path)
+                    continue
+                if now - stat.st_mtime > self.max_age:
+                    self._remove(item.path)
+                    continue
+                entries.append((stat.st_atime, stat.st_size, item.path))
+                total_bytes += stat.st_size
+
+        if total_bytes > self.max_bytes:
+            target = self.max_bytes * (1 - EVICT_HEADROOM)
+            for _, size, path in sorted(entries):
+                self._remove(path)
+                total_bytes -= size
+                if total_bytes <= target:
+                    break
+        return total_bytes
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def completion(self, provider, model, prompt, params, request):
+        """
+        Return the cached response for this call, or call request() and cache
+        its result. params are the sampling parameters passed to the provider.
+        """
+        if self.mode == 'off':
+            return request()
+        key = self.key(provider, model, params, prompt)
+        if self.mode == 'on':
+            cached = self.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
+        response = request()
+        try:
+            self.put(key, response)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not cache LLM response: {e}", file=sys.stderr)
+        return response
+
+    async def acompletion(self, provider, model, prompt, params, request):
+        """
+        completion() for a coroutine function request; the cache files are
+        read and written on a worker thread, off the event loop
+        """
+        if self.mode == 'off':
+            return await request()
+        key = self.key(provider, model, params, prompt)
+        if self.mode == 'on':
+            cached = await asyncio.to_thread(self.get, key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
+        response = await request()
+        try:
+            await asyncio.to_thread(self.put, key, response)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Could not cache LLM response: {e}", file=sys.stderr)
+        return response
+
+    def memoize(self, kind, fields, compute):
+        """
+        Return the result of compute() for kind and the identifying fields,
+        calling it at most once per cache object even from several threads.
+        The result must be JSON-serialisable; it is also stored on disk, so
+        later processes reuse it under the same mode, size and age rules as
+        completions. Calls that raise are not cached.
+        """
+        key = hashlib.sha256(json.dumps({'kind': kind, 'fields': fields}, sort_keys=True,
+                                        ensure_ascii=False).encode('utf-8')).hexdigest()
+        with self._lock:
+            key_lock = self._memory_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key in self._memory:
+                self.hits += 1
+                return self._memory[key]
+            value = self.get(key) if self.mode == 'on' else None
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+                value = compute()
+                if self.mode != 'off':
+                    try:
+                        self.put(key, value)
+                    except (OSError, TypeError, ValueError) as e:
+                        print(f"Could not cache {kind}: {e}", file=sys.stderr)
+            self._memory[key] = value
+            return value
+
+
+def completion_settings(provider, api_keys):
+    """Sampling parameters and API key for a provider; api_keys maps provider names to keys"""
+    params = COMPLETION_PARAMS.get(provider.lower())
+    if params is None:
+        raise ValueError(f"Unsupported provider: {provider}")
+    return dict(params), api_keys.get(provider.lower())
+
+
+def cached_completion(cache, prompt, model_name, provider, api_keys, progress=None, stream_as=None, part=None):
+    """
+    litellm completion of prompt, answered from cache when it can be.
+
+    With a ProgressStream (see llm_stream.py) and the name of the output in
+    stream_as, the answer is streamed to progress as it arrives; an answer
+    from the cache is sent to it in one piece.
+    """
+    params, api_key = completion_settings(provider, api_keys)
+    streaming = progress is not None and stream_as is not None
+    streamed = False
+
+    def request():
+        nonlocal streamed
+        # litellm takes seconds to import, so it is loaded only when a request is made
+        import litellm
+
+        response = litellm.completion(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            api_key=api_key,
+            stream=streaming,
+            **params
+        )
+        if not streaming:
+            return response
+        streamed = True
+        return progress.collect(response, stream_as, part)
+
+    response = cache.completion(provider, model_name, prompt, params, request)
+    if streaming and not streamed:
+        progress.replay(response, stream_as, part)
+    return response
+
+
+async def acached_completion(cache, prompt, model_name, provider, api_keys, timeout=None,
+                             progress=None, stream_as=None, part=None):
+    """
+    cached_completion() on litellm's async client. The call, including
+    reading a streamed answer, is cancelled after timeout seconds.
+    """
+    params, api_key = completion_settings(provider, api_keys)
+    streaming = progress is not None and stream_as is not None
+    streamed = False
+
+    async def call():
+        nonlocal streamed
+        import litellm
+
+        response = await litellm.acompletion(
+            model=model_name,
+            messages=[{"role": "user", "content": prompt}],
+            api_key=api_key,
+            stream=streaming,
+            **params
+        )
+        if not streaming:
+            return response
+        streamed = True
+        return await progress.acollect(response, stream_as, part)
+
+    async def request():
+        try:
+            return await asyncio.wait_for(call(), timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"LLM call timed out after {timeout} seconds") from None
+
+    response = await cache.acompletion(provider, model_name, prompt, params, request)
+    if streaming and not streamed:
+        progress.replay(response, stream_as, part)
+    return response
+
+
+def _compliance_sections(cache, document, model_name, provider, api_keys):
+    if len(document) > MAX_DOCUMENT_CHARS:
+        print(f"Content truncated to {MAX_DOCUMENT_CHARS} characters")
+        document = document[:MAX_DOCUMENT_CHARS]
+    prompt = f"""
+        You are an AI expert specializing in compliance document analysis and extracting structured guidelines. Your task is to analyze the provided compliance document and extract guidelines for specific categories, adhering to the following structured approach.
+
+        ### **Task Objective:**
+        - Extract and structure guidelines based on the input compliance document.
+        - For any section not explicitly covered, provide **default guidelines based on industry standards**.
+        - Format your response using the defined structure for clarity and organization.
+        
+        
+        Input Document:
+        The document content is sanitized and provided for analysis. Use the below provided relevant content to extract guidelines .
+        {document}
+        
+        Please analyze the document and extract guidelines for the following sections. Format your response using the exact structure below:
+        
+        ##review##
+        [- Include all guidelines related to:
+            - Code review practices
+            - Quality assurance standards
+            - Peer review protocols]
+        ##
+        
+        ##documentation##
+        [- Cover standards for:
+            - Documentation requirements
+            - Format and structure of documentation
+            - Maintenance of comprehensive records]
+        ##
+        
+        ##comments##
+        [- Extract details related to:
+            - Inline code comments
+            - Standards for descriptive comments
+            - Best practices for maintaining clarity and conciseness]
+        ##
+        
+        ##knowledge_graph##
+        [- Provide extracted or default guidelines on:
+            - Knowledge graph structure and hierarchy
+            - Representation of relationships and nodes
+            - Compliance with contextual standards]
+        ##
+        
+        If any section is not explicitly covered in the provided input document, provide sensible default guidelines based on industry standards to ensure completeness.
+        """
+
+    response = cached_completion(cache, prompt, model_name, provider, api_keys)
+    extracted_content = response['choices'][0]['message']['content']
+
+    sections = {
+        'review': 'Default review guidelines.',
+        'documentation': 'Default documentation guidelines.',
+        'comments': 'Default comments guidelines.',
+        'knowledge_graph': 'Default knowledge graph guidelines.'
+    }
+    for section in COMPLIANCE_SECTIONS:
+        match = re.search(rf'##{section}##\s*(.*?)\s*##', extracted_content, re.DOTALL)
+        if match and match.group(1).strip():
+            sections[section] = match.group(1).strip()
+    return sections
+
+
+def extract_compliance_sections(cache, document, model_name, provider, api_keys):
+    """
+    Review, documentation, comments and knowledge graph guidelines extracted
+    from a compliance document by the LLM; defaults stand in for sections
+    the document does not cover, and for all of them if extraction fails.
+    """
+    # The sections depend only on the document and the model, so they are extracted
+    # once per job and reused by later jobs while the document is unchanged
+    fields = {
+        'document_sha256': hashlib.sha256(document.encode('utf-8')).hexdigest(),
+        'provider': provider.lower(),
+        'model': model_name
+    }
+    try:
+        return dict(cache.memoize(
+            'compliance_sections', fields,
+            lambda: _compliance_sections(cache, document, model_name, provider, api_keys)
+        ))
+    except Exception as e:
+        print(f"Error extracting compliance sections: {e}")
+        return {
+            'review': 'Error occurred. Using default review guidelines.',
+            'documentation': 'Error occurred. Using default documentation guidelines.',
+            'comments': 'Error occurred. Using default comments guidelines.',
+            'knowledge_graph': 'Error occurred. Using default knowledge graph guidelines.'
+        }
@@ -0,0 +1,152 @@
+"""
+Streams LLM output as NDJSON progress events while a script runs.
+
+With --stream, the generators ask the provider for a streamed completion,
+through litellm's stream=True, and forward every piece of text as it
+arrives instead of waiting for the whole answer. The assembled text is
+still returned, cached and written to --output as before. Each event is
+one JSON object per line:
+
+    {"event": "start", "file": "app.py", "output": "review"}
+    {"event": "delta", "file": "app.py", "output": "review", "text": "The"}
+    {"event": "end", "file": "app.py", "output": "review", "chars": 5120, "cached": false}
+    {"event": "error", "file": "app.py", "output": "review", "message": "..."}
+
+A chunked file (see chunking.py) adds "part" to the events of each chunk
+and of each merge. A retried generation starts again with a new start
+event, so readers should discard the text collected for that file and
+output when one arrives. An answer from the LLM cache is sent as a single
+delta.
+
+--stream takes a path; events are appended to it, so a reader can follow
+the file while the script runs. With --stream -, events go to stdout and
+the scripts' other messages go to stderr.
+
+The review, documentation and comments routes do the former when called
+with ?stream=1 and forward the events as an NDJSON response, ending it with
+a {"event": "result", ...} line carrying the usual JSON body.
+"""
+import sys
+import json
+import threading
+from contextlib import contextmanager, redirect_stdout
+from contextvars import ContextVar
+
+
+# Name of the file being processed, set per file by the scripts' main()
+stream_file = ContextVar('stream_file', default=None)
+
+
+def _field(value, name):
+    if value is None:
+        return None
+    if isinstance(value, dict):
+        return value.get(name)
+    return getattr(value, name, None)
+
+
+def chunk_text(chunk):
+    """Text carried by one streamed litellm chunk, '' if it has none"""
+    choices = _field(chunk, 'choices')
+    if not choices:
+        return ''
+    return _field(_field(choices[0], 'delta'), 'content') or ''
+
+
+class ProgressStream:
+    def __init__(self, writer):
+        """
+        Args:
+            writer: Text file object the events are written to; it is flushed after each event
+        """
+        self.writer = writer
+        self._lock = threading.Lock()
+
+    def emit(self, event, output, part=None, **fields):
+        record = {'event': event, 'file': stream_file.get(), 'output': output}
+        if part:
+            record['part'] = part
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        # Events from concurrent files are written whole, one line at a time
+        with self._lock:
+            self.writer.write(line)
+            self.writer.flush()
+
+    @staticmethod
+    def _response(text, model, finish_reason):
+        # Same shape as a litellm response, so callers and the cache treat both alike
+        return {
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                         'finish_reason': finish_reason}],
+            'model': model
+        }
+
+    def _collect_chunk(self, chunk, pieces, output, part):
+        text = chunk_text(chunk)
+        if text:
+            pieces.append(text)
+            self.emit('delta', output, part, text=text)
+        choices = _field(chunk, 'choices')
+        return _field(choices[0], 'finish_reason') if choices else None
+
+    def collect(self, chunks, output, part=None):
+        """
+        Forward a litellm stream as delta events and return the assembled
+        response.
+        """
+        self.emit('start', output, part)
+        pieces = []
+        model = finish_reason = None
+        try:
+            for chunk in chunks:
+                model = model or _field(chunk, 'model')
+                finish_reason = self._collect_chunk(chunk, pieces, output, part) or finish_reason
+        except Exception as e:
+            self.emit('error', output, part, message=str(e))
+            raise
+        text = ''.join(pieces)
+        self.emit('end', output, part, chars=len(text), cached=False)
+        return self._response(text, model, finish_reason)
+
+    async def acollect(self, chunks, output, part=None):
+        """collect() for the async stream returned by litellm.acompletion"""
+        self.emit('start', output, part)
+        pieces = []
+        model = finish_reason = None
+        try:
+            async for chunk in chunks:
+                model = model or _field(chunk, 'model')
+                finish_reason = self._collect_chunk(chunk, pieces, output, part) or finish_reason
+        except BaseException as e:
+            # Also reports a stream cancelled by the call timeout
+            self.emit('error', output, part, message=str(e) or type(e).__name__)
+            raise
+        text = ''.join(pieces)
+        self.emit('end', output, part, chars=len(text), cached=False)
+        return self._response(text, model, finish_reason)
+
+    def replay(self, response, output, part=None):
+        """Send a complete response, such as a cached one, as a single delta"""
+        text = response['choices'][0]['message']['content'] or ''
+        self.emit('start', output, part)
+        if text:
+            self.emit('delta', output, part, text=text)
+        self.emit('end', output, part, chars=len(text), cached=True)
+
+
+@contextmanager
+def progress_stream(destination):
+    """
+    ProgressStream for the --stream argument, or None when it is not given.
+    '-' writes to stdout and sends everything else printed meanwhile to stderr.
+    """
+    if not destination:
+        yield None
+    elif destination == '-':
+        progress = ProgressStream(sys.stdout)
+        with redirect_stdout(sys.stderr):
+            yield progress
+    else:
+        with open(destination, 'a', encoding='utf-8') as f:
+            yield ProgressStream(f)
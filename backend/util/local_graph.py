@@ -0,0 +1,474 @@
+"""
+Embedded graph store for the knowledge graph, backed by SQLite.
+
+Implements the operations of Neo4jGraphStore in analyze_codebase.py, so the
+knowledge graph build and the JSON export can run without a Neo4j server,
+for example in CI, on a laptop or for bulk offline analysis. Nodes and
+relationships live in two adjacency tables; the precomputed hierarchy
+sections of the export live in side tables of their own.
+"""
+import itertools
+import json
+import os
+import sqlite3
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL,
+    uid TEXT,
+    name TEXT,
+    source_file TEXT,
+    properties TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS relationships (
+    id INTEGER PRIMARY KEY,
+    start_id INTEGER NOT NULL,
+    type TEXT NOT NULL,
+    end_id INTEGER NOT NULL,
+    properties TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS relationships_start ON relationships (start_id, type, end_id);
+CREATE INDEX IF NOT EXISTS relationships_end ON relationships (end_id, type);
+CREATE INDEX IF NOT EXISTS relationships_type ON relationships (type);
+CREATE TABLE IF NOT EXISTS class_hierarchies (
+    id INTEGER PRIMARY KEY,
+    repository TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    root_class TEXT,
+    ancestors TEXT NOT NULL,
+    depth INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS class_hierarchies_repository ON class_hierarchies (repository, position);
+CREATE TABLE IF NOT EXISTS method_inheritance (
+    id INTEGER PRIMARY KEY,
+    repository TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    base_method TEXT,
+    base_class TEXT,
+    derived_classes TEXT NOT NULL,
+    derived_methods TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS method_inheritance_repository ON method_inheritance (repository, position);
+"""
+
+# Node indexes the build and export look nodes up by, created by
+# LocalGraphStore.ensure_schema. SQLite indexes span all labels, so one index
+# per property serves every label Neo4j indexes separately.
+NODE_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS nodes_uid ON nodes (label, uid)",
+    "CREATE INDEX IF NOT EXISTS nodes_source_file ON nodes (label, source_file)",
+    "CREATE INDEX IF NOT EXISTS nodes_name ON nodes (label, name)",
+]
+
+FIND_NODE = "SELECT id FROM nodes WHERE label = ? AND uid = ?"
+
+DESCENDANT_CLASSES = """
+SELECT DISTINCT descendant.uid
+FROM nodes base
+JOIN relationships r ON r.end_id = base.id AND r.type = 'INHERITS_FROM'
+JOIN nodes descendant ON descendant.id = r.start_id AND descendant.label = 'Class'
+WHERE base.label = 'Class' AND base.source_file IN (SELECT value FROM json_each(?))
+"""
+
+FILE_NODES = """
+SELECT id FROM nodes
+WHERE label = ? AND source_file IN (SELECT value FROM json_each(?))
+"""
+
+CLASSES_BY_UID = """
+SELECT id FROM nodes
+WHERE label = 'Class' AND uid IN (SELECT value FROM json_each(:uids))
+"""
+
+# Relationships of the given classes rebuilt with their inheritance
+CLASS_RELATIONSHIPS = [
+    f"""DELETE FROM relationships
+    WHERE type = 'INHERITS_FROM' AND start_id IN ({CLASSES_BY_UID})""",
+    f"""DELETE FROM relationships
+    WHERE type IN ('HAS_CHILD', 'HAS_GRANDCHILD', 'HAS_DESCENDANT') AND end_id IN ({CLASSES_BY_UID})""",
+    f"""DELETE FROM relationships
+    WHERE type = 'IS_SIBLING_OF' AND (start_id IN ({CLASSES_BY_UID}) OR end_id IN ({CLASSES_BY_UID}))""",
+    f"""DELETE FROM relationships
+    WHERE type = 'OVERRIDES' AND start_id IN (
+        SELECT has_method.end_id FROM relationships has_method
+        JOIN nodes method ON method.id = has_method.end_id AND method.label = 'Method'
+        WHERE has_method.type = 'HAS_METHOD' AND has_method.start_id IN ({CLASSES_BY_UID}))""",
+]
+
+NODE_PAGE = "SELECT id FROM nodes WHERE id > ? {label_filter} ORDER BY id LIMIT ?"
+
+NODE_ROWS = """
+SELECT id, label, properties FROM nodes
+WHERE id IN (SELECT value FROM json_each(?))
+ORDER BY id
+"""
+
+RELATIONSHIP_PAGE = """
+SELECT r.id FROM relationships r
+JOIN nodes s ON s.id = r.start_id AND s.label = '{start_label}'
+JOIN nodes e ON e.id = r.end_id AND e.label = '{end_label}'
+WHERE r.type = '{rel_type}' AND r.id > ? ORDER BY r.id LIMIT ?
+"""
+
+REPOSITORY_EXISTS = "SELECT 1 FROM nodes WHERE label = 'Repository' AND uid = ?"
+
+# Precomputed rows of the hierarchy sections of the export, scoped by the uid
+# of their repository and written in position order; list columns hold JSON
+SUMMARY_COLUMNS = {
+    'class_hierarchies': (('root_class', 'ancestors', 'depth'), {'ancestors'}),
+    'method_inheritance': (('base_method', 'base_class', 'derived_classes', 'derived_methods'),
+                           {'derived_classes', 'derived_methods'}),
+}
+
+SUMMARY_PAGE = "SELECT id FROM {table} WHERE id > ? ORDER BY id LIMIT ?"
+
+SUMMARY_ROWS = """
+SELECT {columns} FROM {table}
+WHERE id IN (SELECT value FROM json_each(?))
+ORDER BY id
+"""
+
+SUMMARY_DELETE = "DELETE FROM {table} WHERE repository = ?"
+
+RELATIONSHIP_ROWS = """
+SELECT r.id, r.start_id, r.end_id, r.properties,
+       s.name AS start_name, e.name AS end_name, e.properties AS end_properties
+FROM relationships r
+JOIN nodes s ON s.id = r.start_id
+JOIN nodes e ON e.id = r.end_id
+WHERE r.id IN (SELECT value FROM json_each(?))
+ORDER BY r.id
+"""
+
+# Classes holding a method
+METHOD_OWNERS = """
+SELECT c.id, c.name FROM relationships has_method
+JOIN nodes c ON c.id = has_method.start_id AND c.label = 'Class'
+WHERE has_method.type = 'HAS_METHOD' AND has_method.end_id = ?
+ORDER BY has_method.id
+"""
+
+# Relationship sections of the export: the relationship type and the labels
+# of its start and end nodes
+RELATIONSHIP_SECTIONS = {
+    'inheritance': ('INHERITS_FROM', 'Class', 'Class'),
+    'method_overrides': ('OVERRIDES', 'Method', 'Method'),
+    'sibling_relationships': ('IS_SIBLING_OF', 'Class', 'Class'),
+    'import_relationships': ('IMPORTS', 'ModuleNamespace', 'Import'),
+}
+
+
+# Names in-memory databases apart within the process
+_memory_database_ids = itertools.count()
+
+
+def _without_nulls(properties):
+    # Neo4j does not store null properties; neither does the local store
+    return {key: value for key, value in properties.items() if value is not None}
+
+
+class LocalGraphStore:
+    def __init__(self, path=':memory:'):
+        """
+        Args:
+            path (str): SQLite database file, or ':memory:' for a graph that
+                only lives as long as the process
+        """
+        self.path = path
+        if path == ':memory:':
+            # A named shared-cache database, so sessions can open more connections to it
+            self.database = f"file:knowledge-graph-{os.getpid()}-{next(_memory_database_ids)}?mode=memory&cache=shared"
+        else:
+            self.database = path
+        self.connection = self._connect()
+        self._drop_unscoped_summary_tables()
+        self.connection.executescript(SCHEMA)
+        # Statements executed, reported as db_round_trips in the pipeline metrics
+        self.round_trips = 0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.database, uri=self.database.startswith('file:'))
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def _drop_unscoped_summary_tables(self):
+        # Summary tables from before their rows were scoped by repository only
+        # hold derived rows, which the next build writes again
+        for table in SUMMARY_COLUMNS:
+            columns = {row['name'] for row in self.connection.execute(f"PRAGMA table_info({table})")}
+            if columns and 'repository' not in columns:
+                with self.connection:
+                    self.connection.execute(f"DROP TABLE {table}")
+
+    def session(self):
+        """A store on a connection of its own, for one concurrent reader"""
+        session = object.__new__(LocalGraphStore)
+        session.path = self.path
+        session.database = self.database
+        session.connection = session._connect()
+        session.round_trips = 0
+        return session
+
+    def close(self):
+        self.connection.close()
+
+    def _execute(self, statement, params=()):
+        self.round_trips += 1
+        return self.connection.execute(statement, params)
+
+    def _executemany(self, statement, rows):
+        self.round_trips += 1
+        return self.connection.executemany(statement, rows)
+
+    def write_nodes(self, label, rows, merge=False):
+        records = []
+        with self.connection:
+            for row in rows:
+                properties = _without_nulls(row['props'])
+                values = (properties.get('uid'), properties.get('name'), properties.get('source_file'),
+                          json.dumps(properties))
+                node_id = None
+                if merge:
+                    existing = self._execute(FIND_NODE, (label, properties.get('uid'))).fetchone()
+                    if existing is not None:
+                        node_id = existing['id']
+                        self._execute(
+                            "UPDATE nodes SET uid = ?, name = ?, source_file = ?, properties = ? WHERE id = ?",
+                            values + (node_id,))
+                if node_id is None:
+                    node_id = self._execute(
+                        "INSERT INTO nodes (label, uid, name, source_file, properties) VALUES (?, ?, ?, ?, ?)",
+                        (label,) + values).lastrowid
+                records.append({'key': row['key'], 'node_id': node_id})
+        return records
+
+    def find_nodes(self, label, rows):
+        records = []
+        for row in rows:
+            for match in self._execute(FIND_NODE, (label, row['uid'])):
+                records.append({'key': row['key'], 'node_id': match['id']})
+        return records
+
+    def write_relationships(self, rel_type, rows, merge=False):
+        with self.connection:
+            for row in rows:
+                properties = json.dumps(_without_nulls(row['props']))
+                if merge:
+                    existing = self._execute(
+                        "SELECT id FROM relationships WHERE start_id = ? AND type = ? AND end_id = ?",
+                        (row['start'], rel_type, row['end'])).fetchone()
+                    if existing is not None:
+                        self._execute("UPDATE relationships SET properties = ? WHERE id = ?",
+                                                (properties, existing['id']))
+                        continue
+                self._execute(
+                    "INSERT INTO relationships (start_id, type, end_id, properties) VALUES (?, ?, ?, ?)",
+                    (row['start'], rel_type, row['end'], properties))
+
+    def descendant_classes(self, files):
+        """uids of classes inheriting directly from a class defined in one of the files"""
+        return [row['uid'] for row in self._execute(DESCENDANT_CLASSES, (json.dumps(files),))]
+
+    def delete_file_nodes(self, label, files):
+        with self.connection:
+            self._execute("""
+                CREATE TEMP TABLE IF NOT EXISTS doomed_nodes (id INTEGER PRIMARY KEY)
+                """)
+            self._execute("DELETE FROM doomed_nodes")
+            self._execute("INSERT INTO doomed_nodes " + FILE_NODES, (label, json.dumps(files)))
+            self._execute("""
+                DELETE FROM relationships
+                WHERE start_id IN (SELECT id FROM doomed_nodes) OR end_id IN (SELECT id FROM doomed_nodes)
+                """)
+            self._execute("DELETE FROM nodes WHERE id IN (SELECT id FROM doomed_nodes)")
+
+    def delete_class_relationships(self, class_uids):
+        with self.connection:
+            for statement in CLASS_RELATIONSHIPS:
+                self._execute(statement, {'uids': json.dumps(class_uids)})
+
+    def repository_exists(self, uid):
+        return self._execute(REPOSITORY_EXISTS, (uid,)).fetchone() is not None
+
+    def delete_all(self):
+        with self.connection:
+            self._execute("DELETE FROM relationships")
+            self._execute("DELETE FROM nodes")
+            for table in SUMMARY_COLUMNS:
+                self._execute(f"DELETE FROM {table}")
+
+    def delete_summary_rows(self, section, repository):
+        with self.connection:
+            self._execute(SUMMARY_DELETE.format(table=section), (repository,))
+
+    def write_summary_rows(self, section, rows):
+        columns, list_columns = SUMMARY_COLUMNS[section]
+        with self.connection:
+            self._executemany(
+                f"INSERT INTO {section} (repository, position, {', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * (len(columns) + 2))})",
+                [(row['repository'], row['position']) + tuple(json.dumps(row[column]) if column in list_columns else row[column]
+                                             for column in columns)
+                 for row in rows])
+
+    def ensure_schema(self, uid_labels, file_labels, name_labels):
+        """
+        Create the node indexes the build and export look nodes up by (see
+        NODE_INDEXES); the label lists only matter to Neo4j. Returns the
+        statements that could not be applied, e.g. a unique index existing
+        duplicates violate.
+        """
+        failed = []
+        for statement in NODE_INDEXES:
+            try:
+                with self.connection:
+                    self._execute(statement)
+            except sqlite3.DatabaseError as schema_error:
+                print(f"Could not apply '{statement}': {schema_error}")
+                failed.append(statement)
+        return failed
+
+    def planned_queries(self):
+        """(name, query, params) for the build and export queries"""
+        no_ids = json.dumps([])
+        yield 'find_nodes', FIND_NODE, ('Class', '')
+        yield 'descendant_classes', DESCENDANT_CLASSES, (no_ids,)
+        yield 'delete_file_nodes', FILE_NODES, ('Class', no_ids)
+        for index, statement in enumerate(CLASS_RELATIONSHIPS, 1):
+            yield f'delete_class_relationships_{index}', statement, {'uids': no_ids}
+        yield 'repository_exists', REPOSITORY_EXISTS, ('',)
+        yield 'export_nodes_page_keys', NODE_PAGE.replace('{label_filter}', 'AND label = ?'), (-1, 'Class', 1)
+        yield 'export_nodes_page', NODE_ROWS, (no_ids,)
+        for section, (rel_type, start_label, end_label) in RELATIONSHIP_SECTIONS.items():
+            yield f'export_{section}_page_keys', RELATIONSHIP_PAGE.format(
+                rel_type=rel_type, start_label=start_label, end_label=end_label), (-1, 1)
+        yield 'export_relationships_page', RELATIONSHIP_ROWS, (no_ids,)
+        yield 'export_method_owners', METHOD_OWNERS, (0,)
+        for section, (columns, _) in SUMMARY_COLUMNS.items():
+            yield f'delete_{section}', SUMMARY_DELETE.format(table=section), ('',)
+            yield f'export_{section}_page_keys', SUMMARY_PAGE.format(table=section), (-1, 1)
+            yield f'export_{section}_page', SUMMARY_ROWS.format(
+                columns=', '.join(columns), table=section), (no_ids,)
+
+    def explain_queries(self):
+        """
+        EXPLAIN QUERY PLAN every build and export query and report how it reads
+        the tables: {name: {'uses_index': bool, 'index_lookups': [...], 'scans': [...]}}
+        """
+        report = {}
+        for name, query, params in self.planned_queries():
+            index_lookups, scans = [], []
+            for row in self._execute("EXPLAIN QUERY PLAN " + query, params):
+                step = row['detail']
+                if step.startswith('SCAN') and 'USING' not in step and 'json_each' not in step:
+                    scans.append(step)
+                elif step.startswith('SEARCH') or ('USING' in step and 'INDEX' in step):
+                    index_lookups.append(step)
+            report[name] = {'uses_index': bool(index_lookups), 'index_lookups': index_lookups, 'scans': scans}
+        return report
+
+    def export_rows(self, section):
+        return [row for page in self.export_pages(section, None) for row in page]
+
+    def export_labels(self):
+        return [row['label'] for row in self._execute(
+            "SELECT DISTINCT label FROM nodes ORDER BY label")]
+
+    def export_pages(self, section, page_size, label=None):
+        """
+        Yield the rows of an export section in pages of at most page_size
+        driving records (all at once when page_size is None), with the same
+        columns as the Neo4j export queries.
+        """
+        if section == 'nodes':
+            pages = self._id_pages(NODE_PAGE, page_size, label)
+            for ids in pages:
+                yield [{'type': row['label'], 'node_id': row['id'], 'properties': json.loads(row['properties'])}
+                       for row in self._execute(NODE_ROWS, (json.dumps(ids),))]
+        elif section in RELATIONSHIP_SECTIONS:
+            rel_type, start_label, end_label = RELATIONSHIP_SECTIONS[section]
+            pages = self._id_pages(RELATIONSHIP_PAGE.format(
+                rel_type=rel_type, start_label=start_label, end_label=end_label), page_size)
+            for ids in pages:
+                yield self._relationship_rows(section, ids)
+        elif section in SUMMARY_COLUMNS:
+            columns, list_columns = SUMMARY_COLUMNS[section]
+            pages = self._id_pages(SUMMARY_PAGE.format(table=section), page_size)
+            for positions in pages:
+                yield [{column: json.loads(row[column]) if column in list_columns else row[column]
+                        for column in columns}
+                       for row in self._execute(
+                           SUMMARY_ROWS.format(columns=', '.join(columns), table=section),
+                           (json.dumps(positions),))]
+        else:
+            raise KeyError(section)
+
+    def statistics(self):
+        row = self._execute(
+            "SELECT count(*) AS nodes, count(DISTINCT label) AS node_types FROM nodes").fetchone()
+        return {'nodes': row['nodes'], 'node_types': row['node_types']}
+
+    def _id_pages(self, query, page_size, label=None):
+        """Keyset pagination over the ids returned by query, which takes (after_id, limit)"""
+        params = ()
+        label_filter = ''
+        if label is not None:
+            label_filter = 'AND label = ?'
+            params = (label,)
+        query = query.replace('{label_filter}', label_filter)
+        after_id = -1
+        while True:
+            if label is not None:
+                ids = [row[0] for row in self._execute(
+                    query, (after_id,) + params + (page_size or -1,))]
+            else:
+                ids = [row[0] for row in self._execute(query, (after_id, page_size or -1))]
+            if not ids:
+                return
+            yield ids
+            if page_size is None:
+                return
+            after_id = ids[-1]
+
+    def _relationship_rows(self, section, ids):
+        rows = []
+        for row in self._execute(RELATIONSHIP_ROWS, (json.dumps(ids),)):
+            properties = json.loads(row['properties'])
+            if section == 'inheritance':
+                rows.append({
+                    'derived_id': row['start_id'], 'derived_name': row['start_name'],
+                    'base_id': row['end_id'], 'base_name': row['end_name'],
+                    'is_direct': properties.get('direct'),
+                    'inheritance_level': properties.get('inheritance_level'),
+                })
+            elif section == 'sibling_relationships':
+                rows.append({
+                    'class_id': row['start_id'], 'class_name': row['start_name'],
+                    'sibling_id': row['end_id'], 'sibling_name': row['end_name'],
+                    'common_parent': properties.get('common_parent'),
+                })
+            elif section == 'import_relationships':
+                import_properties = json.loads(row['end_properties'])
+                rows.append({
+                    'module_name': row['start_name'], 'module_id': row['start_id'],
+                    'import_name': row['end_name'], 'import_id': row['end_id'],
+                    'base_package': import_properties.get('base_package'),
+                    'is_relative': import_properties.get('is_relative'),
+                })
+            else:
+                rows.extend(self._override_rows(row))
+        return rows
+
+    def _override_rows(self, override):
+        # One row per class holding the overriding and the overridden method,
+        # as the MATCH on HAS_METHOD produces
+        derived_classes = self._execute(METHOD_OWNERS, (override['start_id'],)).fetchall()
+        parent_classes = self._execute(METHOD_OWNERS, (override['end_id'],)).fetchall()
+        return [{
+            'method_name': override['start_name'], 'method_id': override['start_id'],
+            'derived_class': derived['name'], 'derived_class_id': derived['id'],
+            'parent_method_name': override['end_name'], 'parent_method_id': override['end_id'],
+            'parent_class': parent['name'], 'parent_class_id': parent['id'],
+        } for derived in derived_classes for parent in parent_classes]
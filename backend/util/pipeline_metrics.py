@@ -0,0 +1,113 @@
+"""
+Per-phase instrumentation for the codebase analysis pipeline.
+
+PipelineMetrics records, for each named phase, the wall time, CPU time and
+peak memory together with counters such as files parsed, nodes and
+relationships written and database round trips. The result is a plain dict
+that goes into the analysis output, and can also be logged as one JSON line
+per phase.
+"""
+import sys
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def _peak_rss_bytes():
+    """High-water mark of the resident set size of this process, or None"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PhaseMetrics:
+    __slots__ = ('name', 'wall_seconds', 'cpu_seconds', 'peak_rss_bytes', 'peak_traced_bytes', 'counters')
+
+    def __init__(self, name):
+        self.name = name
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss_bytes = None
+        self.peak_traced_bytes = None
+        self.counters = {}
+
+    def count(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def to_dict(self):
+        metrics = {
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'peak_rss_bytes': self.peak_rss_bytes,
+        }
+        if self.peak_traced_bytes is not None:
+            metrics['peak_traced_bytes'] = self.peak_traced_bytes
+        metrics.update(self.counters)
+        return metrics
+
+
+class PipelineMetrics:
+    """
+    Collects PhaseMetrics in the order the phases ran. Counters go to the
+    innermost open phase. When tracemalloc is tracing (python -X tracemalloc
+    or PYTHONTRACEMALLOC), each phase also reports the peak of traced
+    Python allocations while it ran.
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self._open_phases = []
+
+    @contextmanager
+    def phase(self, name, store=None):
+        """
+        Measure the enclosed block as phase name. With a graph store, the
+        store's round trips during the block are counted as db_round_trips.
+        """
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = PhaseMetrics(name)
+        round_trips = store.round_trips if store is not None else 0
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        self._open_phases.append(phase)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield phase
+        finally:
+            phase.wall_seconds += time.perf_counter() - wall_start
+            phase.cpu_seconds += time.process_time() - cpu_start
+            phase.peak_rss_bytes = _peak_rss_bytes()
+            if tracing:
+                phase.peak_traced_bytes = max(phase.peak_traced_bytes or 0, tracemalloc.get_traced_memory()[1])
+            if store is not None:
+                phase.count('db_round_trips', store.round_trips - round_trips)
+            self._open_phases.pop()
+
+    def count(self, counter, amount=1):
+        """Add to a counter of the innermost open phase; ignored outside any phase"""
+        if self._open_phases:
+            self._open_phases[-1].count(counter, amount)
+
+    def to_dict(self):
+        phases = {name: phase.to_dict() for name, phase in self.phases.items()}
+        return {
+            'phases': phases,
+            'total_wall_seconds': round(sum(phase.wall_seconds for phase in self.phases.values()), 6),
+            'peak_rss_bytes': _peak_rss_bytes(),
+        }
+
+    def log(self, logger):
+        """Emit one structured JSON log line per phase"""
+        for name, phase in self.phases.items():
+            logger.info(json.dumps({'event': 'phase_metrics', 'phase': name, **phase.to_dict()}))
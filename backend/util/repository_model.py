@@ -0,0 +1,364 @@
+"""
+Compact in-memory model of an analyzed repository.
+
+The analyzer produces one nested dict per file. Keeping those dicts for a
+whole repository costs far more memory than the information they hold, so
+each file is converted into slotted records as soon as it is parsed.
+Repeated names (classes, bases, decorators, parameters, imports, types)
+are stored once in a StringTable and referenced by index from arrays.
+
+RepositoryModel is also a read-only mapping with the same shape as the old
+repository_structure dict; directory and file entries are rebuilt as dicts
+only when they are accessed.
+"""
+import os
+from array import array
+from collections.abc import Mapping, Sequence
+
+
+class StringTable:
+    """
+    Interns strings and hands out integer ids; id 0 is None. Lists of names
+    (parameters, bases, decorators, imports) are interned as whole id tuples,
+    since the same signatures and decorator lists recur across a codebase.
+    """
+
+    __slots__ = ('strings', '_ids', '_sequences')
+
+    def __init__(self):
+        self.strings = [None]
+        self._ids = {}
+        self._sequences = {}
+
+    def intern(self, value):
+        if value is None:
+            return 0
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self.strings)
+            self._ids[value] = string_id
+            self.strings.append(value)
+        return string_id
+
+    def intern_all(self, values):
+        string_ids = tuple(map(self.intern, values))
+        return self._sequences.setdefault(string_ids, string_ids)
+
+    def lookup(self, string_id):
+        return self.strings[string_id]
+
+    def lookup_all(self, string_ids):
+        strings = self.strings
+        return [strings[string_id] for string_id in string_ids]
+
+
+# Method kinds, in the order the Python parser groups them
+METHOD_KINDS = ('methods', 'class_methods', 'static_methods', 'properties')
+# Keys every structured parse result carries
+STRUCTURE_KEYS = ('module', 'classes', 'functions', 'global_variables', 'imports')
+# Keys of every file the analyzer could stat
+FILE_KEYS = ('name', 'path', 'extension', 'size')
+CLASS_KEYS = {'name', 'bases', 'docstring', 'decorators', 'siblings', 'attributes', *METHOD_KINDS}
+METHOD_KEYS = {'name', 'parameters', 'docstring', 'decorators', 'returns', 'is_property'}
+FUNCTION_KEYS = {'parameters', 'docstring', 'decorators', 'returns'}
+ATTRIBUTE_KEYS = {'name', 'type_hint'}
+SIBLING_KEYS = {'name', 'common_bases'}
+VARIABLE_KEYS = {'name', 'is_constant', 'type_hint'}
+
+
+class MethodRecord:
+    __slots__ = ('name', 'parameters', 'docstring', 'decorators', 'returns', 'is_property')
+
+    def __init__(self, strings, method_info):
+        self.name = strings.intern(method_info['name'])
+        self.parameters = strings.intern_all(method_info['parameters'])
+        self.docstring = method_info['docstring']
+        self.decorators = strings.intern_all(method_info['decorators'])
+        self.returns = strings.intern(method_info['returns'])
+        self.is_property = method_info['is_property']
+
+    def to_dict(self, strings):
+        return {
+            'name': strings.lookup(self.name),
+            'parameters': strings.lookup_all(self.parameters),
+            'docstring': self.docstring,
+            'decorators': strings.lookup_all(self.decorators),
+            'returns': strings.lookup(self.returns),
+            'is_property': self.is_property,
+        }
+
+
+class ClassRecord:
+    __slots__ = ('name', 'bases', 'docstring', 'decorators', 'members', 'attributes', 'siblings')
+
+    def __init__(self, strings, class_info):
+        self.name = strings.intern(class_info['name'])
+        self.bases = strings.intern_all(class_info['bases'])
+        self.docstring = class_info['docstring']
+        self.decorators = strings.intern_all(class_info['decorators'])
+        self.members = tuple(
+            tuple(MethodRecord(strings, method_info) for method_info in class_info[kind])
+            for kind in METHOD_KINDS
+        )
+        # Flat (name, type_hint) id pairs
+        attributes = array('I')
+        for attribute in class_info['attributes']:
+            attributes.append(strings.intern(attribute['name']))
+            attributes.append(strings.intern(attribute['type_hint']))
+        self.attributes = attributes or ()
+        self.siblings = tuple(
+            (strings.intern(sibling['name']), strings.intern_all(sibling['common_bases']))
+            for sibling in class_info['siblings']
+        )
+
+    def to_dict(self, strings):
+        methods, class_methods, static_methods, properties = (
+            [method.to_dict(strings) for method in members] for members in self.members
+        )
+        class_info = {
+            'name': strings.lookup(self.name),
+            'bases': strings.lookup_all(self.bases),
+            'methods': methods,
+            'attributes': [
+                {'name': strings.lookup(self.attributes[index]),
+                 'type_hint': strings.lookup(self.attributes[index + 1])}
+                for index in range(0, len(self.attributes), 2)
+            ],
+            'class_methods': class_methods,
+            'static_methods': static_methods,
+            'properties': properties,
+            'docstring': self.docstring,
+            'decorators': strings.lookup_all(self.decorators),
+            'siblings': [
+                {'name': strings.lookup(name), 'common_bases': strings.lookup_all(common_bases)}
+                for name, common_bases in self.siblings
+            ],
+        }
+        return class_info
+
+
+class FunctionRecord:
+    __slots__ = ('name', 'parameters', 'docstring', 'decorators', 'returns')
+
+    def __init__(self, strings, name, function_info):
+        self.name = strings.intern(name)
+        self.parameters = strings.intern_all(function_info['parameters'])
+        self.docstring = function_info['docstring']
+        self.decorators = strings.intern_all(function_info['decorators'])
+        self.returns = strings.intern(function_info['returns'])
+
+    def to_dict(self, strings):
+        return {
+            'parameters': strings.lookup_all(self.parameters),
+            'docstring': self.docstring,
+            'decorators': strings.lookup_all(self.decorators),
+            'returns': strings.lookup(self.returns),
+        }
+
+
+class FileRecord:
+    __slots__ = ('name', 'path', 'extension', 'size', 'parser', 'module', 'module_docstring',
+                 'classes', 'functions', 'global_variables', 'imports', 'extras')
+
+    def __init__(self, strings, file_info):
+        file_info = dict(file_info)
+        self.module = None
+        self.module_docstring = None
+        self.classes = ()
+        self.functions = ()
+        self.global_variables = None
+        self.imports = None
+        if not all(key in file_info for key in FILE_KEYS):
+            # Entries for files that could not be analyzed at all are kept as given
+            self.name = file_info.get('name')
+            self.path = self.extension = self.size = self.parser = None
+            self.extras = file_info
+            return
+
+        self.name = file_info.pop('name')
+        self.path = file_info.pop('path')
+        self.extension = strings.intern(file_info.pop('extension'))
+        self.size = file_info.pop('size')
+        self.parser = strings.intern(file_info.pop('parser', None))
+
+        if self._is_structured(file_info):
+            module = file_info.pop('module')
+            self.module_docstring = module.get('docstring')
+            # Only modules with more than a docstring keep their own dict
+            if module.keys() != {'type', 'docstring'} or module['type'] != 'module':
+                self.module = module
+            self.classes = tuple(ClassRecord(strings, class_info)
+                                 for class_info in file_info.pop('classes'))
+            self.functions = tuple(FunctionRecord(strings, name, function_info)
+                                   for name, function_info in file_info.pop('functions').items())
+            # Flat (name, is_constant, type_hint) triples
+            global_variables = array('I')
+            for variable in file_info.pop('global_variables'):
+                global_variables.append(strings.intern(variable['name']))
+                global_variables.append(1 if variable['is_constant'] else 0)
+                global_variables.append(strings.intern(variable['type_hint']))
+            self.global_variables = global_variables or ()
+            self.imports = strings.intern_all(file_info.pop('imports'))
+
+        # Errors, skip reasons and data summaries are rare; they are kept as given
+        self.extras = file_info or None
+
+    @staticmethod
+    def _is_structured(file_info):
+        if not all(key in file_info for key in STRUCTURE_KEYS):
+            return False
+        classes = file_info['classes']
+        return (all(class_info.keys() == CLASS_KEYS for class_info in classes)
+                and all(method_info.keys() == METHOD_KEYS
+                        for class_info in classes
+                        for kind in METHOD_KINDS for method_info in class_info[kind])
+                and all(attribute.keys() == ATTRIBUTE_KEYS
+                        for class_info in classes for attribute in class_info['attributes'])
+                and all(sibling.keys() == SIBLING_KEYS
+                        for class_info in classes for sibling in class_info['siblings'])
+                and all(function_info.keys() == FUNCTION_KEYS
+                        for function_info in file_info['functions'].values())
+                and all(variable.keys() == VARIABLE_KEYS for variable in file_info['global_variables']))
+
+    def to_dict(self, strings):
+        if self.path is None:
+            return dict(self.extras)
+        file_info = {
+            'name': self.name,
+            'path': self.path,
+            'extension': strings.lookup(self.extension),
+            'size': self.size,
+        }
+        if self.parser:
+            file_info['parser'] = strings.lookup(self.parser)
+        if self.imports is not None:
+            if self.module is not None:
+                file_info['module'] = dict(self.module)
+            else:
+                file_info['module'] = {'type': 'module', 'docstring': self.module_docstring}
+            file_info['classes'] = [class_record.to_dict(strings) for class_record in self.classes]
+            file_info['functions'] = {
+                strings.lookup(function.name): function.to_dict(strings) for function in self.functions
+            }
+            file_info['global_variables'] = [
+                {'name': strings.lookup(self.global_variables[index]),
+                 'is_constant': bool(self.global_variables[index + 1]),
+                 'type_hint': strings.lookup(self.global_variables[index + 2])}
+                for index in range(0, len(self.global_variables), 3)
+            ]
+            file_info['imports'] = strings.lookup_all(self.imports)
+        if self.extras:
+            file_info.update(self.extras)
+        return file_info
+
+
+class DirectoryRecord:
+    __slots__ = ('path', 'name', 'subdirectories', 'files')
+
+    def __init__(self, strings, path, subdirectories):
+        self.path = path
+        self.name = strings.intern(os.path.basename(path))
+        self.subdirectories = strings.intern_all(subdirectories)
+        self.files = []
+
+
+class FileListView(Sequence):
+    """The files of one directory, each rebuilt as a dict on access"""
+
+    def __init__(self, model, directory):
+        self._model = model
+        self._directory = directory
+
+    def __len__(self):
+        return len(self._directory.files)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [file_record.to_dict(self._model.strings) for file_record in self._directory.files[index]]
+        return self._directory.files[index].to_dict(self._model.strings)
+
+
+class DirectoryView(Mapping):
+    """Dict view of a DirectoryRecord with the keys of the old directory dict"""
+
+    _keys = ('path', 'name', 'subdirectories', 'files')
+
+    def __init__(self, model, directory):
+        self._model = model
+        self._directory = directory
+
+    def __getitem__(self, key):
+        directory = self._directory
+        if key == 'path':
+            return directory.path
+        if key == 'name':
+            return self._model.strings.lookup(directory.name)
+        if key == 'subdirectories':
+            return self._model.strings.lookup_all(directory.subdirectories)
+        if key == 'files':
+            return FileListView(self._model, directory)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+class DirectoryListView(Sequence):
+    def __init__(self, model):
+        self._model = model
+
+    def __len__(self):
+        return len(self._model.directories)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [DirectoryView(self._model, directory) for directory in self._model.directories[index]]
+        return DirectoryView(self._model, self._model.directories[index])
+
+
+class RepositoryModel(Mapping):
+    """
+    Compact repository structure, readable as the dict
+    {'root': ..., 'directories': [...], 'files': []} built by the analyzer before.
+    """
+
+    _keys = ('root', 'directories', 'files')
+
+    def __init__(self, root):
+        self.root = root
+        self.strings = StringTable()
+        self.directories = []
+
+    def add_directory(self, path, subdirectories):
+        directory = DirectoryRecord(self.strings, path, subdirectories)
+        self.directories.append(directory)
+        return directory
+
+    def add_file(self, directory, file_info):
+        directory.files.append(FileRecord(self.strings, file_info))
+
+    def __getitem__(self, key):
+        if key == 'root':
+            return self.root
+        if key == 'directories':
+            return DirectoryListView(self)
+        if key == 'files':
+            return []
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def to_dict(self):
+        """Materialise the full nested dict, e.g. for JSON output"""
+        return {
+            'root': self.root,
+            'directories': [dict(directory, files=list(directory['files'])) for directory in self['directories']],
+            'files': []
+        }
@@ -0,0 +1,194 @@
+"""
+Directory walker for the repository analyzer.
+
+Walks a repository with os.scandir, in the same top-down order as os.walk,
+and prunes directories on a deny list or matched by the repository's
+.gitignore files before descending into them. Also provides the cheap
+size and binary checks applied to a file before it is parsed.
+"""
+import os
+import re
+
+
+# Directories that only ever hold tools' output: version control data,
+# installed packages, virtual environments and caches
+DEFAULT_DENY_DIRS = [
+    '.git', '.hg', '.svn', 'node_modules', 'bower_components', '__pycache__',
+    '.venv', 'venv', '.tox', '.mypy_cache', '.pytest_cache',
+]
+# Usual build output and editor directories. A project may keep source under
+# these names (a Go vendor tree, an 'out' package), so they are only pruned
+# on request; a repository that ignores its build output in .gitignore has
+# it pruned anyway.
+BUILD_DENY_DIRS = ['vendor', 'build', 'dist', 'target', 'out', '.idea', '.vscode']
+DEFAULT_MAX_FILE_SIZE = 1024 * 1024
+BINARY_SAMPLE_SIZE = 4096
+
+
+def _translate_gitignore_glob(pattern):
+    """Translate a gitignore glob into a regular expression body"""
+    regex = []
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith('**/', index):
+            regex.append('(?:.*/)?')
+            index += 3
+            continue
+        if pattern.startswith('/**', index) and index + 3 == len(pattern):
+            regex.append('(?:/.*)?')
+            index += 3
+            continue
+        if pattern.startswith('**', index):
+            regex.append('.*')
+            index += 2
+            continue
+        if char == '*':
+            regex.append('[^/]*')
+        elif char == '?':
+            regex.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', index + 2)
+            if end == -1:
+                regex.append(re.escape(char))
+            else:
+                char_class = pattern[index + 1:end]
+                if char_class.startswith('!'):
+                    char_class = '^' + char_class[1:]
+                regex.append(f"[{char_class}]")
+                index = end
+        elif char == '\\' and index + 1 < len(pattern):
+            index += 1
+            regex.append(re.escape(pattern[index]))
+        else:
+            regex.append(re.escape(char))
+        index += 1
+    return ''.join(regex)
+
+
+class GitignoreRule:
+    def __init__(self, regex, negated, directory_only):
+        self.regex = regex
+        self.negated = negated
+        self.directory_only = directory_only
+
+    @classmethod
+    def parse(cls, line):
+        """Return the rule for one .gitignore line, or None for blanks and comments"""
+        line = line.rstrip('\n').rstrip('\r')
+        if not line.endswith('\\ '):
+            line = line.rstrip(' ')
+        if not line or line.startswith('#'):
+            return None
+
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        elif line.startswith('\\!') or line.startswith('\\#'):
+            line = line[1:]
+
+        directory_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            return None
+
+        anchored = '/' in line
+        line = line.lstrip('/')
+        prefix = '^' if anchored else '^(?:.*/)?'
+        return cls(re.compile(prefix + _translate_gitignore_glob(line) + '$'), negated, directory_only)
+
+
+class GitignoreMatcher:
+    """Rules of the .gitignore files from the repository root down to one directory"""
+
+    def __init__(self, rule_sets=()):
+        self.rule_sets = tuple(rule_sets)
+
+    def extended(self, base_path, gitignore_path):
+        """Return a matcher that also applies the given .gitignore file"""
+        try:
+            with open(gitignore_path, 'r', encoding='utf-8', errors='replace') as f:
+                rules = [rule for rule in map(GitignoreRule.parse, f) if rule is not None]
+        except OSError:
+            return self
+        if not rules:
+            return self
+        return GitignoreMatcher(self.rule_sets + ((base_path, rules),))
+
+    def ignored(self, relative_path, is_directory):
+        """Whether a path relative to the repository root is ignored; the last matching rule wins"""
+        ignored = False
+        for base_path, rules in self.rule_sets:
+            if base_path:
+                if not relative_path.startswith(base_path + '/'):
+                    continue
+                path = relative_path[len(base_path) + 1:]
+            else:
+                path = relative_path
+            for rule in rules:
+                if rule.directory_only and not is_directory:
+                    continue
+                if rule.regex.match(path):
+                    ignored = not rule.negated
+        return ignored
+
+
+class RepositoryWalker:
+    def __init__(self, root, deny_dirs=None, use_gitignore=True):
+        """
+        Args:
+            root (str): Repository root
+            deny_dirs (list): Directory names never descended into,
+                DEFAULT_DENY_DIRS when not given; add BUILD_DENY_DIRS to
+                skip build output as well
+            use_gitignore (bool): Also skip paths matched by .gitignore files
+        """
+        self.root = root
+        self.deny_dirs = set(DEFAULT_DENY_DIRS if deny_dirs is None else deny_dirs)
+        self.use_gitignore = use_gitignore
+
+    def walk(self):
+        """Yield (dirpath, dirnames, filenames) like os.walk, without pruned paths"""
+        stack = [(self.root, '', GitignoreMatcher())]
+        while stack:
+            dir_path, relative_dir, matcher = stack.pop()
+            if self.use_gitignore:
+                matcher = matcher.extended(relative_dir, os.path.join(dir_path, '.gitignore'))
+
+            dirs, files, descend = [], [], []
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        relative_path = f"{relative_dir}/{entry.name}" if relative_dir else entry.name
+                        try:
+                            is_directory = entry.is_dir()
+                        except OSError:
+                            is_directory = False
+
+                        if is_directory:
+                            if entry.name in self.deny_dirs or matcher.ignored(relative_path, True):
+                                continue
+                            dirs.append(entry.name)
+                            if not entry.is_symlink():
+                                descend.append((entry.path, relative_path))
+                        elif not matcher.ignored(relative_path, False):
+                            files.append(entry.name)
+            except OSError as walk_error:
+                print(f"Error scanning directory {dir_path}: {walk_error}")
+                continue
+
+            yield dir_path, dirs, files
+            for child_path, child_relative in reversed(descend):
+                stack.append((child_path, child_relative, matcher))
+
+
+def looks_binary(sample):
+    """Classify a file as binary from its first bytes: NUL bytes or invalid UTF-8"""
+    if b'\x00' in sample:
+        return True
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as decode_error:
+        # A multi-byte character cut off by the end of the sample is still text
+        return decode_error.reason != 'unexpected end of data'
+    return False
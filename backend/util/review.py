@@ -1,28 +1,33 @@
 
-import litellm
-import yaml
 import os
 import re
-import javalang
 import json
 import xml.etree.ElementTree as ET
-import esprima
 import ast
-import pycparser
-import magic
 from collections import defaultdict
 from dotenv import load_dotenv
 from typing import List, Optional, Dict, Union
+from llm_cache import LLM_CACHE_MODES, LLMResponseCache, cached_completion, extract_compliance_sections
+from batch_processing import process_batch
+from chunking import chunk_settings, generate_chunked, part_note
+from llm_stream import progress_stream, stream_file
 
 class CodeReviewSystem:
-    def __init__(self):
+    def __init__(self, llm_cache_mode: Optional[str] = None):
         load_dotenv()
         self.claude_api_key = os.getenv("CLAUD_API_KEY")
         self.open_api_key = os.getenv("OPENAI_API_KEY")
+        self.api_keys = {"openai": self.open_api_key, "anthropic": self.claude_api_key}
+        self.llm_cache = LLMResponseCache(mode=llm_cache_mode)
+        # ProgressStream set by main() when --stream is given
+        self.progress = None
+        # Files over the chunk budget are processed part by part and the results merged
+        self.chunk_tokens, self.chunk_concurrency = chunk_settings()
         self.design_patterns_path = "/home/ishitaguleria/WORK/final_code_insights/backend/util/design_patterns.txt"
 
     def detect_file_type(self, file_path: str) -> Optional[str]:
         try:
+            import magic
             mime = magic.Magic(mime=True)
             return mime.from_file(file_path)
         except Exception as e:
@@ -41,109 +46,20 @@ class CodeReviewSystem:
             return content[:max_content_length]
         return content
 
-    def generate_litellm_response(self, prompt: str, model_name: str, provider: str) -> dict:
-        if provider.lower() == "openai":
-            return litellm.completion(
-                model=model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                # max_tokens=3000,
-                seed=42,
-                top_p=0.95,
-                api_key=self.open_api_key
-            )
-        elif provider.lower() == "anthropic":
-            return litellm.completion(
-                model=model_name,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0,
-                seed=42,
-                top_p=0.85,
-                api_key=self.claude_api_key
-            )
-        else:
-            raise ValueError(f"Unsupported provider: {provider}")
+    def generate_litellm_response(self, prompt: str, model_name: str, provider: str,
+                                  stream_as: Optional[str] = None, part: Optional[str] = None) -> dict:
+        return cached_completion(self.llm_cache, prompt, model_name, provider, self.api_keys,
+                                 self.progress, stream_as, part)
 
-    def ai_extract_compliance_sections(self, file_content: str, model_name: str, provider: str) -> Dict[str, str]:
-        prompt = f"""
-        You are an AI expert specializing in compliance document analysis and extracting structured guidelines. Your task is to analyze the provided compliance document and extract guidelines for specific categories, adhering to the following structured approach.
+    def merge_completion(self, model_name: str, provider: str, output: str):
+        """complete(prompt, part) for generate_chunked, merging partial results of output"""
+        def complete(prompt, part):
+            response = self.generate_litellm_response(prompt, model_name, provider, stream_as=output, part=part)
+            return response['choices'][0]['message']['content']
+        return complete
 
-        ### **Task Objective:**
-        - Extract and structure guidelines based on the input compliance document.
-        - For any section not explicitly covered, provide **default guidelines based on industry standards**.
-        - Format your response using the defined structure for clarity and organization.
-        
-        
-        Input Document:
-        The document content is sanitized and provided for analysis. Use the below provided relevant content to extract guidelines .
-        {self.sanitize_input_content(file_content)}
-        
-        Please analyze the document and extract guidelines for the following sections. Format your response using the exact structure below:
-        
-        ##review##
-        [- Include all guidelines related to:
-            - Code review practices
-            - Quality assurance standards
-            - Peer review protocols]
-        ##
-        
-        ##documentation##
-        [- Cover standards for:
-            - Documentation requirements
-            - Format and structure of documentation
-            - Maintenance of comprehensive records]
-        ##
-        
-        ##comments##
-        [- Extract details related to:
-            - Inline code comments
-            - Standards for descriptive comments
-            - Best practices for maintaining clarity and conciseness]
-        ##
-        
-        ##knowledge_graph##
-        [- Provide extracted or default guidelines on:
-            - Knowledge graph structure and hierarchy
-            - Representation of relationships and nodes
-            - Compliance with contextual standards]
-        ##
-        
-        If any section is not explicitly covered in the provided input document, provide sensible default guidelines based on industry standards to ensure completeness.
-        """
-        
-        try:
-            response = self.generate_litellm_response(prompt, model_name, provider)
-            extracted_content = response['choices'][0]['message']['content']
-            
-            sections = {
-                'review': 'Default review guidelines.',
-                'documentation': 'Default documentation guidelines.',
-                'comments': 'Default comments guidelines.',
-                'knowledge_graph': 'Default knowledge graph guidelines.'
-            }
-            
-            patterns = {
-                'review': r'##review##\s*(.*?)\s*##',
-                'documentation': r'##documentation##\s*(.*?)\s*##',
-                'comments': r'##comments##\s*(.*?)\s*##',
-                'knowledge_graph': r'##knowledge_graph##\s*(.*?)\s*##'
-            }
-            
-            for section, pattern in patterns.items():
-                match = re.search(pattern, extracted_content, re.DOTALL)
-                if match and match.group(1).strip():
-                    sections[section] = match.group(1).strip()
-            
-            return sections
-            
-        except Exception as e:
-            print(f"Error extracting compliance sections: {e}")
-            return {
-                'review': 'Error occurred. Using default review guidelines.',
-                'documentation': 'Error occurred. Using default documentation guidelines.',
-                'comments': 'Error occurred. Using default comments guidelines.',
-                'knowledge_graph': 'Error occurred. Using default knowledge graph guidelines.'
-            }
+    def ai_extract_compliance_sections(self, file_content: str, model_name: str, provider: str) -> Dict[str, str]:
+        return extract_compliance_sections(self.llm_cache, file_content, model_name, provider, self.api_keys)
 
     def load_compliance_file(self, compliance_file_path: Optional[str], model_name: str, provider: str) -> Dict[str, str]:
         default_sections = {
@@ -193,7 +109,7 @@ class CodeReviewSystem:
 
 
     def generate_review(self, file_content: str, file_type: str, compliance_sections: Dict[str, str], 
-                       additional_content: str, model_name: str, provider: str) -> str:
+                       additional_content: str, model_name: str, provider: str, part: Optional[str] = None) -> str:
         try:
             if file_type == "source":
                 with open(self.design_patterns_path, "r") as patterns_file:
@@ -337,7 +253,8 @@ class CodeReviewSystem:
        - Ensure that the configuration file is tested for correctness, compatibility, and real-world use cases.
                 """
 
-            response = self.generate_litellm_response(prompt, model_name, provider)
+            response = self.generate_litellm_response(part_note(part) + prompt, model_name, provider,
+                                                      stream_as="review", part=part)
             return response['choices'][0]['message']['content']
         except Exception as e:
             print(f"Error in review generation: {e}")
@@ -374,6 +291,7 @@ class CodeReviewSystem:
             file_content = file.read()
             
         file_type = self.determine_file_type(file_path)
+        file_extension = os.path.splitext(file_path)[1].lower()
         compliance_sections = self.load_compliance_file(compliance_file_path, model_name, provider)
         additional_content = self.load_additional_files(additional_files)
 
@@ -381,22 +299,23 @@ class CodeReviewSystem:
         
         # Generate requested content types
         if "review" in output_types:
-            results["review"] = self.generate_review(
-                file_content, file_type, compliance_sections, additional_content, 
-                model_name, provider
+            # A file over the chunk budget is reviewed in parts and the reviews merged
+            results["review"] = generate_chunked(
+                "review", file_content, file_extension, file_type,
+                lambda text, part: self.generate_review(
+                    text, file_type, compliance_sections, additional_content,
+                    model_name, provider, part
+                ),
+                self.merge_completion(model_name, provider, "review"),
+                self.chunk_tokens, self.chunk_concurrency
             )
             
        
 
-        # Save results to files
-        for output_type, content in results.items():
-            output_file = f"{output_type}_file.txt"
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(f"Generated {output_type.capitalize()}:\n")
-                f.write(content)
-                print(f"Generated {output_type} saved to {output_file}")
-                
-        print("Analysis complete. Results saved successfully.")
+        # Results go to --output through main(); files are processed concurrently
+        # in a working directory shared by every job of a worker, so there is
+        # no per-output side file to write
+        print("Analysis complete.")
         return results
 
 import json
@@ -427,39 +346,50 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--input', required=True, help='Input JSON file path')
     parser.add_argument('--output', required=True, help='Output JSON file path')
+    parser.add_argument('--llm-cache', choices=LLM_CACHE_MODES, default=None,
+                        help='LLM response cache: on, refresh or off (default: LLM_CACHE or on)')
+    parser.add_argument('--max-workers', type=int, default=None,
+                        help='Files processed at once (default: BATCH_MAX_WORKERS or 4)')
+    parser.add_argument('--stream', default=None,
+                        help='Append NDJSON progress events with the generated text to this file, '
+                             'or write them to stdout with -')
     args = parser.parse_args()
 
-    try:
-        # Initialize review system
-        reviewer = CodeReviewSystem()
+    with progress_stream(args.stream) as progress:
+        try:
+            # Initialize review system
+            reviewer = CodeReviewSystem(llm_cache_mode=args.llm_cache)
+            reviewer.progress = progress
         
-        # Process input data
-        input_data = process_input_data(args.input)
+            # Process input data
+            input_data = process_input_data(args.input)
         
-        # Extract file paths and process each file
-        results = {}
-        for file_data in input_data['files_data']:
-            file_results = reviewer.process_code(
-                output_types=input_data['output_types'],
-                file_path=file_data['path'],
-                provider=input_data['provider'],
-                model_name=input_data['model_name'],
-                compliance_file_path=input_data.get('compliance_file', {}).get('path'),
-                additional_files=[f['path'] for f in input_data.get('additional_files', [])]
-            )
-            results[file_data['name']] = file_results
+            def process(file_data):
+                # Progress events name the file as the results do
+                stream_file.set(file_data['name'])
+                return reviewer.process_code(
+                    output_types=input_data['output_types'],
+                    file_path=file_data['path'],
+                    provider=input_data['provider'],
+                    model_name=input_data['model_name'],
+                    compliance_file_path=input_data.get('compliance_file', {}).get('path'),
+                    additional_files=[f['path'] for f in input_data.get('additional_files', [])]
+                )
+
+            # Process the files concurrently; a file that fails gets its own error entry
+            results = process_batch(input_data['files_data'], process, max_workers=args.max_workers)
             
-        # Save results
-        save_output(args.output, results)
+            # Save results
+            save_output(args.output, results)
         
-    except Exception as e:
-        error_response = {
-            'status': 'error',
-            'message': str(e)
-        }
-        with open(args.output, 'w') as f:
-            json.dump(error_response, f)
-        sys.exit(1)
+        except Exception as e:
+            error_response = {
+                'status': 'error',
+                'message': str(e)
+            }
+            with open(args.output, 'w') as f:
+                json.dump(error_response, f)
+            sys.exit(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
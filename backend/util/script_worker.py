@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Persistent worker for the util scripts.
+
+Starting a fresh python3 for every API request pays for the interpreter
+start, for importing litellm and magic, and for load_dotenv, before any
+work is done. The worker imports analyze_files, review, documentation,
+comments and generate_guidelines once, together with litellm and magic that
+the scripts load on first use, and then runs jobs against those warm
+modules, so litellm's clients and connection pools also survive between jobs.
+
+Jobs and results are JSON objects, each sent as one frame: a 4-byte
+big-endian payload length followed by the UTF-8 JSON payload. A job names
+the script and gives the command line and stdin it would have been started
+with, so every script keeps its --input/--output (or stdin/stdout) interface
+unchanged and can still be run as a separate process:
+
+    {"id": 1, "script": "review", "args": ["--input", "in.json", "--output", "out.json"]}
+    {"id": 2, "script": "generate_guidelines", "stdin": "{...}"}
+
+The result carries the exit code and whatever the script printed:
+
+    {"id": 1, "exit_code": 0, "stdout": "...", "stderr": "..."}
+
+By default the worker reads jobs from stdin and writes results to stdout
+until stdin is closed; with --socket it listens on a Unix socket instead,
+accepting any number of connections. Jobs run one at a time, since the
+scripts read sys.argv and print to sys.stdout; run several workers to
+process jobs in parallel.
+
+    python script_worker.py
+    python script_worker.py --socket /tmp/codeinsights-worker.sock
+"""
+import io
+import os
+import sys
+import json
+import signal
+import struct
+import argparse
+import importlib
+import threading
+import traceback
+import socketserver
+from contextlib import redirect_stdout, redirect_stderr
+
+
+WORKER_SCRIPTS = ('analyze_files', 'review', 'documentation', 'comments', 'generate_guidelines')
+# Libraries the scripts import on first use; the worker loads them up front
+WARM_MODULES = ('litellm', 'magic')
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = 512 * 1024 * 1024
+
+
+class FrameError(Exception):
+    """Raised when the peer sends something that is not a valid frame"""
+
+
+def read_exactly(stream, size):
+    """Read size bytes from stream; None on a clean end of stream before the first byte"""
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            if remaining == size:
+                return None
+            raise FrameError(f"Stream ended {remaining} bytes short of a {size} byte read")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_frame(stream):
+    """Read one length-delimited JSON frame; None when the stream is closed"""
+    header = read_exactly(stream, FRAME_HEADER.size)
+    if header is None:
+        return None
+    length, = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise FrameError(f"Frame of {length} bytes exceeds the {MAX_FRAME_BYTES} byte limit")
+    payload = read_exactly(stream, length) if length else b''
+    if payload is None:
+        raise FrameError("Stream ended inside a frame")
+    return payload
+
+
+def write_frame(stream, message):
+    payload = json.dumps(message).encode('utf-8')
+    stream.write(FRAME_HEADER.pack(len(payload)) + payload)
+    stream.flush()
+
+
+def exit_code_of(exit_request):
+    """Exit status the interpreter would report for a SystemExit"""
+    code = exit_request.code
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+class ScriptWorker:
+    """Runs jobs against util scripts that stay imported between jobs"""
+
+    def __init__(self, scripts=WORKER_SCRIPTS):
+        self.scripts = tuple(scripts)
+        self.modules = {}
+        self.jobs_run = 0
+        self._lock = threading.Lock()
+
+    def load(self, script):
+        if script not in self.scripts:
+            raise ValueError(f"Unknown script {script!r}; expected one of {', '.join(self.scripts)}")
+        module = self.modules.get(script)
+        if module is None:
+            module = self.modules[script] = importlib.import_module(script)
+        return module
+
+    def preload(self):
+        """Import every script and WARM_MODULES up front; failures are reported and retried on first use"""
+        for script in self.scripts:
+            try:
+                self.load(script)
+            except Exception as e:
+                print(f"Could not preload {script}: {e}", file=sys.stderr)
+        for module in WARM_MODULES:
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                print(f"Could not preload {module}: {e}", file=sys.stderr)
+
+    def run_job(self, job):
+        """
+        Run one job as if the script had been started with the job's
+        arguments and stdin, and return the result message.
+        """
+        job_id = job.get('id')
+        args = job.get('args') or []
+        if not isinstance(args, list) or not all(isinstance(arg, str) for arg in args):
+            return {'id': job_id, 'exit_code': 2, 'stdout': '', 'stderr': "Error: args must be a list of strings\n"}
+
+        with self._lock:
+            try:
+                module = self.load(job.get('script'))
+            except Exception as e:
+                return {'id': job_id, 'exit_code': 2, 'stdout': '', 'stderr': f"Error: {e}\n"}
+
+            stdout, stderr = io.StringIO(), io.StringIO()
+            saved_argv, saved_stdin, saved_cwd = sys.argv, sys.stdin, os.getcwd()
+            exit_code = 0
+            try:
+                sys.argv = [module.__file__] + args
+                sys.stdin = io.StringIO(job.get('stdin') or '')
+                with redirect_stdout(stdout), redirect_stderr(stderr):
+                    try:
+                        if job.get('cwd'):
+                            os.chdir(job['cwd'])
+                        module.main()
+                    except SystemExit as exit_request:
+                        exit_code = exit_code_of(exit_request)
+                    except Exception:
+                        traceback.print_exc()
+                        exit_code = 1
+            finally:
+                sys.argv, sys.stdin = saved_argv, saved_stdin
+                os.chdir(saved_cwd)
+                self.jobs_run += 1
+
+        return {'id': job_id, 'exit_code': exit_code, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+    def handle_frame(self, payload):
+        try:
+            job = json.loads(payload)
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            return {'id': None, 'exit_code': 2, 'stdout': '', 'stderr': f"Error: Invalid job JSON: {e}\n"}
+        if not isinstance(job, dict):
+            return {'id': None, 'exit_code': 2, 'stdout': '', 'stderr': "Error: A job must be a JSON object\n"}
+        return self.run_job(job)
+
+    def serve(self, reader, writer):
+        """Answer jobs from reader on writer until reader is closed"""
+        while True:
+            payload = read_frame(reader)
+            if payload is None:
+                return
+            write_frame(writer, self.handle_frame(payload))
+
+
+def serve_stdio(worker):
+    # Results own the real stdout; anything else written to file descriptor 1,
+    # including output of C extensions, goes to stderr instead
+    sys.stdout.flush()
+    protocol_out = os.fdopen(os.dup(sys.stdout.fileno()), 'wb')
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    try:
+        worker.serve(sys.stdin.buffer, protocol_out)
+    finally:
+        protocol_out.close()
+
+
+class JobRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            self.server.worker.serve(self.rfile, self.wfile)
+        except (FrameError, ConnectionError) as e:
+            print(f"Closing worker connection: {e}", file=sys.stderr)
+
+
+class ScriptWorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, worker):
+        self.worker = worker
+        super().__init__(socket_path, JobRequestHandler)
+
+
+def serve_socket(worker, socket_path):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with ScriptWorkerServer(socket_path, worker) as server:
+        print(f"Script worker listening on {socket_path}", file=sys.stderr)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os.unlink(socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run util script jobs in a persistent worker')
+    parser.add_argument('--socket', default=None, help='Listen on this Unix socket instead of stdin/stdout')
+    parser.add_argument('--scripts', default=','.join(WORKER_SCRIPTS),
+                        help='Comma separated scripts the worker accepts jobs for')
+    parser.add_argument('--no-preload', action='store_true', help='Import each script on its first job')
+    args = parser.parse_args()
+
+    # The scripts are imported by module name from this directory
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+
+    worker = ScriptWorker([script.strip() for script in args.scripts.split(',') if script.strip()])
+    if not args.no_preload:
+        with redirect_stdout(sys.stderr):
+            worker.preload()
+
+    try:
+        if args.socket:
+            serve_socket(worker, args.socket)
+        else:
+            serve_stdio(worker)
+    except FrameError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
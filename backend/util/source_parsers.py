@@ -0,0 +1,432 @@
+"""
+Parser backends for the repository analyzer, registered by file extension.
+
+Source backends turn the text of one file into the structure produced by the
+Python parser (module, classes, functions, global_variables, imports), so the
+knowledge graph build handles every language the same way. Data backends
+(JSON, XML) return a short summary instead. A backend whose library is not
+installed is treated as missing, and files it would handle are never read.
+"""
+import importlib.util
+import json
+import re
+import signal
+import threading
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+
+
+class ParserTimeoutError(TimeoutError):
+    """Raised when a backend runs past its per-file time budget"""
+
+
+class ParserBackend:
+    def __init__(self, name, extensions, parse, requires=None, file_label=None):
+        """
+        Args:
+            name (str): Backend name, recorded on every file it parses
+            extensions (list): File extensions handled by the backend
+            parse (callable): Takes the file content and returns a dict
+            requires (str): Module the backend depends on, if any
+            file_label (str): Graph label for the file node. Backends without
+                one only summarise files and add nothing to the graph.
+        """
+        self.name = name
+        self.extensions = [extension.lower() for extension in extensions]
+        self.parse = parse
+        self.requires = requires
+        self.file_label = file_label
+        self._available = None
+
+    @property
+    def available(self):
+        if self._available is None:
+            self._available = self.requires is None or importlib.util.find_spec(self.requires) is not None
+        return self._available
+
+
+class ParserRegistry:
+    def __init__(self):
+        self._backends = {}
+
+    def register(self, backend):
+        for extension in backend.extensions:
+            self._backends[extension] = backend
+        return backend
+
+    def backend_for(self, extension):
+        """Return the usable backend for an extension, or None"""
+        backend = self._backends.get(extension.lower())
+        if backend is None or not backend.available:
+            return None
+        return backend
+
+    def file_labels(self):
+        """Graph labels of all source backends, whether or not they are installed"""
+        return list(dict.fromkeys(backend.file_label for backend in self._backends.values()
+                                  if backend.file_label))
+
+    def parse(self, backend, content, time_budget=None):
+        """
+        Run a backend on file content within a time budget in seconds.
+
+        The budget is enforced with SIGALRM, so it applies in the main thread
+        of the scanning process or worker and is skipped elsewhere.
+        """
+        if (not time_budget or not hasattr(signal, 'setitimer')
+                or threading.current_thread() is not threading.main_thread()):
+            return backend.parse(content)
+
+        def on_timeout(signum, frame):
+            raise ParserTimeoutError(f"{backend.name} parser exceeded its {time_budget}s budget")
+
+        previous_handler = signal.signal(signal.SIGALRM, on_timeout)
+        signal.setitimer(signal.ITIMER_REAL, time_budget)
+        try:
+            return backend.parse(content)
+        finally:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+
+
+PARSER_REGISTRY = ParserRegistry()
+
+
+def register_parser(name, extensions, requires=None, file_label=None):
+    """Decorator registering a parse function as a backend"""
+    def decorator(parse):
+        PARSER_REGISTRY.register(ParserBackend(name, extensions, parse, requires, file_label))
+        return parse
+    return decorator
+
+
+def attach_siblings(classes):
+    """Attach siblings (classes sharing a base) using a base -> classes index"""
+    classes_by_base = defaultdict(list)
+    class_order = {}
+    for order, class_info in enumerate(classes):
+        class_order[class_info['name']] = order
+        for base in dict.fromkeys(class_info['bases']):
+            classes_by_base[base].append(class_info['name'])
+
+    for class_info in classes:
+        common_bases = defaultdict(list)
+        for base in dict.fromkeys(class_info['bases']):
+            for other_class in classes_by_base[base]:
+                if other_class != class_info['name']:
+                    common_bases[other_class].append(base)
+
+        class_info['siblings'] = [
+            {'name': other_class, 'common_bases': common_bases[other_class]}
+            for other_class in sorted(common_bases, key=class_order.__getitem__)
+        ]
+
+    return classes
+
+
+def _new_class_info(name, bases, docstring=None, decorators=None):
+    return {
+        'name': name,
+        'bases': bases,
+        'methods': [],
+        'attributes': [],
+        'class_methods': [],
+        'static_methods': [],
+        'properties': [],
+        'docstring': docstring,
+        'decorators': decorators or [],
+    }
+
+
+def _clean_doc_comment(comment):
+    if not comment:
+        return None
+    lines = comment.strip().removeprefix('/**').removesuffix('*/').splitlines()
+    return '\n'.join(line.strip().lstrip('*').strip() for line in lines).strip() or None
+
+
+def _java_type_name(reference):
+    parts = []
+    while reference is not None:
+        parts.append(reference.name)
+        reference = getattr(reference, 'sub_type', None)
+    return '.'.join(parts)
+
+
+@register_parser('javalang', ['.java'], requires='javalang', file_label='JavaFile')
+def parse_java_source(content):
+    import javalang
+
+    tree = javalang.parse.parse(content)
+    imports = [f"{imp.path}.*" if imp.wildcard else imp.path for imp in tree.imports]
+
+    classes = []
+    for _, type_decl in tree.filter(javalang.tree.TypeDeclaration):
+        extends = getattr(type_decl, 'extends', None) or []
+        if not isinstance(extends, list):
+            extends = [extends]
+        bases = [_java_type_name(base) for base in extends + (getattr(type_decl, 'implements', None) or [])]
+        class_info = _new_class_info(
+            type_decl.name, bases,
+            docstring=_clean_doc_comment(type_decl.documentation),
+            decorators=[annotation.name for annotation in type_decl.annotations]
+        )
+
+        for method in type_decl.methods:
+            decorators = [annotation.name for annotation in method.annotations]
+            # Mapped to the Python decorator so abstract methods are flagged alike
+            if 'abstract' in method.modifiers:
+                decorators.append('abstractmethod')
+            method_info = {
+                'name': method.name,
+                'parameters': [parameter.name for parameter in method.parameters],
+                'docstring': _clean_doc_comment(method.documentation),
+                'decorators': decorators,
+                'returns': method.return_type.name if method.return_type else None,
+                'is_property': False,
+            }
+            member_key = 'static_methods' if 'static' in method.modifiers else 'methods'
+            class_info[member_key].append(method_info)
+
+        for field in type_decl.fields:
+            for declarator in field.declarators:
+                class_info['attributes'].append({
+                    'name': declarator.name,
+                    'type_hint': field.type.name
+                })
+        classes.append(class_info)
+
+    return {
+        'module': {
+            'type': 'module',
+            'docstring': None,
+            'package': tree.package.name if tree.package else None
+        },
+        'classes': attach_siblings(classes),
+        'functions': {},
+        'global_variables': [],
+        'imports': imports
+    }
+
+
+def _js_expression_name(node):
+    if node is None:
+        return None
+    if node.type == 'Identifier':
+        return node.name
+    if node.type == 'MemberExpression' and not node.computed:
+        object_name = _js_expression_name(node.object)
+        return f"{object_name}.{node.property.name}" if object_name else None
+    return None
+
+
+def _js_parameter_names(params):
+    names = []
+    for param in params:
+        if param.type == 'AssignmentPattern':
+            param = param.left
+        elif param.type == 'RestElement':
+            param = param.argument
+        if param.type == 'Identifier':
+            names.append(param.name)
+    return names
+
+
+@register_parser('esprima', ['.js', '.jsx', '.mjs', '.cjs'], requires='esprima', file_label='JavaScriptFile')
+def parse_javascript_source(content):
+    import esprima
+
+    class_nodes = []
+    imports = []
+
+    def collect(node, metadata):
+        if node.type in ('ClassDeclaration', 'ClassExpression') and node.id is not None:
+            class_nodes.append(node)
+        elif node.type == 'ImportDeclaration':
+            imports.append(node.source.value)
+        elif (node.type == 'CallExpression' and node.callee.type == 'Identifier'
+              and node.callee.name == 'require' and len(node.arguments) == 1
+              and node.arguments[0].type == 'Literal' and isinstance(node.arguments[0].value, str)):
+            imports.append(node.arguments[0].value)
+
+    try:
+        program = esprima.parseModule(content, {'jsx': True}, collect)
+    except esprima.Error:
+        # Sloppy-mode scripts are not valid modules; parse them as scripts
+        class_nodes.clear()
+        imports.clear()
+        program = esprima.parseScript(content, {'jsx': True}, collect)
+
+    classes = []
+    for class_node in class_nodes:
+        super_class = _js_expression_name(class_node.superClass)
+        class_info = _new_class_info(class_node.id.name, [super_class] if super_class else [])
+        for member in class_node.body.body:
+            if member.type != 'MethodDefinition' or member.computed or member.key.type != 'Identifier':
+                continue
+            method_info = {
+                'name': member.key.name,
+                'parameters': _js_parameter_names(member.value.params),
+                'docstring': None,
+                'decorators': [],
+                'returns': None,
+                'is_property': member.kind in ('get', 'set'),
+            }
+            if member.kind in ('get', 'set'):
+                class_info['properties'].append(method_info)
+            elif member.static:
+                class_info['static_methods'].append(method_info)
+            else:
+                class_info['methods'].append(method_info)
+        classes.append(class_info)
+
+    functions = {}
+    global_variables = []
+    for statement in program.body:
+        if statement.type in ('ExportNamedDeclaration', 'ExportDefaultDeclaration') and statement.declaration:
+            statement = statement.declaration
+        if statement.type == 'FunctionDeclaration' and statement.id is not None:
+            functions[statement.id.name] = {
+                'parameters': _js_parameter_names(statement.params),
+                'docstring': None,
+                'decorators': [],
+                'returns': None
+            }
+        elif statement.type == 'VariableDeclaration':
+            for declarator in statement.declarations:
+                if declarator.id.type != 'Identifier':
+                    continue
+                init = declarator.init
+                if init is not None and init.type in ('FunctionExpression', 'ArrowFunctionExpression'):
+                    functions[declarator.id.name] = {
+                        'parameters': _js_parameter_names(init.params),
+                        'docstring': None,
+                        'decorators': [],
+                        'returns': None
+                    }
+                else:
+                    global_variables.append({
+                        'name': declarator.id.name,
+                        'is_constant': statement.kind == 'const',
+                        'type_hint': None
+                    })
+
+    return {
+        'module': {
+            'type': 'module',
+            'docstring': None
+        },
+        'classes': attach_siblings(classes),
+        'functions': functions,
+        'global_variables': global_variables,
+        'imports': imports
+    }
+
+
+_C_COMMENT = re.compile(r'/\*.*?\*/|//[^\n]*', re.DOTALL)
+_C_INCLUDE = re.compile(r'^\s*#\s*include\s*[<"]([^>"]+)[>"]', re.MULTILINE)
+_C_DIRECTIVE = re.compile(r'^\s*#.*?(?<!\\)$', re.MULTILINE | re.DOTALL)
+# Typedefs normally pulled in by system headers, which are not preprocessed here
+_C_STANDARD_TYPES = {
+    'size_t': 'unsigned long', 'ssize_t': 'long', 'ptrdiff_t': 'long',
+    'intptr_t': 'long', 'uintptr_t': 'unsigned long', 'off_t': 'long',
+    'int8_t': 'signed char', 'int16_t': 'short', 'int32_t': 'int', 'int64_t': 'long long',
+    'uint8_t': 'unsigned char', 'uint16_t': 'unsigned short', 'uint32_t': 'unsigned int',
+    'uint64_t': 'unsigned long long', 'bool': '_Bool', 'FILE': 'struct _FILE',
+}
+
+
+def _c_type_name(node):
+    from pycparser import c_ast
+
+    while isinstance(node, (c_ast.PtrDecl, c_ast.ArrayDecl, c_ast.TypeDecl)):
+        node = node.type
+    if isinstance(node, c_ast.IdentifierType):
+        return ' '.join(node.names)
+    if isinstance(node, (c_ast.Struct, c_ast.Union, c_ast.Enum)):
+        return node.name
+    return None
+
+
+@register_parser('pycparser', ['.c', '.h'], requires='pycparser', file_label='CFile')
+def parse_c_source(content):
+    from pycparser import c_ast, c_parser
+
+    imports = _C_INCLUDE.findall(content)
+    source = _C_DIRECTIVE.sub('', _C_COMMENT.sub(' ', content))
+    prelude = ''.join(
+        f"typedef {definition} {name};\n" for name, definition in _C_STANDARD_TYPES.items()
+        if not re.search(rf'\btypedef\b[^;]*\b{name}\s*;', source)
+    )
+    tree = c_parser.CParser().parse(prelude + source)
+
+    classes = []
+    functions = {}
+    global_variables = []
+    for item in tree.ext[prelude.count('typedef '):]:
+        if isinstance(item, c_ast.FuncDef):
+            declaration = item.decl.type
+            parameters = []
+            if declaration.args is not None:
+                parameters = [param.name for param in declaration.args.params
+                              if getattr(param, 'name', None)]
+            functions[item.decl.name] = {
+                'parameters': parameters,
+                'docstring': None,
+                'decorators': [],
+                'returns': _c_type_name(declaration.type)
+            }
+            continue
+
+        declared_type = item.type
+        struct = declared_type.type if isinstance(declared_type, c_ast.TypeDecl) else declared_type
+        if isinstance(struct, (c_ast.Struct, c_ast.Union)) and struct.decls is not None:
+            class_name = struct.name or getattr(item, 'name', None)
+            if class_name:
+                class_info = _new_class_info(class_name, [])
+                class_info['attributes'] = [
+                    {'name': member.name, 'type_hint': _c_type_name(member.type)}
+                    for member in struct.decls if member.name
+                ]
+                classes.append(class_info)
+        elif (isinstance(item, c_ast.Decl) and item.name
+              and not isinstance(declared_type, c_ast.FuncDecl)
+              and 'extern' not in item.storage):
+            global_variables.append({
+                'name': item.name,
+                'is_constant': 'const' in item.quals,
+                'type_hint': _c_type_name(declared_type)
+            })
+
+    return {
+        'module': {
+            'type': 'module',
+            'docstring': None
+        },
+        'classes': attach_siblings(classes),
+        'functions': functions,
+        'global_variables': global_variables,
+        'imports': imports
+    }
+
+
+@register_parser('json', ['.json'])
+def parse_json_source(content):
+    data = json.loads(content)
+    summary = {'type': type(data).__name__}
+    if isinstance(data, dict):
+        summary['keys'] = list(data)[:50]
+    elif isinstance(data, list):
+        summary['length'] = len(data)
+    return {'data_summary': summary}
+
+
+@register_parser('xml', ['.xml'])
+def parse_xml_source(content):
+    root = ET.fromstring(content)
+    return {
+        'data_summary': {
+            'root_tag': root.tag,
+            'child_tags': list(dict.fromkeys(child.tag for child in root))[:50]
+        }
+    }
@@ -0,0 +1,59 @@
+import time
+import threading
+
+import pytest
+
+from batch_processing import process_batch, resolve_max_workers
+
+
+FILES = [{'name': f"file_{index}.py"} for index in range(6)]
+
+
+@pytest.mark.parametrize('max_workers', [1, 3])
+def test_results_are_in_input_order(max_workers):
+    def process(file_data):
+        # Earlier files finish last
+        time.sleep(0.01 * (len(FILES) - int(file_data['name'][5])))
+        return file_data['name'].upper()
+
+    results = process_batch(FILES, process, max_workers=max_workers)
+    assert list(results) == [file_data['name'] for file_data in FILES]
+    assert list(results.values()) == [file_data['name'].upper() for file_data in FILES]
+
+
+def test_a_failing_file_does_not_affect_the_others():
+    def process(file_data):
+        if file_data['name'] == 'file_2.py':
+            raise RuntimeError("provider unavailable")
+        return "ok"
+
+    results = process_batch(FILES, process, max_workers=4)
+    assert results['file_2.py'] == {"status": "error", "message": "provider unavailable"}
+    assert all(result == "ok" for name, result in results.items() if name != 'file_2.py')
+
+
+def test_at_most_max_workers_files_at_once():
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def process(file_data):
+        with lock:
+            running.append(file_data['name'])
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.remove(file_data['name'])
+
+    process_batch(FILES, process, max_workers=2)
+    assert max(peak) == 2
+
+
+def test_empty_batch():
+    assert process_batch([], lambda file_data: pytest.fail("nothing to process")) == {}
+
+
+def test_max_workers_from_environment(monkeypatch):
+    monkeypatch.setenv('BATCH_MAX_WORKERS', '7')
+    assert resolve_max_workers() == 7
+    assert resolve_max_workers(0) == 1
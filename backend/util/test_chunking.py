@@ -0,0 +1,203 @@
+import io
+import json
+import asyncio
+import contextvars
+
+import pytest
+
+from llm_stream import ProgressStream, stream_file
+from chunking import (CHARS_PER_TOKEN, agenerate_chunked, generate_chunked, join_sections, merge_groups,
+                      split_source)
+
+
+def python_module(functions=30, body_lines=8):
+    parts = ["import os\n", "\n"]
+    for index in range(functions):
+        parts.append(f"def function_{index}(value):\n")
+        parts.extend(f"    value = value + {line}\n" for line in range(body_lines))
+        parts.append("    return value\n\n\n")
+    return ''.join(parts)
+
+
+def python_class(methods=30, body_lines=8):
+    parts = ["class Service:\n", "    \"\"\"A class too large for one chunk\"\"\"\n\n"]
+    for index in range(methods):
+        parts.append(f"    def method_{index}(self, value):\n")
+        parts.extend(f"        value = value * {line}\n" for line in range(body_lines))
+        parts.append("        return value\n\n")
+    return ''.join(parts)
+
+
+def javascript_module(functions=30, body_lines=8):
+    parts = []
+    for index in range(functions):
+        parts.append(f"function handler{index}(request) {{\n")
+        parts.extend(f"  const value{line} = request.body['{line}'];\n" for line in range(body_lines))
+        parts.append("  return request;\n}\n\n")
+    return ''.join(parts)
+
+
+def assert_lossless_within_budget(chunks, content, max_tokens):
+    assert ''.join(chunk.text for chunk in chunks) == content
+    assert all(len(chunk.text) <= max_tokens * CHARS_PER_TOKEN for chunk in chunks)
+    assert chunks[0].start_line == 1
+    for previous, following in zip(chunks, chunks[1:]):
+        # A cut line appears in consecutive chunks under the same number
+        assert following.start_line in (previous.end_line, previous.end_line + 1)
+
+
+def test_content_that_fits_is_one_chunk():
+    content = "def f():\n    return 1\n"
+    chunks = split_source(content, '.py', 1000)
+    assert len(chunks) == 1
+    assert chunks[0] == (1, 3, content)
+
+
+@pytest.mark.parametrize('max_tokens', [80, 120, 400])
+def test_python_split_is_lossless_and_ends_between_functions(max_tokens):
+    content = python_module()
+    chunks = split_source(content, '.py', max_tokens)
+    assert len(chunks) > 1
+    assert_lossless_within_budget(chunks, content, max_tokens)
+    assert all(chunk.text.startswith('def ') for chunk in chunks[1:])
+
+
+def test_oversized_python_class_is_split_between_methods():
+    content = python_class()
+    chunks = split_source(content, '.py', 100)
+    assert len(chunks) > 1
+    assert_lossless_within_budget(chunks, content, 100)
+    assert all(chunk.text.startswith('    def ') for chunk in chunks[1:])
+
+
+def test_invalid_python_falls_back_to_paragraphs():
+    content = python_module().replace('def function_3(value):', 'def function_3(value')
+    chunks = split_source(content, '.py', 80)
+    assert_lossless_within_budget(chunks, content, 80)
+
+
+def test_brace_language_split_ends_between_functions():
+    content = javascript_module()
+    chunks = split_source(content, '.js', 120)
+    assert len(chunks) > 1
+    assert_lossless_within_budget(chunks, content, 120)
+    assert all(chunk.text.startswith('function ') for chunk in chunks[1:])
+
+
+def test_line_longer_than_budget_is_the_only_cut():
+    long_line = "x = '" + 'a' * 500 + "'\n"
+    content = "y = 1\n\n" + long_line + "\nz = 2\n"
+    chunks = split_source(content, '.txt', 20)
+    assert_lossless_within_budget(chunks, content, 20)
+    assert sum(chunk.start_line == 3 for chunk in chunks) > 1
+
+
+def test_merge_groups_keep_order_and_pair_sections():
+    sections = [(f"Lines {index}-{index}", 'x' * 100) for index in range(7)]
+    groups = merge_groups(sections, 60)
+    assert [section for group in groups for section in group] == sections
+    assert all(len(group) >= 2 for group in groups)
+
+
+def test_generate_chunked_calls_generate_once_for_a_small_file():
+    calls = []
+    result = generate_chunked("review", "x = 1\n", '.py', 'Python',
+                              lambda text, part: calls.append(part) or "review",
+                              lambda prompt, part: pytest.fail("nothing to merge"), max_tokens=100)
+    assert result == "review"
+    assert calls == [None]
+
+
+def test_generate_chunked_merges_partial_reviews():
+    content = python_module()
+    parts = []
+    merges = []
+
+    def generate(text, part):
+        parts.append(part)
+        return f"review of {part}"
+
+    def complete(prompt, part):
+        merges.append(part)
+        return "merged review"
+
+    result = generate_chunked("review", content, '.py', 'Python', generate, complete,
+                              max_tokens=150, concurrency=3)
+    assert result == "merged review"
+    assert len(parts) == len(split_source(content, '.py', 150))
+    assert all(part.startswith('part ') for part in parts)
+    assert merges[-1] == f"merge of Lines 1-{content.count(chr(10))}"
+
+
+def test_generate_chunked_joins_comments_in_source_order():
+    content = python_module()
+    chunks = split_source(content, '.py', 150)
+    result = generate_chunked("comments", content, '.py', 'Python', lambda text, part: text,
+                              lambda prompt, part: pytest.fail("comments are not merged"), max_tokens=150)
+    assert result == "\n".join(chunk.text for chunk in chunks)
+
+
+def test_failed_merge_keeps_every_partial_result():
+    content = python_module(functions=6)
+
+    def complete(prompt, part):
+        raise RuntimeError("provider unavailable")
+
+    result = generate_chunked("documentation", content, '.py', 'Python',
+                              lambda text, part: f"docs for {part}", complete, max_tokens=60)
+    chunks = split_source(content, '.py', 60)
+    assert result == join_sections([(f"Lines {chunk.start_line}-{chunk.end_line}",
+                                     f"docs for part {index} of {len(chunks)} "
+                                     f"(lines {chunk.start_line}-{chunk.end_line})")
+                                    for index, chunk in enumerate(chunks, 1)])
+
+
+def test_stream_events_of_a_chunked_file_name_the_file():
+    content = python_module()
+    writer = io.StringIO()
+    progress = ProgressStream(writer)
+
+    def generate(text, part):
+        progress.emit('start', 'review', part)
+        return f"review of {part}"
+
+    def complete(prompt, part):
+        progress.emit('start', 'review', part)
+        return "merged review"
+
+    def run():
+        stream_file.set('large.py')
+        return generate_chunked("review", content, '.py', 'Python', generate, complete,
+                                max_tokens=150, concurrency=3)
+
+    assert contextvars.copy_context().run(run) == "merged review"
+    events = [json.loads(line) for line in writer.getvalue().splitlines()]
+    assert len(events) > len(split_source(content, '.py', 150))
+    assert all(event['file'] == 'large.py' for event in events)
+
+
+@pytest.mark.parametrize('output', ['review', 'comments'])
+def test_async_variant_matches_generate_chunked(output):
+    content = python_module()
+    running = []
+    peak = []
+
+    def complete(prompt, part):
+        return f"merged {part}"
+
+    async def agenerate(text, part):
+        running.append(part)
+        peak.append(len(running))
+        await asyncio.sleep(0.001)
+        running.remove(part)
+        return f"{output} of {part}"
+
+    async def acomplete(prompt, part):
+        return complete(prompt, part)
+
+    expected = generate_chunked(output, content, '.py', 'Python', lambda text, part: f"{output} of {part}",
+                                complete, max_tokens=150)
+    result = asyncio.run(agenerate_chunked(output, content, '.py', 'Python', agenerate, acomplete,
+                                           max_tokens=150, concurrency=2))
+    assert result == expected
+    assert max(peak) == 2
@@ -0,0 +1,167 @@
+import os
+import asyncio
+
+import pytest
+
+from llm_cache import ENTRY_SUFFIX, LLMResponseCache
+
+
+PARAMS = {'temperature': 0, 'seed': 42}
+
+
+def response(text):
+    return {'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text},
+                         'finish_reason': 'stop'}], 'model': 'gpt-4o'}
+
+
+class CountingRequest:
+    def __init__(self, text="answer"):
+        self.text = text
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return response(self.text)
+
+
+def entries(directory):
+    return sorted(os.path.join(root, name) for root, _, names in os.walk(directory)
+                  for name in names if name.endswith(ENTRY_SUFFIX))
+
+
+def test_miss_then_hit(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), mode='on')
+    request = CountingRequest()
+    first = cache.completion('openai', 'gpt-4o', 'Review this', PARAMS, request)
+    second = cache.completion('openai', 'gpt-4o', 'Review this', PARAMS, request)
+    assert request.calls == 1
+    assert (cache.misses, cache.hits) == (1, 1)
+    assert second['choices'][0]['message']['content'] == first['choices'][0]['message']['content'] == "answer"
+
+
+def test_hit_survives_a_new_cache_object(tmp_path):
+    LLMResponseCache(str(tmp_path), mode='on').completion('openai', 'gpt-4o', 'p', PARAMS, CountingRequest())
+    request = CountingRequest()
+    LLMResponseCache(str(tmp_path), mode='on').completion('openai', 'gpt-4o', 'p', PARAMS, request)
+    assert request.calls == 0
+
+
+@pytest.mark.parametrize('changed', [
+    ('anthropic', 'gpt-4o', 'p', PARAMS),
+    ('openai', 'gpt-4o-mini', 'p', PARAMS),
+    ('openai', 'gpt-4o', 'q', PARAMS),
+    ('openai', 'gpt-4o', 'p', {'temperature': 0.5, 'seed': 42}),
+])
+def test_any_part_of_the_call_changes_the_key(tmp_path, changed):
+    cache = LLMResponseCache(str(tmp_path), mode='on')
+    cache.completion('openai', 'gpt-4o', 'p', PARAMS, CountingRequest())
+    request = CountingRequest()
+    cache.completion(*changed, request)
+    assert request.calls == 1
+
+
+def test_refresh_skips_lookups_but_stores(tmp_path):
+    refresh = LLMResponseCache(str(tmp_path), mode='refresh')
+    request = CountingRequest("fresh")
+    refresh.completion('openai', 'gpt-4o', 'p', PARAMS, request)
+    refresh.completion('openai', 'gpt-4o', 'p', PARAMS, request)
+    assert request.calls == 2
+
+    reader = CountingRequest()
+    cached = LLMResponseCache(str(tmp_path), mode='on').completion('openai', 'gpt-4o', 'p', PARAMS, reader)
+    assert reader.calls == 0
+    assert cached['choices'][0]['message']['content'] == "fresh"
+
+
+def test_off_neither_reads_nor_writes(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), mode='off')
+    request = CountingRequest()
+    cache.completion('openai', 'gpt-4o', 'p', PARAMS, request)
+    cache.completion('openai', 'gpt-4o', 'p', PARAMS, request)
+    assert request.calls == 2
+    assert entries(tmp_path) == []
+
+
+def test_unknown_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        LLMResponseCache(str(tmp_path), mode='sometimes')
+
+
+def test_stale_entry_is_a_miss_and_removed(tmp_path):
+    LLMResponseCache(str(tmp_path), mode='on').completion('openai', 'gpt-4o', 'p', PARAMS, CountingRequest())
+    stale = LLMResponseCache(str(tmp_path), mode='on', max_age=-1)
+    key = stale.key('openai', 'gpt-4o', PARAMS, 'p')
+    assert stale.get(key) is None
+    assert entries(tmp_path) == []
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), mode='on')
+    cache.completion('openai', 'gpt-4o', 'p', PARAMS, CountingRequest())
+    path, = entries(tmp_path)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('{"stored_at":')
+    request = CountingRequest()
+    cache.completion('openai', 'gpt-4o', 'p', PARAMS, request)
+    assert request.calls == 1
+
+
+def test_eviction_removes_least_recently_used_first(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), mode='on', max_bytes=10 ** 9)
+    keys = [cache.key('openai', 'gpt-4o', PARAMS, f"prompt {index}") for index in range(6)]
+    for key in keys:
+        cache.put(key, response('x' * 200))
+    # Older access times for the first entries, the most recent for the last
+    for age, key in enumerate(reversed(keys)):
+        path = cache._path(key)
+        os.utime(path, (1000000 + (len(keys) - age), os.stat(path).st_mtime))
+    entry_size = os.path.getsize(cache._path(keys[0]))
+
+    cache.max_bytes = entry_size * 3
+    cache.evict()
+    remaining = [key for key in keys if os.path.exists(cache._path(key))]
+    assert remaining == keys[-len(remaining):]
+    assert sum(os.path.getsize(cache._path(key)) for key in remaining) <= cache.max_bytes
+    assert cache._size == sum(os.path.getsize(cache._path(key)) for key in remaining)
+
+
+def test_writes_keep_the_cache_within_max_bytes(tmp_path):
+    entry_size = len(repr(response('x' * 200))) + 64
+    cache = LLMResponseCache(str(tmp_path), mode='on', max_bytes=entry_size * 5)
+    for index in range(40):
+        cache.put(cache.key('openai', 'gpt-4o', PARAMS, f"prompt {index}"), response('x' * 200))
+    assert sum(os.path.getsize(path) for path in entries(tmp_path)) <= cache.max_bytes
+    assert cache._size == sum(os.path.getsize(path) for path in entries(tmp_path))
+
+
+def test_memoize_computes_once(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), mode='on')
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {'review': 'guidelines'}
+
+    assert cache.memoize('compliance', {'document': 'd'}, compute) == {'review': 'guidelines'}
+    assert cache.memoize('compliance', {'document': 'd'}, compute) == {'review': 'guidelines'}
+    assert LLMResponseCache(str(tmp_path), mode='on').memoize('compliance', {'document': 'd'}, compute) == {
+        'review': 'guidelines'}
+    assert len(calls) == 1
+
+
+def test_async_completion_hits_after_miss(tmp_path):
+    cache = LLMResponseCache(str(tmp_path), mode='on')
+    calls = []
+
+    async def request():
+        calls.append(1)
+        return response("async answer")
+
+    async def run():
+        first = await cache.acompletion('openai', 'gpt-4o', 'p', PARAMS, request)
+        second = await cache.acompletion('openai', 'gpt-4o', 'p', PARAMS, request)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert len(calls) == 1
+    assert second['choices'][0]['message']['content'] == "async answer"